@@ -6,6 +6,7 @@ This script analyzes the Excel file and shows all columns and sample data
 import pandas as pd
 import sys
 import os
+from excel_cache import read_sheet, sheet_names
 
 EXCEL_FILE = os.path.join(os.path.dirname(__file__), 'AI- PDMedical_Products-29 10 25 (1).xlsx')
 
@@ -20,18 +21,18 @@ print("="*80)
 
 try:
     # Get all sheet names
-    xl_file = pd.ExcelFile(EXCEL_FILE)
-    print(f"\n📄 Found {len(xl_file.sheet_names)} sheet(s):")
-    for sheet in xl_file.sheet_names:
+    all_sheets = sheet_names(EXCEL_FILE)
+    print(f"\n📄 Found {len(all_sheets)} sheet(s):")
+    for sheet in all_sheets:
         print(f"   - {sheet}")
     
     # Analyze each sheet
-    for sheet_name in xl_file.sheet_names:
+    for sheet_name in all_sheets:
         print(f"\n{'='*80}")
         print(f"SHEET: {sheet_name}")
         print(f"{'='*80}")
         
-        df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name, header=None)
+        df = read_sheet(EXCEL_FILE, sheet_name)
         
         print(f"\nTotal rows: {len(df)}")
         print(f"Total columns: {len(df.columns)}")
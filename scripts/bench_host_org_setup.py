@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for host_org_one_time_setup.py against LocalPostgrest.
+
+For each domain count, builds a fixture (organizations, alias domains,
+active mailboxes and emails per host domain), serves it from the local
+PostgREST stand-in with simulated per-request latency and runs the real
+script (--from-active-mailboxes) over HTTP. Reports wall time, request
+count and keep-alive connections opened.
+
+Usage:
+    python3 scripts/bench_host_org_setup.py [--domains 1,10,50,100,500]
+                                            [--latency-ms 20] [--concurrency 4]
+                                            [--batch-size 5000] [--error-rate 0]
+                                            [--dry-run] [--detail]
+
+--error-rate makes that fraction of requests fail with 503; a run that
+hits one is reported as failed (the script does not retry).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import host_org_one_time_setup as setup  # noqa: E402
+from local_postgrest import LocalPostgrest, make_fixture, supabase_env  # noqa: E402
+
+
+def run(
+    n_domains: int,
+    latency: float,
+    concurrency: int,
+    batch_size: int,
+    error_rate: float = 0.0,
+    dry_run: bool = False,
+) -> dict:
+    tables = make_fixture(n_domains)
+    with LocalPostgrest(tables, latency=latency, error_rate=error_rate) as api, \
+            tempfile.TemporaryDirectory() as tmp, supabase_env(api.url):
+        argv = [
+            "--from-active-mailboxes",
+            "--concurrency", str(concurrency),
+            "--batch-size", str(batch_size),
+            "--cursor-file", str(Path(tmp) / "cursor.json"),
+        ]
+        if dry_run:
+            argv.append("--dry-run")
+        error = None
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                setup.main(argv)
+            except RuntimeError as exc:
+                error = str(exc)
+        elapsed = time.perf_counter() - start
+        return {
+            "domains": n_domains,
+            "emails": len(tables["emails"]),
+            "seconds": elapsed,
+            "requests": dict(api.requests),
+            "request_count": api.request_count,
+            "connections": len(api.connections),
+            "internal": sum(1 for e in tables["emails"] if e["is_internal"]),
+            "error": error,
+        }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--domains", default="1,10,50,100,500",
+                        help="Comma-separated host domain counts")
+    parser.add_argument("--latency-ms", type=float, default=20.0,
+                        help="Simulated latency per request")
+    parser.add_argument("--concurrency", type=int, default=setup.DEFAULT_CONCURRENCY,
+                        help="Passed through to the script")
+    parser.add_argument("--batch-size", type=int, default=setup.DEFAULT_BATCH_SIZE,
+                        help="Emails per rebuild batch, passed through to the script")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests failed with 503")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Benchmark the --dry-run planner instead of a real run")
+    parser.add_argument("--detail", action="store_true",
+                        help="Print request counts per endpoint")
+    args = parser.parse_args(argv)
+
+    print(f"{'domains':>8} {'emails':>8} {'wall s':>8} {'requests':>9} {'req/domain':>11} "
+          f"{'conns':>6} {'internal':>9}  status")
+    for n in (int(d) for d in args.domains.split(",")):
+        stats = run(n, args.latency_ms / 1000, args.concurrency, args.batch_size,
+                    args.error_rate, args.dry_run)
+        status = f"failed: {stats['error'][:60]}" if stats["error"] else "ok"
+        print(f"{n:>8} {stats['emails']:>8} {stats['seconds']:>8.2f} {stats['request_count']:>9} "
+              f"{stats['request_count'] / n:>11.2f} {stats['connections']:>6} {stats['internal']:>9}  {status}")
+        if args.detail:
+            for (method, path), count in sorted(stats["requests"].items()):
+                print(f"{'':>8}   {method} {path}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
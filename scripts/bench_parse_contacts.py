@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark parse_contacts_from_text on long and adversarial key-contact cells.
+
+Times scan_contacts (memo bypassed) against the original regex
+implementation at doubling input sizes, best of --repeat runs each. Linear
+scaling shows up as a flat "us/KB" column; the legacy email pattern
+backtracks quadratically on long runs of address characters with no '@'.
+
+Usage:
+    python3 scripts/bench_parse_contacts.py [--max-kb 256] [--skip-legacy] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from migrate_products_from_excel import scan_contacts  # noqa: E402
+
+LEGACY_EMAIL = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+LEGACY_NAMES = [
+    r'([A-Z][a-z]+(?:\s+[A-Z][a-z]*\.?\s*)?[A-Z][a-z]+)',
+    r'([A-Z][a-z]+\s+[A-Z][a-z]+)',
+]
+
+CASES = {
+    "contacts": "Jennifer Fredman <fredman.jenn@gmail.com>, Dr. Smith (smith@clinic.com)\n",
+    "prose": "Jen now works at Medical Device and knows Rochelle from St Vincents. ",
+    "no_at_run": "a.b-c_d%e+f",
+    "dotted_domain": "x@a.b.c.d.e.f.g.h-",
+    "capital_run": "Aa Bb C. Dd Ee Ff ",
+}
+
+
+def legacy_scan(text: str) -> None:
+    re.findall(LEGACY_EMAIL, text)
+    for pattern in LEGACY_NAMES:
+        re.findall(pattern, text)
+
+
+def time_call(fn, text: str, repeat: int = 1) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-kb", type=int, default=256, help="Largest cell size in KB")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time scan_contacts")
+    parser.add_argument("--legacy-max-kb", type=int, default=32,
+                        help="Cap for legacy timings (quadratic cases get slow)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timing; the fastest is reported")
+    args = parser.parse_args(argv)
+
+    tokenizer = scan_contacts.__wrapped__  # bypass the memo
+    print(f"{'case':<14} {'KB':>6} {'new ms':>9} {'new us/KB':>10} {'legacy ms':>10} {'legacy us/KB':>13}")
+    for case, unit in CASES.items():
+        kb = 1
+        while kb <= args.max_kb:
+            text = (unit * (kb * 1024 // len(unit) + 1))[: kb * 1024]
+            new = time_call(tokenizer, text, args.repeat)
+            legacy_cols = f"{'-':>10} {'-':>13}"
+            if not args.skip_legacy and kb <= args.legacy_max_kb:
+                legacy = time_call(legacy_scan, text, args.repeat)
+                legacy_cols = f"{legacy * 1e3:>10.2f} {legacy * 1e6 / kb:>13.1f}"
+            print(f"{case:<14} {kb:>6} {new * 1e3:>9.2f} {new * 1e6 / kb:>10.1f} {legacy_cols}")
+            kb *= 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the product import (extract -> merge -> import).
+
+Builds synthetic workbooks of increasing size, runs the full migration
+path against an InMemoryRepository (optionally with simulated per-request
+latency) and reports rows/sec per stage plus request counts.
+
+Usage:
+    python3 scripts/bench_product_import.py [--sizes 100,1000,10000,50000]
+                                            [--latency-ms 0] [--xlsx] [--detail]
+                                            [--pipeline] [--bulk]
+
+--xlsx writes each synthetic workbook to disk and reads it back through the
+real openpyxl path (slow for large sizes); by default the raw sheet frames
+are handed straight to the extractors.
+
+--pipeline also runs the overlapped pipeline (run_pipeline) on a fresh
+repository and reports its wall time and time to first product insert next
+to the phased run. --bulk imports through the import_products_bulk RPC
+(emulated in memory) instead of per-row requests.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import migrate_products_from_excel as migration  # noqa: E402
+from product_import_repository import InMemoryRepository  # noqa: E402
+
+CATEGORIES = ["General", "Midogas", "Sharps", "Theatre", "Infection Control", "Wound Care"]
+WORDS = ["Tube", "Connector", "Adaptor", "Spigot", "Caddy", "Container", "Tray",
+         "Circuit", "Scavenge", "Blade", "Remover", "Stand", "Basket", "Mouthpiece"]
+FIRST = ["Jennifer", "Rochelle", "Amy", "Tiiarne", "Mark", "Peter", "Sarah", "David"]
+LAST = ["Fredman", "Smith", "Nguyen", "Brown", "Wilson", "Taylor", "Jones", "Martin"]
+
+
+def synthetic_sheets(n_products: int, seed: int = 42) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Raw (header=None) Product Info and Sales sheets shaped like the real workbook."""
+    rng = random.Random(seed)
+    n_domains = max(5, n_products // 20)
+    header = [None] * 14
+    product_rows = [header[:] for _ in range(3)]
+    product_rows.append(["", "", "Product Name", "Category", "Market", "History", "Key Contacts",
+                         "", "", "", "Forecast", "", "", "Product Code"])
+    sales_rows = [[None] * 7 for _ in range(3)]
+    sales_rows.append(["", "Priority", "Product Name", "Category", "Instructions", "Timing", "Notes"])
+
+    for i in range(n_products):
+        name = " ".join(rng.sample(WORDS, 3)) + f" {i}"
+        contacts = []
+        for _ in range(rng.choice([0, 1, 1, 2, 3])):
+            first, last = rng.choice(FIRST), rng.choice(LAST)
+            domain = f"hospital{rng.randrange(n_domains)}.com.au"
+            contacts.append(f"{first} {last} <{first.lower()}.{last.lower()}@{domain}>")
+        row = [None] * 14
+        row[2] = name
+        row[3] = rng.choice(CATEGORIES)
+        row[4] = "Plenty of potential " * rng.randint(1, 5)
+        row[5] = "Sold for years with few sales " * rng.randint(1, 5)
+        row[6] = ", ".join(contacts) or None
+        row[10] = rng.choice([None, "Forecast steady"])
+        row[13] = f"PD{i:06d}"
+        product_rows.append(row)
+
+        # Most products have a sales row; some with punctuation/plural drift
+        roll = rng.random()
+        if roll < 0.8:
+            sales_name = name if roll < 0.7 else name.replace(" ", ",  ") + "s"
+            sales_rows.append([None, rng.choice(["# 1", "# 2", "# 3", "remove"]), sales_name,
+                               row[3], "Start sales", None, rng.choice([None, "Call first"])])
+
+    return pd.DataFrame(product_rows, dtype=object), pd.DataFrame(sales_rows, dtype=object)
+
+
+def read_back(products: pd.DataFrame, sales: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.xlsx"
+        with pd.ExcelWriter(path) as writer:
+            products.to_excel(writer, sheet_name="PDM -Product Info", header=False, index=False)
+            sales.to_excel(writer, sheet_name="Sales ", header=False, index=False)
+        return (pd.read_excel(path, sheet_name="PDM -Product Info", header=None),
+                pd.read_excel(path, sheet_name="Sales ", header=None))
+
+
+class TimedRepository(InMemoryRepository):
+    """Records when the first product insert happened."""
+
+    first_insert = float("nan")
+
+    def insert_product(self, data):
+        if self.first_insert != self.first_insert:
+            self.first_insert = time.perf_counter()
+        return super().insert_product(data)
+
+
+def loader_for(bulk: bool):
+    return migration.bulk_import_products if bulk else migration.import_products_to_supabase
+
+
+def run(n_products: int, latency: float, xlsx: bool, bulk: bool = False) -> dict:
+    product_sheet, sales_sheet = synthetic_sheets(n_products)
+    repo = TimedRepository(latency=latency)
+    migration.use_repository(repo)
+    migration.scan_contacts.cache_clear()
+    timings = {}
+
+    start = start_all = time.perf_counter()
+    if xlsx:
+        product_sheet, sales_sheet = read_back(product_sheet, sales_sheet)
+    products = migration.products_from_frame(product_sheet)
+    sales = migration.sales_from_frame(sales_sheet)
+    timings["extract"] = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        merged = migration.merge_product_and_sales_data(products, sales)
+        timings["merge"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = loader_for(bulk)(merged)
+        timings["import"] = time.perf_counter() - start
+
+    stats = {
+        "products": len(products),
+        "timings": timings,
+        "imported": result[0],
+        "errors": result[1],
+        "contacts": result[3],
+        "interests": result[4],
+        "requests": dict(repo.requests),
+        "request_count": repo.request_count,
+        "first_insert": repo.first_insert - start_all,
+    }
+    return stats
+
+
+def run_pipelined(n_products: int, latency: float, xlsx: bool, bulk: bool = False) -> dict:
+    product_sheet, sales_sheet = synthetic_sheets(n_products)
+    repo = TimedRepository(latency=latency)
+    migration.use_repository(repo)
+    migration.scan_contacts.cache_clear()
+
+    start = time.perf_counter()
+    if xlsx:
+        product_sheet, sales_sheet = read_back(product_sheet, sales_sheet)
+    with contextlib.redirect_stdout(io.StringIO()):
+        total = migration.count_products(product_sheet)
+        sales = migration.sales_from_frame(sales_sheet)
+        migration.run_pipeline(product_sheet, sales, total, loader=loader_for(bulk))
+    return {"total": time.perf_counter() - start, "first_insert": repo.first_insert - start}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100,1000,10000,50000",
+                        help="Comma-separated product counts")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Simulated round-trip latency per request")
+    parser.add_argument("--xlsx", action="store_true",
+                        help="Round-trip each workbook through openpyxl")
+    parser.add_argument("--detail", action="store_true",
+                        help="Print request counts per table/operation")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Load through the bulk import RPC instead of per-row requests")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Also time the overlapped extract/merge/parse/load pipeline")
+    args = parser.parse_args(argv)
+
+    print(f"{'products':>9} {'extract/s':>11} {'merge/s':>11} {'import/s':>10} "
+          f"{'total s':>8} {'requests':>9} {'req/prod':>9} {'contacts':>9} {'links':>7} {'errors':>6}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        stats = run(size, args.latency_ms / 1000, args.xlsx, args.bulk)
+        t = stats["timings"]
+        n = max(stats["products"], 1)
+        print(f"{stats['products']:>9} {n / t['extract']:>11,.0f} {n / t['merge']:>11,.0f} "
+              f"{n / t['import']:>10,.0f} {sum(t.values()):>8.2f} {stats['request_count']:>9} "
+              f"{stats['request_count'] / n:>9.2f} {stats['contacts']:>9} {stats['interests']:>7} "
+              f"{stats['errors']:>6}")
+        if args.pipeline:
+            piped = run_pipelined(size, args.latency_ms / 1000, args.xlsx, args.bulk)
+            print(f"{'':>9}   phased: {sum(t.values()):.2f}s (first insert {stats['first_insert']:.3f}s)  "
+                  f"pipelined: {piped['total']:.2f}s (first insert {piped['first_insert']:.3f}s)")
+        if args.detail:
+            for (table, op), count in sorted(stats["requests"].items()):
+                print(f"{'':>9}   {table}.{op}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
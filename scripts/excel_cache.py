@@ -0,0 +1,113 @@
+"""
+Parsed-workbook cache for the product Excel scripts.
+
+openpyxl parsing is the slowest part of a dry run of
+migrate_products_from_excel.py / analyze_excel_structure.py. read_sheet()
+stores each parsed sheet as a pickle keyed by the workbook's content hash
+and the sheet name, so reruns on an unchanged workbook load in
+milliseconds. Pickle keeps every cell value and column dtype exactly as
+read_excel returned them (mixed object columns included), so a cache hit
+behaves identically to a fresh read. Editing the workbook changes the hash,
+which makes the old entries unreachable; they are pruned on the next write.
+
+Entries are only ever written by this module into a local directory; do not
+point cache_dir at files from elsewhere.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_DIR = Path(__file__).resolve().parent / ".excel_cache"
+
+
+def file_digest(path: str | Path) -> str:
+    """sha256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_") or "sheet"
+
+
+def _entry_prefix(path: Path) -> str:
+    return f"{_slug(path.stem)}-"
+
+
+def _sheet_key(sheet_name: str) -> str:
+    # Sheet names like 'Sales ' and 'Sales' slug identically; the short hash keeps them apart
+    return f"{_slug(sheet_name)}-{hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _write_atomic(target: Path, write) -> None:
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _prune_stale(cache_dir: Path, workbook: Path, digest: str) -> None:
+    """Drop entries for earlier versions of the same workbook."""
+    prefix = _entry_prefix(workbook)
+    for entry in cache_dir.glob(f"{prefix}*"):
+        if not entry.name.startswith(f"{prefix}{digest[:16]}-"):
+            entry.unlink(missing_ok=True)
+
+
+def read_sheet(
+    path: str | Path,
+    sheet_name: str,
+    cache_dir: Path = CACHE_DIR,
+) -> pd.DataFrame:
+    """Cached equivalent of pd.read_excel(path, sheet_name=sheet_name, header=None)."""
+    path = Path(path)
+    digest = file_digest(path)
+    entry = cache_dir / f"{_entry_prefix(path)}{digest[:16]}-{_sheet_key(sheet_name)}.pkl"
+    if entry.exists():
+        try:
+            return pd.read_pickle(entry)
+        except Exception:
+            entry.unlink(missing_ok=True)
+
+    df = pd.read_excel(path, sheet_name=sheet_name, header=None)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _prune_stale(cache_dir, path, digest)
+        _write_atomic(entry, df.to_pickle)
+    except Exception as e:
+        print(f"⚠️  Warning: could not cache sheet '{sheet_name}': {str(e)}")
+    return df
+
+
+def sheet_names(path: str | Path, cache_dir: Path = CACHE_DIR) -> list[str]:
+    """Cached equivalent of pd.ExcelFile(path).sheet_names."""
+    path = Path(path)
+    digest = file_digest(path)
+    entry = cache_dir / f"{_entry_prefix(path)}{digest[:16]}-sheets.json"
+    if entry.exists():
+        try:
+            return json.loads(entry.read_text(encoding="utf-8"))
+        except ValueError:
+            entry.unlink(missing_ok=True)
+
+    with pd.ExcelFile(path) as xl_file:
+        names = list(xl_file.sheet_names)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _prune_stale(cache_dir, path, digest)
+        _write_atomic(entry, lambda tmp: tmp.write_text(json.dumps(names), encoding="utf-8"))
+    except OSError as e:
+        print(f"⚠️  Warning: could not cache sheet names: {str(e)}")
+    return names
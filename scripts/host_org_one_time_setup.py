@@ -11,18 +11,48 @@ Examples:
 
     SUPABASE_URL=https://... SUPABASE_SERVICE_ROLE_KEY=... \
       python3 scripts/host_org_one_time_setup.py --domain pdmedical.com.au
+
+Once every domain is marked, emails.is_internal is rebuilt for all of them
+in a single pass over public.emails (rebuild_email_scopes_for_domains_batch),
+in keyset-paginated batches of --batch-size emails, each its own short
+transaction. The last email id of every finished batch is saved to a cursor
+file, so an interrupted rebuild continues where it stopped with --resume.
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
+import gzip
+import http.client
 import json
 import os
+import queue
 import sys
-from typing import Any
-from urllib.error import HTTPError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence
+from urllib.parse import urlencode, urlsplit
+
+from run_metrics import percentile
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_PAGE_SIZE = 1000
+# Rough rows/s for is_internal rewrites, used by --dry-run until a real
+# rebuild has recorded its rate
+ESTIMATED_UPDATE_RATE = 2000
+DEFAULT_CURSOR_FILE = Path(__file__).resolve().parent / ".scope_rebuild_cursor.json"
+
+# Keep request URLs well under common 8 KB limits: ~40 chars per domain in an
+# or=(...) filter, 37 per uuid in an id=in.(...) filter
+LOOKUP_CHUNK_SIZE = 100
+MARK_HOST_CHUNK_SIZE = 150
 
 
 def normalize_domain(value: str) -> str:
@@ -40,13 +70,134 @@ def require_env(name: str) -> str:
 
 
 class SupabaseRest:
-    def __init__(self, url: str, key: str) -> None:
+    """Minimal PostgREST client over pooled keep-alive HTTP(S) connections.
+
+    Up to pool_size idle connections to the project host are kept and
+    reused, and responses are requested gzip-compressed. An HTTP error
+    status raises RuntimeError with the status and response body.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
         self.base_url = url.rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {key}",
             "apikey": key,
             "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
         }
+        parts = urlsplit(self.base_url)
+        self._connection_class = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        self._netloc = parts.netloc
+        self._base_path = parts.path
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+        self.before_request: list[Callable[[dict], None]] = []
+        self.after_request: list[Callable[[dict], None]] = []
+
+    def _acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connection_class(self._netloc, timeout=self.timeout), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def add_hooks(
+        self,
+        before: Callable[[dict], None] | None = None,
+        after: Callable[[dict], None] | None = None,
+    ) -> None:
+        """Register callbacks run before and after every request.
+
+        Both receive the same event dict: method, path and bytes_out before
+        the request; status, bytes_in (as received, before decompression),
+        latency_ms and, on failure, error added after it. With no hooks
+        registered requests are not timed at all.
+        """
+        if before:
+            self.before_request.append(before)
+        if after:
+            self.after_request.append(after)
+
+    def _send(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, str] | None,
+        body: dict[str, Any] | None,
+        headers: dict[str, str],
+    ) -> tuple[int, str]:
+        query = f"?{urlencode(params)}" if params else ""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        target = f"{self._base_path}/rest/v1/{path}{query}"
+        if not (self.before_request or self.after_request):
+            return self._exchange(method, target, data, headers)[:2]
+
+        event = {"method": method, "path": path, "bytes_out": len(data or b"")}
+        for hook in self.before_request:
+            hook(event)
+        start = time.perf_counter()
+        try:
+            status, text, bytes_in = self._exchange(method, target, data, headers)
+            event.update(status=status, bytes_in=bytes_in)
+            return status, text
+        except Exception as exc:
+            event.update(status=None, bytes_in=0, error=repr(exc))
+            raise
+        finally:
+            event["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            for hook in self.after_request:
+                hook(event)
+
+    def _exchange(
+        self, method: str, target: str, data: bytes | None, headers: dict[str, str]
+    ) -> tuple[int, str, int]:
+
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, target, body=data, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # The server dropped an idle keep-alive connection; retry once
+                # on a fresh one
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            break
+
+        bytes_in = len(raw)
+        if resp.getheader("Content-Encoding", "").lower() == "gzip":
+            raw = gzip.decompress(raw)
+        return resp.status, raw.decode("utf-8"), bytes_in
 
     def request(
         self,
@@ -56,90 +207,499 @@ class SupabaseRest:
         body: dict[str, Any] | None = None,
         prefer: str | None = None,
     ) -> Any:
-        query = f"?{urlencode(params)}" if params else ""
         headers = dict(self.headers)
         if prefer:
             headers["Prefer"] = prefer
-        data = json.dumps(body).encode("utf-8") if body is not None else None
-        req = Request(
-            f"{self.base_url}/rest/v1/{path}{query}",
-            data=data,
-            headers=headers,
-            method=method,
-        )
-        try:
-            with urlopen(req) as resp:
-                raw = resp.read().decode("utf-8")
-                return json.loads(raw) if raw else None
-        except HTTPError as exc:
-            raw = exc.read().decode("utf-8")
-            raise RuntimeError(f"{method} {path} failed: {exc.code} {raw}") from exc
+        status, text = self._send(method, path, params, body, headers)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} failed: {status} {text}")
+        return json.loads(text) if text else None
+
+    def iter_rows(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[dict]:
+        """Yield every row of a GET, fetching page_size rows per request.
+
+        Pages are requested with Range headers and only one page is held at
+        a time. Paging continues until an empty page, so the result is
+        complete even when the server caps rows per response below
+        page_size. params should include an order on a unique key so pages
+        do not overlap.
+        """
+        headers = dict(self.headers, **{"Range-Unit": "items"})
+        offset = 0
+        while True:
+            headers["Range"] = f"{offset}-{offset + page_size - 1}"
+            status, text = self._send("GET", path, params, None, headers)
+            if status == 416:
+                return
+            if status >= 400:
+                raise RuntimeError(f"GET {path} failed: {status} {text}")
+            rows = json.loads(text) if text else []
+            if not rows:
+                return
+            yield from rows
+            offset += len(rows)
+
+
+class TraceExporter:
+    """after-request hook writing one JSON line per request.
+
+    Also keeps every event so summary() can break the run down per
+    endpoint (method + path).
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._file = self.path.open("w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.events: list[dict] = []
+
+    def __call__(self, event: dict) -> None:
+        record = dict(event, at=datetime.now(timezone.utc).isoformat())
+        with self._lock:
+            self.events.append(record)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def summary(self) -> list[dict]:
+        by_endpoint: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        with self._lock:
+            for event in self.events:
+                by_endpoint[(event["method"], event["path"])].append(event)
+        rows = []
+        for (method, path), events in by_endpoint.items():
+            latencies = sorted(e["latency_ms"] for e in events)
+            rows.append({
+                "endpoint": f"{method} {path}",
+                "count": len(events),
+                "errors": sum(1 for e in events if e.get("error") or (e.get("status") or 0) >= 400),
+                "total_ms": round(sum(latencies), 3),
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "max_ms": latencies[-1],
+                "bytes_out": sum(e["bytes_out"] for e in events),
+                "bytes_in": sum(e["bytes_in"] for e in events),
+            })
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def print_summary(self) -> None:
+        rows = self.summary()
+        if not rows:
+            return
+        width = max(len(row["endpoint"]) for row in rows)
+        print(f"\n{'endpoint':<{width}} {'calls':>6} {'errors':>6} {'total ms':>10} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'bytes out':>10} {'bytes in':>10}")
+        for row in rows:
+            print(f"{row['endpoint']:<{width}} {row['count']:>6} {row['errors']:>6} "
+                  f"{row['total_ms']:>10.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                  f"{row['max_ms']:>8.1f} {row['bytes_out']:>10} {row['bytes_in']:>10}")
+        print(f"trace written to {self.path}")
 
 
 def load_active_mailbox_domains(client: SupabaseRest) -> list[str]:
-    rows = client.request(
-        "GET",
+    rows = client.iter_rows(
         "mailboxes",
         {
             "select": "email",
             "is_active": "eq.true",
+            "order": "id",
         },
     )
     domains = {
         normalize_domain(row["email"])
-        for row in rows or []
+        for row in rows
         if row.get("email")
     }
     return sorted(d for d in domains if d)
 
 
-def find_organization_ids(client: SupabaseRest, domain: str) -> list[str]:
-    direct_orgs = client.request(
-        "GET",
-        "organizations",
-        {
-            "select": "id,name,domain,is_host",
-            "domain": f"ilike.{domain}",
-        },
-    )
-    alias_rows = client.request(
-        "GET",
-        "organization_domains",
-        {
-            "select": "organization_id,domain",
-            "domain": f"ilike.{domain}",
-        },
-    )
+def chunked(values: Sequence[str], size: int) -> list[list[str]]:
+    return [list(values[i:i + size]) for i in range(0, len(values), size)]
 
-    ids = {row["id"] for row in direct_orgs or [] if row.get("id")}
-    ids.update(
-        row["organization_id"]
-        for row in alias_rows or []
-        if row.get("organization_id")
-    )
-    return sorted(ids)
+
+def domain_filter(domains: Sequence[str]) -> str:
+    """PostgREST or=(...) filter matching any of domains case-insensitively."""
+    return "(" + ",".join(f'domain.ilike."{domain}"' for domain in domains) + ")"
 
 
-def mark_host(client: SupabaseRest, org_ids: list[str]) -> None:
-    id_filter = f"in.({','.join(org_ids)})"
-    client.request(
+def organization_lookups(domains: Sequence[str]) -> list[tuple[str, dict[str, str]]]:
+    """The (table, params) reads that resolve domains: one per table per chunk."""
+    lookups = []
+    for chunk in chunked(list(domains), LOOKUP_CHUNK_SIZE):
+        lookups.append(("organizations", {
+            "select": "id,name,domain,is_host",
+            "or": domain_filter(chunk),
+            "order": "id",
+        }))
+        lookups.append(("organization_domains", {
+            "select": "organization_id,domain",
+            "or": domain_filter(chunk),
+            "order": "organization_id,domain",
+        }))
+    return lookups
+
+
+def group_organization_ids(
+    domains: Sequence[str], results: Sequence[tuple[str, list[dict] | None]]
+) -> dict[str, list[str]]:
+    ids: dict[str, set[str]] = {domain: set() for domain in domains}
+    for table, rows in results:
+        id_column = "id" if table == "organizations" else "organization_id"
+        for row in rows or []:
+            domain = normalize_domain(row.get("domain") or "")
+            if row.get(id_column) and domain in ids:
+                ids[domain].add(row[id_column])
+    return {domain: sorted(found) for domain, found in ids.items()}
+
+
+def find_organization_ids(client: SupabaseRest, domains: Sequence[str]) -> dict[str, list[str]]:
+    """Matching organization ids for every domain, by primary or alias domain.
+
+    Resolves the whole domain set with one GET per table (per
+    LOOKUP_CHUNK_SIZE domains) and groups the rows locally.
+    """
+    wanted = sorted({normalize_domain(d) for d in domains if d})
+    results = [
+        (table, list(client.iter_rows(table, params)))
+        for table, params in organization_lookups(wanted)
+    ]
+    return group_organization_ids(wanted, results)
+
+
+def mark_host(client: SupabaseRest, org_ids: Sequence[str]) -> None:
+    """Set is_host on org_ids, MARK_HOST_CHUNK_SIZE ids per PATCH."""
+    for chunk in chunked(sorted(set(org_ids)), MARK_HOST_CHUNK_SIZE):
+        client.request(*mark_host_request(chunk))
+
+
+def mark_host_request(org_ids: Sequence[str]) -> tuple:
+    return (
         "PATCH",
         "organizations",
-        {"id": id_filter},
+        {"id": f"in.({','.join(org_ids)})"},
         {"is_host": True},
-        prefer="return=minimal",
+        "return=minimal",
     )
 
 
-def rebuild_scope(client: SupabaseRest, domain: str) -> None:
-    client.request(
-        "POST",
-        "rpc/rebuild_email_scopes_for_domain",
-        body={"p_domain": domain},
+class AsyncSupabaseRest:
+    """asyncio front end with the same request() surface as SupabaseRest.
+
+    Requests run in worker threads over the wrapped client's connection
+    pool, at most concurrency at a time.
+    """
+
+    def __init__(self, client: SupabaseRest, concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        self.client = client
+        self._limit = asyncio.Semaphore(concurrency)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, str] | None = None,
+        body: dict[str, Any] | None = None,
+        prefer: str | None = None,
+    ) -> Any:
+        async with self._limit:
+            return await asyncio.to_thread(self.client.request, method, path, params, body, prefer)
+
+    async def rows(self, path: str, params: dict[str, str] | None = None) -> list[dict]:
+        """All rows of a paginated GET (see SupabaseRest.iter_rows)."""
+        async with self._limit:
+            return await asyncio.to_thread(lambda: list(self.client.iter_rows(path, params)))
+
+
+async def find_organization_ids_async(
+    client: AsyncSupabaseRest, domains: Sequence[str]
+) -> dict[str, list[str]]:
+    """find_organization_ids with the lookup GETs in flight concurrently."""
+    wanted = sorted({normalize_domain(d) for d in domains if d})
+    lookups = organization_lookups(wanted)
+    rows = await asyncio.gather(*(client.rows(table, params) for table, params in lookups))
+    return group_organization_ids(wanted, list(zip((table for table, _ in lookups), rows)))
+
+
+async def mark_host_async(client: AsyncSupabaseRest, org_ids: Sequence[str]) -> None:
+    await asyncio.gather(*(
+        client.request(*mark_host_request(chunk))
+        for chunk in chunked(sorted(set(org_ids)), MARK_HOST_CHUNK_SIZE)
+    ))
+
+
+class RebuildCursor:
+    """Last rebuilt email id per (project, domain set), kept in a JSON file."""
+
+    def __init__(self, path: Path, project_url: str) -> None:
+        self.path = Path(path)
+        self.project_url = project_url
+        try:
+            self.state = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+
+    def _key(self, domains: Sequence[str]) -> str:
+        return f"{self.project_url}|{','.join(sorted(domains))}"
+
+    def get(self, domains: Sequence[str]) -> str | None:
+        return self.state.get(self._key(domains))
+
+    def save(self, domains: Sequence[str], last_id: str | None) -> None:
+        if last_id is None:
+            self.state.pop(self._key(domains), None)
+        else:
+            self.state[self._key(domains)] = last_id
+        self._write()
+
+    def rebuild_rate(self) -> float | None:
+        """Emails/s of the last completed rebuild against this project."""
+        return self.state.get(f"{self.project_url}#rebuild_rate")
+
+    def record_rate(self, emails_per_second: float) -> None:
+        self.state[f"{self.project_url}#rebuild_rate"] = round(emails_per_second, 1)
+        self._write()
+
+    def _write(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2, sort_keys=True))
+        tmp.replace(self.path)
+
+
+def rebuild_scope(
+    client: SupabaseRest,
+    domains: Sequence[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    cursor: RebuildCursor | None = None,
+    resume: bool = False,
+) -> dict[str, int]:
+    """Recompute emails.is_internal for all domains in one pass over emails.
+
+    Each batch of batch_size emails is one
+    rebuild_email_scopes_for_domains_batch call; its last email id is saved
+    to cursor so a later run with resume=True skips finished batches. The
+    cursor entry is cleared once the rebuild completes.
+    """
+    domains = sorted(set(domains))
+    label = ", ".join(domains)
+    after = cursor.get(domains) if cursor and resume else None
+    resumed = after is not None
+    if after:
+        print(f"{label}: resuming rebuild after email {after}")
+    totals = {"batches": 0, "scanned": 0, "updated": 0}
+    start = time.perf_counter()
+    while True:
+        result = client.request(
+            "POST",
+            "rpc/rebuild_email_scopes_for_domains_batch",
+            body={"p_domains": domains, "p_after": after, "p_limit": batch_size},
+        ) or {}
+        scanned = int(result.get("scanned") or 0)
+        totals["batches"] += 1
+        totals["scanned"] += scanned
+        totals["updated"] += int(result.get("updated") or 0)
+        if scanned:
+            after = result["last_id"]
+            if cursor:
+                cursor.save(domains, after)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label}: batch {totals['batches']}: {totals['scanned']} emails scanned, "
+                f"{totals['updated']} updated ({totals['scanned'] / elapsed:,.0f}/s)"
+            )
+        if scanned < batch_size:
+            break
+    if cursor:
+        cursor.save(domains, None)
+        elapsed = time.perf_counter() - start
+        if totals["scanned"] and not resumed and elapsed > 0:
+            cursor.record_rate(totals["scanned"] / elapsed)
+    return totals
+
+
+async def setup_host_organizations(
+    client: AsyncSupabaseRest, domains: Sequence[str], dry_run: bool
+) -> dict[str, list[str]]:
+    """Resolve and mark host organizations for domains.
+
+    Returns the matched organization ids per domain (domains without a
+    match are left out). Lookups and PATCH chunks run concurrently; log
+    lines are printed in domain order once the lookups have finished.
+    With dry_run nothing is marked.
+    """
+    org_ids_by_domain = await find_organization_ids_async(client, domains)
+    matched = {}
+    for domain in domains:
+        org_ids = org_ids_by_domain[domain]
+        if not org_ids:
+            print(f"{domain}: no matching organization found")
+            continue
+
+        print(f"{domain}: matching organizations: {', '.join(org_ids)}")
+        if dry_run:
+            print(f"{domain}: dry run, not marking host or rebuilding email scope")
+        matched[domain] = org_ids
+
+    if matched and not dry_run:
+        await mark_host_async(client, [i for org_ids in matched.values() for i in org_ids])
+        print(f"{', '.join(matched)}: marked organizations as host")
+    return matched
+
+
+def plan_setup(
+    client: SupabaseRest,
+    org_ids_by_domain: dict[str, list[str]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    observed_rate: float | None = None,
+    estimate_rebuild: bool = True,
+) -> dict:
+    """What a real run would do, without writing anything.
+
+    Per domain: organizations that would be flipped to is_host (one grouped
+    read of the non-host ids, MARK_HOST_CHUNK_SIZE per request) and, from
+    the keyset-batched estimate_email_scope_rebuild, the emails in its scope
+    and how many of them would change. The rebuild scan takes
+    total_emails / observed_rate when a previous rebuild recorded its rate,
+    otherwise as long as the estimate batches took, plus the writes at
+    ESTIMATED_UPDATE_RATE. A domain's estimated_seconds is its share of the
+    combined run: the scan split by emails_in_scope plus its own writes.
+    """
+    plan: dict[str, Any] = {"domains": {}}
+    not_host: set[str] = set()
+    all_ids = sorted({org_id for org_ids in org_ids_by_domain.values() for org_id in org_ids})
+    for chunk in chunked(all_ids, MARK_HOST_CHUNK_SIZE):
+        rows = client.request(
+            "GET", "organizations", {"select": "id", "id": f"in.({','.join(chunk)})", "is_host": "is.false"}
+        ) or []
+        not_host.update(row["id"] for row in rows)
+    for domain, org_ids in org_ids_by_domain.items():
+        plan["domains"][domain] = {
+            "organizations": len(org_ids),
+            "would_mark_host": len(not_host.intersection(org_ids)),
+        }
+    if not estimate_rebuild or not org_ids_by_domain:
+        return plan
+
+    totals = {"scanned": 0, "emails_in_scope": 0, "would_change": 0}
+    per_domain: dict[str, dict[str, int]] = {}
+    batches = 0
+    after = None
+    start = time.perf_counter()
+    while True:
+        batch = client.request(
+            "POST",
+            "rpc/estimate_email_scope_rebuild",
+            body={"p_domains": sorted(org_ids_by_domain), "p_after": after, "p_limit": batch_size},
+        ) or {}
+        batches += 1
+        for key in totals:
+            totals[key] += int(batch.get(key) or 0)
+        for domain, counts in (batch.get("domains") or {}).items():
+            row = per_domain.setdefault(domain, {"emails": 0, "would_change": 0})
+            row["emails"] += int(counts.get("emails") or 0)
+            row["would_change"] += int(counts.get("would_change") or 0)
+        if int(batch.get("scanned") or 0) < batch_size or not batch.get("last_id"):
+            break
+        after = batch["last_id"]
+    scan_seconds = time.perf_counter() - start
+    total_emails = totals["scanned"]
+    if observed_rate:
+        # The observed rate already includes the writes of that rebuild
+        scan_seconds, update_rate = total_emails / observed_rate, None
+    else:
+        update_rate = ESTIMATED_UPDATE_RATE
+    in_scope = totals["emails_in_scope"]
+
+    def duration(emails: int, would_change: int) -> float:
+        seconds = scan_seconds * emails / in_scope if in_scope else 0.0
+        return seconds + (would_change / update_rate if update_rate else 0.0)
+
+    for domain, counts in per_domain.items():
+        if domain in plan["domains"]:
+            plan["domains"][domain].update(
+                emails_in_scope=counts["emails"],
+                would_change=counts["would_change"],
+                estimated_seconds=round(duration(counts["emails"], counts["would_change"]), 1),
+            )
+    plan.update(
+        total_emails=total_emails,
+        emails_in_scope=in_scope,
+        would_change=totals["would_change"],
+        batches=batches,
+        estimated_seconds=round(
+            scan_seconds + (totals["would_change"] / update_rate if update_rate else 0.0), 1
+        ),
+        estimate_basis="observed rebuild rate" if observed_rate else "estimate scan time",
+    )
+    return plan
+
+
+def print_plan(plan: dict) -> None:
+    for domain, row in plan["domains"].items():
+        line = f"{domain}: would mark {row['would_mark_host']} of {row['organizations']} organizations as host"
+        if "emails_in_scope" in row:
+            line += (
+                f"; {row['emails_in_scope']} emails in scope, {row['would_change']} would change, "
+                f"~{format_duration(row['estimated_seconds'])} of the rebuild"
+            )
+        print(line)
+    if "total_emails" in plan:
+        print(
+            f"rebuild: {plan['total_emails']} emails scanned in {plan['batches']} batches, "
+            f"{plan['would_change']} of {plan['emails_in_scope']} in scope would change, "
+            f"estimated {format_duration(plan['estimated_seconds'])} ({plan['estimate_basis']})"
+        )
+
+
+def format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{seconds:.1f}s"
+
+
+def run(client: SupabaseRest, args: argparse.Namespace, cursor: RebuildCursor) -> int:
+    domains = [normalize_domain(d) for d in args.domain]
+    if args.from_active_mailboxes:
+        domains.extend(load_active_mailbox_domains(client))
+    domains = sorted({d for d in domains if d})
+
+    if not domains:
+        raise SystemExit("Provide --domain at least once or use --from-active-mailboxes")
+
+    matched = asyncio.run(
+        setup_host_organizations(AsyncSupabaseRest(client, args.concurrency), domains, args.dry_run)
     )
+    if args.dry_run:
+        if matched:
+            print_plan(plan_setup(
+                client, matched, args.batch_size, cursor.rebuild_rate(), not args.skip_rebuild
+            ))
+        return 0
+    host_domains = list(matched)
+
+    # The rebuild is one long keyset scan: it stays on the calling thread,
+    # outside the lookup concurrency limit
+    if host_domains and not args.skip_rebuild:
+        totals = rebuild_scope(client, host_domains, args.batch_size, cursor, args.resume)
+        print(
+            f"{', '.join(host_domains)}: rebuilt emails.is_internal "
+            f"({totals['scanned']} emails scanned, {totals['updated']} updated)"
+        )
+
+    return 0
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
         description="Mark host organizations and rebuild historical email scope."
     )
@@ -157,14 +717,48 @@ def main() -> int:
     parser.add_argument(
         "--dry-run",
         action="store_true",
-        help="Print planned changes without updating organizations or emails.",
+        help="Print planned changes, with organization/email counts and an "
+             "estimated rebuild duration, without updating anything.",
     )
     parser.add_argument(
         "--skip-rebuild",
         action="store_true",
         help="Only mark organizations as host; do not rebuild emails.is_internal.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Emails per rebuild transaction (default {DEFAULT_BATCH_SIZE}).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted rebuild from the saved cursor.",
+    )
+    parser.add_argument(
+        "--cursor-file",
+        type=Path,
+        default=DEFAULT_CURSOR_FILE,
+        help="Where the rebuild cursor is kept (default scripts/.scope_rebuild_cursor.json).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Organization lookups/updates in flight at once (default {DEFAULT_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        help="Write every REST call (endpoint, status, bytes, latency) to this "
+             "JSON-lines file and print a per-endpoint summary at exit.",
+    )
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
 
     url = require_env("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
@@ -173,34 +767,17 @@ def main() -> int:
             "Missing SUPABASE_SERVICE_ROLE_KEY or SUPABASE_KEY environment variable"
         )
 
-    client = SupabaseRest(url, key)
-    domains = [normalize_domain(d) for d in args.domain]
-    if args.from_active_mailboxes:
-        domains.extend(load_active_mailbox_domains(client))
-    domains = sorted({d for d in domains if d})
-
-    if not domains:
-        raise SystemExit("Provide --domain at least once or use --from-active-mailboxes")
-
-    for domain in domains:
-        org_ids = find_organization_ids(client, domain)
-        if not org_ids:
-            print(f"{domain}: no matching organization found")
-            continue
-
-        print(f"{domain}: matching organizations: {', '.join(org_ids)}")
-        if args.dry_run:
-            print(f"{domain}: dry run, not marking host or rebuilding email scope")
-            continue
-
-        mark_host(client, org_ids)
-        print(f"{domain}: marked organizations as host")
-
-        if not args.skip_rebuild:
-            rebuild_scope(client, domain)
-            print(f"{domain}: rebuilt emails.is_internal")
-
-    return 0
+    client = SupabaseRest(url, key, pool_size=max(args.concurrency, DEFAULT_POOL_SIZE))
+    tracer = TraceExporter(args.trace) if args.trace else None
+    if tracer:
+        client.add_hooks(after=tracer)
+    try:
+        return run(client, args, RebuildCursor(args.cursor_file, url))
+    finally:
+        client.close()
+        if tracer:
+            tracer.close()
+            tracer.print_summary()
 
 
 if __name__ == "__main__":
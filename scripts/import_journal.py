@@ -0,0 +1,130 @@
+"""
+Local checkpoint journal for migrate_products_from_excel.py.
+
+A small SQLite file records every product, contact and contact-product
+interest the migration has finished, together with the ids Supabase
+returned. With --resume the migration replays the journal instead of
+asking the database again, so a crashed run restarts without re-querying
+work that already completed.
+
+A product is only marked complete after its contacts and interest links
+are written; anything recorded for an unfinished product is still reused
+on resume (contacts and links are never requested twice).
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable
+
+DEFAULT_JOURNAL = Path(__file__).resolve().parent / ".migration_journal.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_code TEXT PRIMARY KEY,
+    product_id   TEXT NOT NULL,
+    completed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    email           TEXT PRIMARY KEY,
+    contact_id      TEXT NOT NULL,
+    organization_id TEXT
+);
+CREATE TABLE IF NOT EXISTS interests (
+    contact_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    PRIMARY KEY (contact_id, product_id)
+);
+"""
+
+
+class JournalMismatch(RuntimeError):
+    """The journal on disk was written against a different Supabase project."""
+
+
+class ImportJournal:
+    def __init__(self, path: str | Path = DEFAULT_JOURNAL) -> None:
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def start(self, project_url: str, resume: bool) -> None:
+        """Begin a run: keep the journal when resuming, otherwise start it fresh."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'project_url'").fetchone()
+        with self.conn:
+            if resume:
+                if row and row[0] != project_url:
+                    raise JournalMismatch(
+                        f"Journal {self.path} belongs to {row[0]}, not {project_url}"
+                    )
+            else:
+                for table in ("products", "contacts", "interests"):
+                    self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('project_url', ?)",
+                (project_url,),
+            )
+
+    def counts(self) -> dict[str, int]:
+        return {
+            table: self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            for table in ("products", "contacts", "interests")
+        }
+
+    # -- products -----------------------------------------------------------
+
+    def completed_product(self, product_code: str) -> str | None:
+        """product_id of a fully migrated product, or None."""
+        row = self.conn.execute(
+            "SELECT product_id FROM products WHERE product_code = ?", (product_code,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def complete_product(self, product_code: str, product_id: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO products (product_code, product_id, completed_at) "
+                "VALUES (?, ?, ?)",
+                (product_code, product_id, datetime.now(timezone.utc).isoformat()),
+            )
+
+    # -- contacts -----------------------------------------------------------
+
+    def contact(self, email: str) -> tuple[str, str | None] | None:
+        """(contact_id, organization_id) recorded for an email, or None."""
+        row = self.conn.execute(
+            "SELECT contact_id, organization_id FROM contacts WHERE email = ?",
+            (email.lower().strip(),),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def record_contact(self, email: str, contact_id: str, organization_id: str | None) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO contacts (email, contact_id, organization_id) "
+                "VALUES (?, ?, ?)",
+                (email.lower().strip(), contact_id, organization_id),
+            )
+
+    # -- interests ----------------------------------------------------------
+
+    def linked_contacts(self, product_id: str) -> set[str]:
+        rows = self.conn.execute(
+            "SELECT contact_id FROM interests WHERE product_id = ?", (product_id,)
+        )
+        return {row[0] for row in rows}
+
+    def record_interests(self, product_id: str, contact_ids: Iterable[str]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO interests (contact_id, product_id) VALUES (?, ?)",
+                [(contact_id, product_id) for contact_id in contact_ids],
+            )
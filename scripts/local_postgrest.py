@@ -0,0 +1,353 @@
+"""
+In-process stand-in for the PostgREST endpoints host_org_one_time_setup.py uses.
+
+LocalPostgrest serves fixture tables over real HTTP/1.1 (keep-alive, gzip)
+on 127.0.0.1, so the script's client, pooling and concurrency run exactly as
+they would against a Supabase project:
+
+    GET       /rest/v1/mailboxes, organizations, organization_domains
+    PATCH     /rest/v1/organizations
+    POST      /rest/v1/rpc/rebuild_email_scopes_for_domain
+              /rest/v1/rpc/rebuild_email_scopes_for_domains_batch
+              /rest/v1/rpc/estimate_email_scope_rebuild
+
+Only the PostgREST subset the script sends is understood: select, order,
+eq/is/in/ilike filters and or=(...), and Range headers with a max-rows cap.
+Every request can be delayed by latency seconds and a seeded fraction of
+them can fail with error_status.
+
+Usage:
+    with LocalPostgrest(make_fixture(50), latency=0.02) as api:
+        SupabaseRest(api.url, "local")...
+
+supabase_env(api.url) points the script's SUPABASE_* settings at the
+stand-in for code that reads them from the environment (main()).
+"""
+from __future__ import annotations
+
+import contextlib
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+from urllib.parse import parse_qsl, urlsplit
+
+CONDITION = re.compile(r'([a-z_]+)\.([a-z]+)\.("(?:[^"]*)"|[^,]*)')
+
+
+def make_fixture(
+    n_domains: int,
+    orgs_per_domain: int = 2,
+    emails_per_domain: int = 20,
+    external_orgs: int = 20,
+    seed: int = 42,
+) -> dict[str, list[dict]]:
+    """Tables for n_domains host domains, each with organizations, an alias
+    domain, an active mailbox and a mix of internal and external emails."""
+    rng = random.Random(seed)
+    new_id = lambda: str(uuid.UUID(int=rng.getrandbits(128)))
+    tables: dict[str, list[dict]] = {
+        "mailboxes": [], "organizations": [], "organization_domains": [], "emails": [],
+    }
+    external = [f"client{i}.health.gov.au" for i in range(external_orgs)]
+    for domain in external:
+        org_id = new_id()
+        tables["organizations"].append({"id": org_id, "name": domain, "domain": domain, "is_host": False})
+        tables["organization_domains"].append({"organization_id": org_id, "domain": domain})
+
+    for d in range(n_domains):
+        domain, alias = f"host{d}.com.au", f"host{d}.co.nz"
+        for o in range(orgs_per_domain):
+            org_id = new_id()
+            tables["organizations"].append({
+                "id": org_id, "name": f"Host {d} ({o})", "domain": domain.upper() if o else domain,
+                "is_host": False,
+            })
+            tables["organization_domains"].append({"organization_id": org_id, "domain": domain})
+            if o == 0:
+                tables["organization_domains"].append({"organization_id": org_id, "domain": alias})
+        tables["mailboxes"].append({"id": new_id(), "email": f"sales@{domain}", "is_active": True})
+        for _ in range(emails_per_domain):
+            other = rng.choice([alias, domain, rng.choice(external)])
+            tables["emails"].append({
+                "id": new_id(),
+                "from_email": f"rep{rng.randrange(5)}@{domain}",
+                "to_emails": [f"buyer{rng.randrange(50)}@{other}"],
+                "cc_emails": [f"Boss <boss@{domain}>"] if rng.random() < 0.3 else None,
+                "bcc_emails": None,
+                "is_internal": False,
+            })
+    tables["mailboxes"].append({"id": new_id(), "email": "old@retired.com.au", "is_active": False})
+    return tables
+
+
+@contextlib.contextmanager
+def supabase_env(url: str) -> Iterator[None]:
+    saved = {name: os.environ.get(name) for name in ("SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY")}
+    os.environ.update(SUPABASE_URL=url, SUPABASE_SERVICE_ROLE_KEY="local")
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def email_domains(email: dict) -> list[str]:
+    addresses = [email.get("from_email")] + list(email.get("to_emails") or []) \
+        + list(email.get("cc_emails") or []) + list(email.get("bcc_emails") or [])
+    return [
+        address.strip(' <>"').split("@", 1)[1].lower() if "@" in address.strip(' <>"') else ""
+        for address in addresses
+        if address
+    ]
+
+
+def unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def matches(row: dict, column: str, operator: str, value: str) -> bool:
+    field = row.get(column)
+    value = unquote(value)
+    if operator == "eq":
+        return str(field).lower() == value.lower() if isinstance(field, bool) else str(field) == value
+    if operator == "is":
+        return field is {"true": True, "false": False, "null": None}[value]
+    if operator == "in":
+        return str(field) in {unquote(v) for v in value.strip("()").split(",")}
+    if operator == "ilike":
+        pattern = "^" + ".*".join(re.escape(part) for part in value.split("*")) + "$"
+        return field is not None and re.match(pattern, str(field), re.IGNORECASE) is not None
+    raise ValueError(f"unsupported operator {operator}")
+
+
+def filter_rows(rows: list[dict], params: list[tuple[str, str]]) -> list[dict]:
+    for name, value in params:
+        if name in ("select", "order", "limit", "offset"):
+            continue
+        if name == "or":
+            conditions = CONDITION.findall(value.strip("()"))
+            rows = [r for r in rows if any(matches(r, c, op, v) for c, op, v in conditions)]
+        else:
+            operator, _, operand = value.partition(".")
+            rows = [r for r in rows if matches(r, name, operator, operand)]
+    return rows
+
+
+class LocalPostgrest:
+    def __init__(
+        self,
+        tables: dict[str, list[dict]],
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        max_rows: int = 1000,
+        seed: int = 0,
+    ) -> None:
+        self.tables = tables
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_rows = max_rows
+        self.requests: Counter[tuple[str, str]] = Counter()
+        self.connections: set[tuple[str, int]] = set()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    # -- lifecycle ----------------------------------------------------------
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "LocalPostgrest":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "LocalPostgrest":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    # -- request handling ---------------------------------------------------
+
+    def handle(self, method: str, path: str, params: list[tuple[str, str]], headers, body: Any):
+        """Returns (status, payload, extra headers)."""
+        with self._lock:
+            self.requests[(method, path)] += 1
+            fail = self.error_rate and self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return self.error_status, {"message": "injected failure"}, {}
+
+        if path.startswith("rpc/"):
+            rpc = getattr(self, "rpc_" + path[len("rpc/"):], None)
+            if method != "POST" or rpc is None:
+                return 404, {"message": f"function {path} not found"}, {}
+            with self._lock:
+                return 200, rpc(**(body or {})), {}
+
+        if path not in self.tables:
+            return 404, {"message": f'relation "public.{path}" does not exist'}, {}
+        with self._lock:
+            rows = filter_rows(self.tables[path], params)
+            if method == "PATCH":
+                for row in rows:
+                    row.update(body or {})
+                return 204, None, {}
+            return self._read(rows, params, headers)
+
+    def _read(self, rows, params, headers):
+        query = dict(params)
+        if "order" in query:
+            for column in reversed(query["order"].split(",")):
+                rows = sorted(rows, key=lambda r: str(r.get(column.split(".")[0])))
+        total = len(rows)
+        extra = {}
+        if headers.get("Range"):
+            first, last = (int(n) for n in headers["Range"].split("-"))
+        else:
+            first = int(query.get("offset", 0))
+            last = first + int(query.get("limit", total)) - 1
+        if first >= total and first > 0:
+            return 416, {"message": "Requested range not satisfiable"}, {"Content-Range": f"*/{total}"}
+        page = rows[first:min(last + 1, first + self.max_rows)]
+        extra["Content-Range"] = f"{first}-{first + len(page) - 1}/*" if page else "*/*"
+        columns = query.get("select", "*").split(",")
+        if columns != ["*"]:
+            page = [{c: row.get(c) for c in columns} for row in page]
+        return (206 if headers.get("Range") else 200), page, extra
+
+    # -- RPCs (same semantics as the SQL functions) -------------------------
+
+    def _scope_domains(self, domains: list[str]) -> dict[str, set[str]]:
+        requested = {d.lower() for d in domains if d}
+        aliases_by_org: dict[str, set[str]] = {}
+        for row in self.tables["organization_domains"]:
+            aliases_by_org.setdefault(row["organization_id"], set()).add(row["domain"].lower())
+        scope = {domain: {domain} for domain in requested}
+        for org in self.tables["organizations"]:
+            org_domains = aliases_by_org.get(org["id"], set())
+            for domain in requested:
+                if (org.get("domain") or "").lower() == domain or domain in org_domains:
+                    scope[domain] |= org_domains
+        return scope
+
+    def _host_domains(self) -> set[str]:
+        host_ids = {org["id"] for org in self.tables["organizations"] if org.get("is_host")}
+        hosts = {(org.get("domain") or "").lower() for org in self.tables["organizations"] if org.get("is_host")}
+        hosts |= {r["domain"].lower() for r in self.tables["organization_domains"] if r["organization_id"] in host_ids}
+        return hosts - {""}
+
+    def _rebuild(self, domains: list[str], after: str | None, limit: int | None) -> dict:
+        scope = set().union(*self._scope_domains(domains).values())
+        hosts = self._host_domains()
+        emails = sorted(self.tables["emails"], key=lambda e: e["id"])
+        batch = [e for e in emails if after is None or e["id"] > after]
+        if limit is not None:
+            batch = batch[:limit]
+        updated = 0
+        for email in batch:
+            domains_in_email = email_domains(email)
+            if not scope & set(domains_in_email):
+                continue
+            internal = bool(domains_in_email) and set(domains_in_email) <= hosts
+            if email["is_internal"] != internal:
+                email["is_internal"] = internal
+                updated += 1
+        return {"last_id": batch[-1]["id"] if batch else None, "scanned": len(batch), "updated": updated}
+
+    def rpc_rebuild_email_scopes_for_domain(self, p_domain: str) -> None:
+        self._rebuild([p_domain], None, None)
+        return None
+
+    def rpc_rebuild_email_scopes_for_domains_batch(self, p_domains, p_after=None, p_limit: int = 5000) -> dict:
+        return self._rebuild(list(p_domains), p_after, p_limit)
+
+    def rpc_estimate_email_scope_rebuild(self, p_domains, p_after=None, p_limit: int = 5000) -> dict:
+        scope_sets = self._scope_domains(list(p_domains))
+        planned = self._host_domains() | set().union(*scope_sets.values())
+        for org in self.tables["organizations"]:
+            org_domain = (org.get("domain") or "").lower()
+            if any(org_domain == d for d in scope_sets):
+                planned.add(org_domain)
+        all_scope = set().union(*scope_sets.values()) if scope_sets else set()
+        emails = sorted(self.tables["emails"], key=lambda e: e["id"])
+        batch = [e for e in emails if p_after is None or e["id"] > p_after][:p_limit]
+        result = {"last_id": batch[-1]["id"] if batch else None, "scanned": len(batch),
+                  "emails_in_scope": 0, "would_change": 0,
+                  "domains": {d: {"emails": 0, "would_change": 0} for d in scope_sets}}
+        for email in batch:
+            domains_in_email = set(email_domains(email))
+            change = email["is_internal"] != (bool(domains_in_email) and domains_in_email <= planned)
+            if domains_in_email & all_scope:
+                result["emails_in_scope"] += 1
+                result["would_change"] += change
+            for domain, scope in scope_sets.items():
+                if domains_in_email & scope:
+                    result["domains"][domain]["emails"] += 1
+                    result["domains"][domain]["would_change"] += change
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _dispatch(self) -> None:
+        stand_in: LocalPostgrest = self.server.stand_in
+        with stand_in._lock:
+            stand_in.connections.add(self.client_address)
+        parts = urlsplit(self.path)
+        path = parts.path.split("/rest/v1/", 1)[-1]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        try:
+            status, payload, extra = stand_in.handle(
+                self.command, path, parse_qsl(parts.query, keep_blank_values=True), self.headers, body
+            )
+        except (ValueError, KeyError, TypeError) as exc:
+            status, payload, extra = 400, {"message": str(exc)}, {}
+
+        data = json.dumps(payload).encode() if payload is not None else b""
+        if data and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            data = gzip.compress(data)
+            extra["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for name, value in extra.items():
+            self.send_header(name, value)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_PATCH = do_POST = _dispatch
@@ -0,0 +1,172 @@
+"""
+Persistent lookup cache for the product migration and ad-hoc backfills.
+
+Keeps email -> contact_id, domain -> organization_id and
+category_name -> category_id mappings in a local SQLite file so repeated
+runs against the same Supabase project skip most lookups.
+
+Entries are bounded two ways:
+    * ttl_seconds - entries not written or used within the TTL are evicted
+    * max_entries - per namespace, the least recently used entries beyond
+      the bound are evicted
+
+Freshness against the database is checked with per-namespace watermarks:
+the caller records the table's latest updated_at, and on the next run only
+rows updated at or after the watermark need to be fetched to refresh or
+invalidate entries (see sync_lookup_cache in migrate_products_from_excel.py).
+Deletions do not show in updated_at, so the caller also re-checks that the
+cached ids still exist.
+"""
+from __future__ import annotations
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable
+
+DEFAULT_LOOKUP_CACHE = Path(__file__).resolve().parent / ".lookup_cache.sqlite"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    project_url TEXT NOT NULL,
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    used_at     REAL NOT NULL,
+    PRIMARY KEY (project_url, namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_value ON entries (project_url, namespace, value);
+CREATE INDEX IF NOT EXISTS entries_used_at ON entries (project_url, namespace, used_at);
+CREATE TABLE IF NOT EXISTS watermarks (
+    project_url TEXT NOT NULL,
+    namespace   TEXT NOT NULL,
+    updated_at  TEXT,
+    PRIMARY KEY (project_url, namespace)
+);
+"""
+
+
+class LookupCache:
+    def __init__(
+        self,
+        project_url: str,
+        path: str | Path = DEFAULT_LOOKUP_CACHE,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        self.project_url = project_url
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+        self._used: dict[tuple[str, str], float] = {}
+        self.evict()
+
+    def close(self) -> None:
+        """Persist use times, apply the bounds and commit."""
+        self.flush()
+        self.evict()
+        self.conn.close()
+
+    def flush(self) -> None:
+        if self._used:
+            self.conn.executemany(
+                "UPDATE entries SET used_at = ? "
+                "WHERE project_url = ? AND namespace = ? AND key = ?",
+                [(ts, self.project_url, ns, key) for (ns, key), ts in self._used.items()],
+            )
+            self._used.clear()
+        self.conn.commit()
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        cutoff = time.time() - self.ttl_seconds
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM entries WHERE project_url = ? AND used_at < ?",
+                (self.project_url, cutoff),
+            )
+            namespaces = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT namespace FROM entries WHERE project_url = ? "
+                    "GROUP BY namespace HAVING count(*) > ?",
+                    (self.project_url, self.max_entries),
+                )
+            ]
+            for namespace in namespaces:
+                self.conn.execute(
+                    "DELETE FROM entries WHERE project_url = ? AND namespace = ? AND key IN ("
+                    "  SELECT key FROM entries WHERE project_url = ? AND namespace = ? "
+                    "  ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.project_url, namespace, self.project_url, namespace, self.max_entries),
+                )
+
+    # -- entries ------------------------------------------------------------
+
+    def load(self, namespace: str) -> dict[str, str]:
+        """All live entries of a namespace."""
+        rows = self.conn.execute(
+            "SELECT key, value FROM entries WHERE project_url = ? AND namespace = ?",
+            (self.project_url, namespace),
+        )
+        return dict(rows.fetchall())
+
+    def get(self, namespace: str, key: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT value FROM entries WHERE project_url = ? AND namespace = ? AND key = ?",
+            (self.project_url, namespace, key),
+        ).fetchone()
+        if row:
+            self.touch(namespace, key)
+        return row[0] if row else None
+
+    def touch(self, namespace: str, key: str) -> None:
+        """Mark an entry as used (persisted on flush/close)."""
+        self._used[(namespace, key)] = time.time()
+
+    def put(self, namespace: str, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (project_url, namespace, key, value, used_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.project_url, namespace, key, value, time.time()),
+        )
+
+    def invalidate_values(self, namespace: str, values: Iterable[str]) -> None:
+        """Drop every entry pointing at one of the given ids."""
+        self.conn.executemany(
+            "DELETE FROM entries WHERE project_url = ? AND namespace = ? AND value = ?",
+            [(self.project_url, namespace, value) for value in values],
+        )
+
+    def clear(self, namespace: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM entries WHERE project_url = ? AND namespace = ?",
+                (self.project_url, namespace),
+            )
+            self.conn.execute(
+                "DELETE FROM watermarks WHERE project_url = ? AND namespace = ?",
+                (self.project_url, namespace),
+            )
+
+    # -- watermarks ---------------------------------------------------------
+
+    def watermark(self, namespace: str) -> str | None:
+        """Latest updated_at recorded for the namespace's table."""
+        row = self.conn.execute(
+            "SELECT updated_at FROM watermarks WHERE project_url = ? AND namespace = ?",
+            (self.project_url, namespace),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, namespace: str, updated_at: str | None) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watermarks (project_url, namespace, updated_at) "
+                "VALUES (?, ?, ?)",
+                (self.project_url, namespace, updated_at),
+            )
@@ -14,30 +14,44 @@ Requirements:
 Environment Variables (.env file):
     SUPABASE_URL=your_supabase_url
     SUPABASE_KEY=your_supabase_service_role_key
+
+Importing the module is cheap: pandas, the Supabase SDK and .env are only
+loaded when a sheet is read or connect() is first called, so the pure
+helpers (parse_priority_label, parse_contacts_from_text, ...) work without
+credentials.
 """
+from __future__ import annotations
 
-import pandas as pd
+import argparse
 import os
 import re
-from supabase import create_client, Client
-from dotenv import load_dotenv
 from datetime import datetime
 import sys
-from typing import List, Dict, Optional, Tuple
+import queue
+import threading
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+from name_matching import TokenSetIndex, normalise_name_key
+from import_journal import DEFAULT_JOURNAL, ImportJournal, JournalMismatch
+from lookup_cache import DEFAULT_LOOKUP_CACHE, LookupCache
+from product_import_repository import ProductImportRepository, SupabaseRepository
+from row_hashes import DEFAULT_SYNC_STATE, RowHashStore, record_hash
+from run_metrics import DEFAULT_METRICS_REPORT, ProgressLine
 
-# Load environment variables
-load_dotenv()
+if TYPE_CHECKING:
+    import pandas as pd
+    from supabase import Client
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Supabase settings and client, filled in by connect()
+SUPABASE_URL: Optional[str] = None
+SUPABASE_KEY: Optional[str] = None
+supabase: Optional[Client] = None
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("ERROR: Please set SUPABASE_URL and SUPABASE_KEY in your .env file")
-    print("NOTE: Use SUPABASE_SERVICE_ROLE_KEY for inserts (not anon key)")
-    sys.exit(1)
+# All table access goes through the repository (swap in InMemoryRepository offline)
+repo: Optional[ProductImportRepository] = None
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# --quiet: per-row messages are replaced by a throttled progress line
+_quiet = False
 
 # Excel file path
 EXCEL_FILE = 'AI- PDMedical_Products-29 10 25 (1).xlsx'
@@ -46,101 +60,166 @@ EXCEL_FILE = 'AI- PDMedical_Products-29 10 25 (1).xlsx'
 _org_cache = {}
 _contact_cache = {}
 _product_cache = {}
+_category_cache = {}
+
+# Persistent lookup cache namespace -> (table, key column, in-memory cache)
+LOOKUP_NAMESPACES = {
+    'contact': ('contacts', 'email', _contact_cache),
+    'organization': ('organizations', 'domain', _org_cache),
+    'category': ('product_categories', 'category_name', _category_cache),
+}
+_lookup_cache: Optional[LookupCache] = None
+LOOKUP_DELTA_LIMIT = 1000
+
+# Domains of existing organizations are prefetched into _org_cache once
+_org_domains_loaded = False
+ORG_PAGE_SIZE = 1000
+
+# Header/label cells that can appear in the code or name column of a data row
+PRODUCT_CODE_HEADERS = ['product code', 'code', 'forecast', 'total qty']
+SALES_NAME_HEADERS = ['product name', 'product', 'name']
+NULL_TEXT_VALUES = ['nan', 'none', '', 'null']
+NULL_CODE_VALUES = ['nan', 'none', '']
+
+# Sheet column index -> product/sales field (rows start at index 4 / Excel row 5)
+PRODUCT_COLUMNS = {
+    'product_name': 2,            # Column C
+    'category_name': 3,           # Column D
+    'market_potential': 4,        # Column E
+    'background_history': 5,      # Column F
+    'key_contacts_reference': 6,  # Column G
+    'forecast_notes': 10,         # Column K
+}
+PRODUCT_CODE_COLUMN = 13          # Column N
+
+SALES_COLUMNS = {
+    'priority_label': 1,          # Column B
+    'category_name': 3,           # Column D
+    'instructions': 4,            # Column E
+    'timing_notes': 5,            # Column F
+    'additional_notes': 6,        # Column G
+}
+SALES_NAME_COLUMN = 2             # Column C
 
-def extract_products_from_excel():
-    """Extract product data from the PDM -Product Info sheet"""
+DATA_START_ROW = 4
+
+# Product -> sales row match tiers, strictest first
+MATCH_TIERS = ['exact', 'normalised', 'token_set', 'unmatched']
+
+# Pipelined import (see run_pipeline)
+PIPELINE_CHUNK_ROWS = 200         # Sheet rows turned into product dicts at a time
+PIPELINE_QUEUE_SIZE = 256         # Products buffered between stages
+_END_OF_STREAM = object()
+
+# --bulk: products per import_products_bulk RPC call
+BULK_BATCH_SIZE = 500
+
+def read_product_sheet() -> pd.DataFrame:
+    """Raw PDM -Product Info sheet; exits if the workbook can't be read"""
     print("📊 Reading Excel file...")
     
     try:
-        df = pd.read_excel(EXCEL_FILE, sheet_name='PDM -Product Info', header=None)
+        from excel_cache import read_sheet
+        return read_sheet(EXCEL_FILE, 'PDM -Product Info')
     except FileNotFoundError:
         print(f"❌ ERROR: Excel file '{EXCEL_FILE}' not found in current directory")
         sys.exit(1)
     except Exception as e:
         print(f"❌ ERROR reading Excel file: {str(e)}")
         sys.exit(1)
-    
-    products = []
-    
-    # Start from row 4 (Excel row 5) where actual product data begins
+
+def products_from_frame(df: pd.DataFrame) -> List[Dict]:
+    """Build product dicts from the raw product sheet using column-wise operations"""
     # Skip header rows (rows 0-3 are empty/headers)
-    for idx in range(4, len(df)):
-        row = df.iloc[idx]
-        
-        # Check if this row has a product code (Column N, index 13)
-        product_code_raw = row[13] if len(row) > 13 else None
-        
-        if pd.notna(product_code_raw) and str(product_code_raw).strip():
-            product_code = str(product_code_raw).strip()
-            
-            # Skip if it's a header text
-            if product_code.lower() in ['product code', 'code', 'forecast', 'total qty']:
-                continue
-            
-            product = {
-                'product_code': product_code,
-                'product_name': clean_text(row[2]) if len(row) > 2 else None,  # Column C
-                'category_name': clean_text(row[3]) if len(row) > 3 else None,  # Column D
-                'market_potential': clean_text(row[4]) if len(row) > 4 else None,  # Column E
-                'background_history': clean_text(row[5]) if len(row) > 5 else None,  # Column F
-                'key_contacts_reference': clean_text(row[6]) if len(row) > 6 else None,  # Column G
-                'forecast_notes': clean_text(row[10]) if len(row) > 10 else None,  # Column K
-            }
-            
-            # Only add if product code is valid
-            if product['product_code'] and product['product_code'].lower() not in ['nan', 'none', '']:
-                products.append(product)
+    return products_from_rows(df.iloc[DATA_START_ROW:])
+
+def product_code_mask(data: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """Cleaned product codes (Column N) and the mask of rows that are real products"""
+    codes = clean_text_column(sheet_column(data, PRODUCT_CODE_COLUMN), NULL_CODE_VALUES)
+    mask = codes.notna() & ~codes.str.lower().isin(PRODUCT_CODE_HEADERS)
+    return codes, mask
+
+def products_from_rows(data: pd.DataFrame) -> List[Dict]:
+    """Product dicts for a block of data rows (any slice below the header rows)"""
+    # Rows with a product code that isn't a header label
+    codes, mask = product_code_mask(data)
+    data = data[mask]
     
-    print(f"✅ Extracted {len(products)} products from Excel")
-    return products
+    columns = {'product_code': codes[mask]}
+    for field, col in PRODUCT_COLUMNS.items():
+        columns[field] = clean_text_column(sheet_column(data, col))
+    
+    return records_from_columns(columns)
+
+def count_products(df: pd.DataFrame) -> int:
+    """Number of products in the raw product sheet without building them"""
+    return int(product_code_mask(df.iloc[DATA_START_ROW:])[1].sum())
 
 def clean_text(value):
     """Clean text values from Excel"""
-    if pd.isna(value):
+    # Blank cells come back from read_excel as None, NaN or NaT; the last two
+    # are the only values not equal to themselves (checked without pandas)
+    if value is None or value != value:
         return None
     text = str(value).strip()
-    if text.lower() in ['nan', 'none', '', 'null']:
+    if text.lower() in NULL_TEXT_VALUES:
         return None
     return text
 
+def clean_text_column(series: pd.Series, null_values: List[str] = NULL_TEXT_VALUES) -> pd.Series:
+    """Column-wise clean_text: stripped strings, None for blank/nan/none/null cells"""
+    present = series.notna()
+    text = series[present].map(str).astype(object).str.strip()
+    text = text[~text.str.lower().isin(null_values)]
+    
+    cleaned = text.reindex(series.index)
+    return cleaned.where(cleaned.notna(), None)
+
+def sheet_column(df: pd.DataFrame, col: int) -> pd.Series:
+    """Return a sheet column by position, or an all-empty column if the sheet is narrower"""
+    if col < df.shape[1]:
+        return df.iloc[:, col]
+    # reindex to a position past the sheet's edge yields an all-NaN column
+    return df.reindex(columns=[col]).iloc[:, 0]
+
+def records_from_columns(columns: Dict[str, pd.Series]) -> List[Dict]:
+    """Zip cleaned columns back into one dict per row (in column order)"""
+    fields = list(columns)
+    values = [columns[field].tolist() for field in fields]
+    return [dict(zip(fields, row)) for row in zip(*values)]
+
 def extract_sales_priorities():
     """Extract sales priority data from the Sales sheet"""
     print("📊 Reading Sales priorities...")
     
     try:
-        df = pd.read_excel(EXCEL_FILE, sheet_name='Sales ', header=None)
+        from excel_cache import read_sheet
+        df = read_sheet(EXCEL_FILE, 'Sales ')
     except Exception as e:
         print(f"⚠️  Warning: Could not read Sales sheet: {str(e)}")
         return []
     
-    sales_data = []
-    
-    # Start from row 4 (Excel row 5) where actual sales data begins
-    for idx in range(4, len(df)):
-        row = df.iloc[idx]
-        
-        # Check if this row has product name (Column C, index 2)
-        product_name_raw = row[2] if len(row) > 2 else None
-        
-        if pd.notna(product_name_raw) and clean_text(product_name_raw):
-            # Skip header rows
-            product_name = clean_text(product_name_raw)
-            if product_name.lower() in ['product name', 'product', 'name']:
-                continue
-            
-            sale = {
-                'product_name': product_name,
-                'priority_label': clean_text(row[1]) if len(row) > 1 else None,  # Column B
-                'category_name': clean_text(row[3]) if len(row) > 3 else None,  # Column D
-                'instructions': clean_text(row[4]) if len(row) > 4 else None,  # Column E
-                'timing_notes': clean_text(row[5]) if len(row) > 5 else None,  # Column F
-                'additional_notes': clean_text(row[6]) if len(row) > 6 else None,  # Column G
-            }
-            sales_data.append(sale)
+    sales_data = sales_from_frame(df)
     
     print(f"✅ Extracted {len(sales_data)} sales priority records")
     return sales_data
 
+def sales_from_frame(df: pd.DataFrame) -> List[Dict]:
+    """Build sales priority dicts from the raw Sales sheet using column-wise operations"""
+    # Start from row 4 (Excel row 5) where actual sales data begins
+    data = df.iloc[DATA_START_ROW:]
+    
+    # Rows with a product name (Column C) that isn't a header label
+    names = clean_text_column(sheet_column(data, SALES_NAME_COLUMN))
+    mask = names.notna() & ~names.str.lower().isin(SALES_NAME_HEADERS)
+    data = data[mask]
+    
+    columns = {'product_name': names[mask]}
+    for field, col in SALES_COLUMNS.items():
+        columns[field] = clean_text_column(sheet_column(data, col))
+    
+    return records_from_columns(columns)
+
 def parse_priority_label(priority_label):
     """Parse priority label (e.g., '# 1' -> 1, 'remove' -> None)"""
     if not priority_label:
@@ -165,81 +244,235 @@ def parse_priority_label(priority_label):
     
     return None, 'active'
 
+# Contact scanning: precompiled whole-text passes that leave the per-character
+# work to the regex engine. Every match is anchored at a token start by a
+# lookbehind, so a long run of address characters is tried once rather than
+# from every offset, and no two quantifiers overlap; parsing is linear in the
+# cell length. Python only sees finished emails and runs of two or more
+# capitalised words on one line, and plain 'First Last' runs are taken as-is.
+_TOKEN_CHARS = "A-Za-z0-9._%+@'’-"
+EMAIL_TOKEN = re.compile(
+    r'(?<![A-Za-z0-9._%+@-])[.-]*'
+    r'([A-Za-z0-9_%+][A-Za-z0-9._%+-]*@(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,})'
+    r'[.-]*(?![A-Za-z0-9._%+@-])'
+)
+# A name word is capitalised with a lower-case (or apostrophe) second letter,
+# so McDonald, DeVries, Mary-Jane and O'Brien count but acronyms such as NSW do
+# not. Patterns start at the capital so the engine can skip ahead to one; the
+# lookahead after it rejects titles (Dr, Mrs, Prof...), which end a run.
+_NAME_WORD_REST = (
+    r"(?!(?<=[DMPSdmps])(?i:r|rs|s|iss|rof|ister)\.?(?![A-Za-z'’-]))"
+    rf"[a-z'’][a-zA-Z'’-]*(?<!-)\.?(?![{_TOKEN_CHARS}])"
+)
+_NAME_INITIAL = rf"[A-Z]\.?(?![{_TOKEN_CHARS}])"
+NAME_RUN = re.compile(
+    rf"[A-Z](?<![{_TOKEN_CHARS}].){_NAME_WORD_REST}"
+    rf"(?:[ \t]+(?:[A-Z]{_NAME_WORD_REST}|{_NAME_INITIAL}))+"
+)
+# Within a longer run (single-spaced, word dots dropped): 'First M. Last', or
+# a 'First Last' pair whose second word does not start a 'First M. Last'
+_RUN_WORD = r"[A-Z][a-z'’][^ ]*(?![^ ])"
+_RUN_INITIAL = r"[A-Z]\.?(?![^ ])"
+RUN_NAME = re.compile(
+    rf"[A-Z](?<![^ ].)[a-z'’][^ ]*(?![^ ])"
+    rf"(?: {_RUN_INITIAL} {_RUN_WORD}| {_RUN_WORD}(?! {_RUN_INITIAL} {_RUN_WORD}))"
+)
+WORD_DOT = re.compile(r"\.(?<=[a-z'’]\.)(?![^ ])")
+MAX_PLACEHOLDER_CONTACTS = 5
+
+@lru_cache(maxsize=4096)
+def scan_contacts(contacts_text: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return (emails, name candidates) from the text, each in order of appearance
+    
+    A run of capitalised words gives 'First Last', 'First M. Last' or, for
+    exactly three words, 'First Middle Last'; longer runs are split into those.
+    Memoised: the same key_contacts_reference text repeats across products.
+    """
+    emails = tuple(map(str.lower, EMAIL_TOKEN.findall(contacts_text))) if '@' in contacts_text else ()
+    
+    names = []
+    for run in NAME_RUN.findall(contacts_text):
+        if run.count(' ') == 1 and run[-2] != ' ' and '.' not in run and '\t' not in run:
+            names.append(run)
+            continue
+        if '\t' in run or '  ' in run:
+            run = ' '.join(run.split())
+        if '.' in run:
+            run = WORD_DOT.sub('', run)
+        if run.count(' ') == 2:
+            names.append(run)
+        else:
+            names.extend(RUN_NAME.findall(run))
+    
+    return emails, tuple(names)
+
 def parse_contacts_from_text(contacts_text: str) -> List[Dict]:
     """Parse contact information from key_contacts_reference text"""
     if not contacts_text:
         return []
     
+    emails, names = scan_contacts(contacts_text)
     contacts = []
     
-    # Pattern to match emails
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    emails = re.findall(email_pattern, contacts_text)
-    
-    # Pattern to match names (common patterns like "First Last", "First M. Last")
-    name_patterns = [
-        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]*\.?\s*)?[A-Z][a-z]+)',  # First M. Last
-        r'([A-Z][a-z]+\s+[A-Z][a-z]+)',  # First Last
-    ]
-    
-    names = []
-    for pattern in name_patterns:
-        found_names = re.findall(pattern, contacts_text)
-        names.extend(found_names)
-    
     # Create contact entries
     if emails:
         for i, email in enumerate(emails):
             name = names[i] if i < len(names) else None
             contacts.append({
                 'name': name,
-                'email': email.lower(),
+                'email': email,
                 'raw_text': contacts_text
             })
     elif names:
         # If we have names but no emails, create placeholder emails
-        for name in names[:5]:  # Limit to 5 contacts per product
+        for name in names[:MAX_PLACEHOLDER_CONTACTS]:
             # Extract first and last name
             name_parts = name.split()
-            if len(name_parts) >= 2:
-                first_name = name_parts[0]
-                last_name = name_parts[-1]
-                # Generate placeholder email
-                email = f"{first_name.lower()}.{last_name.lower()}@pdmedical.com.au"
-                contacts.append({
-                    'name': name,
-                    'email': email,
-                    'raw_text': contacts_text
-                })
+            first_name = name_parts[0].rstrip('.')
+            last_name = name_parts[-1].rstrip('.')
+            # Generate placeholder email
+            email = f"{first_name.lower()}.{last_name.lower()}@pdmedical.com.au"
+            contacts.append({
+                'name': name,
+                'email': email,
+                'raw_text': contacts_text
+            })
     
     return contacts
 
+def connect() -> ProductImportRepository:
+    """Load .env and build the Supabase client and repository on first use
+    
+    Exits if the credentials are missing. Does nothing when a repository is
+    already in place (see use_repository).
+    """
+    global SUPABASE_URL, SUPABASE_KEY, supabase, repo
+    if repo is not None:
+        return repo
+    
+    from dotenv import load_dotenv
+    from supabase import create_client
+    
+    # Load environment variables
+    load_dotenv()
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+    
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("ERROR: Please set SUPABASE_URL and SUPABASE_KEY in your .env file")
+        print("NOTE: Use SUPABASE_SERVICE_ROLE_KEY for inserts (not anon key)")
+        sys.exit(1)
+    
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    repo = SupabaseRepository(supabase)
+    return repo
+
+def use_repository(repository: Optional[ProductImportRepository]):
+    """Point the migration at another repository and forget everything cached
+    
+    None drops the current repository; the next connect() builds the
+    Supabase one again.
+    """
+    global repo, _org_domains_loaded
+    repo = repository
+    for cache in (_org_cache, _contact_cache, _product_cache, _category_cache):
+        cache.clear()
+    _org_domains_loaded = False
+
+def row_log(message: str):
+    """Per-row progress message (suppressed by --quiet)"""
+    if not _quiet:
+        print(message)
+
+def cached_id(namespace: str, key: str) -> Optional[str]:
+    """In-memory id lookup; hits are marked as used in the persistent cache"""
+    value = LOOKUP_NAMESPACES[namespace][2].get(key)
+    repo.metrics.cache_lookup(namespace, value is not None)
+    if value is not None and _lookup_cache is not None:
+        _lookup_cache.touch(namespace, key)
+    return value
+
+def remember_id(namespace: str, key: str, value: str):
+    """Store an id in the in-memory cache and, when enabled, the persistent cache"""
+    LOOKUP_NAMESPACES[namespace][2][key] = value
+    if _lookup_cache is not None:
+        _lookup_cache.put(namespace, key, value)
+
+def sync_lookup_cache(cache: LookupCache):
+    """Validate the persistent cache against updated_at watermarks and preload it
+    
+    Per table: one select of the rows updated at or after the stored watermark
+    (changed rows refresh or drop their entries), then the cached ids are
+    re-checked with id=in.(...) selects so rows deleted since the last run,
+    which updated_at cannot show, are dropped even if others were inserted.
+    """
+    for namespace, (table, key_column, memory) in LOOKUP_NAMESPACES.items():
+        watermark = cache.watermark(namespace)
+        try:
+            if watermark is None:
+                cache.clear(namespace)
+                watermark = repo.latest_updated_at(table)
+            else:
+                # gte: rows committed later with the same updated_at must not be missed
+                rows = repo.rows_updated_since(table, f'id, {key_column}, updated_at', watermark, LOOKUP_DELTA_LIMIT)
+                if len(rows) >= LOOKUP_DELTA_LIMIT:
+                    # Too much changed to patch entry by entry; start the namespace over
+                    cache.clear(namespace)
+                    rows = []
+                rows = list({row['id']: row for row in rows}.values())
+                cache.invalidate_values(namespace, [row['id'] for row in rows])
+                for row in rows:
+                    if row.get(key_column):
+                        key = row[key_column] if namespace == 'category' else row[key_column].lower()
+                        cache.put(namespace, key, row['id'])
+                    watermark = max(watermark, row['updated_at'])
+            
+            cached_ids = set(cache.load(namespace).values())
+            if cached_ids:
+                cache.invalidate_values(namespace, cached_ids - repo.existing_ids(table, cached_ids))
+            cache.set_watermark(namespace, watermark)
+        except Exception as e:
+            # Without a watermark nothing cached for this table can be trusted
+            print(f"   ⚠️  Could not validate cached {namespace} ids: {str(e)}")
+            cache.clear(namespace)
+        
+        memory.update(cache.load(namespace))
+
+def load_organization_domains():
+    """Prefetch the id and domain of every organization once into the domain cache"""
+    global _org_domains_loaded
+    if _org_domains_loaded:
+        return
+    
+    for row in repo.iter_organizations(ORG_PAGE_SIZE):
+        domain = (row.get('domain') or '').lower()
+        if domain and domain not in _org_cache:
+            remember_id('organization', domain, row['id'])
+    _org_domains_loaded = True
+
 def get_or_create_organization(domain: str = None, name: str = None) -> Optional[str]:
-    """Get organization ID or create if doesn't exist"""
+    """Get organization ID or create if doesn't exist
+    
+    Organizations are matched on domain only. name (the contact's name)
+    only names a newly created organization: organizations created by
+    earlier imports are named after people, so matching on it would merge
+    unrelated domains.
+    """
     # Use domain from email or default
     if not domain:
         domain = 'pdmedical.com.au'
     
     # Check cache first
     cache_key = domain.lower()
-    if cache_key in _org_cache:
-        return _org_cache[cache_key]
+    cached = cached_id('organization', cache_key)
+    if cached:
+        return cached
     
     try:
-        # Try to find by domain
-        if domain:
-            response = supabase.table('organizations').select('id').eq('domain', domain).execute()
-            if response.data and len(response.data) > 0:
-                _org_cache[cache_key] = response.data[0]['id']
-                return response.data[0]['id']
-        
-        # Try to find by name
-        if name:
-            response = supabase.table('organizations').select('id').ilike('name', f'%{name}%').execute()
-            if response.data and len(response.data) > 0:
-                org_id = response.data[0]['id']
-                _org_cache[cache_key] = org_id
-                return org_id
+        # Domains of all existing organizations are cached by the prefetch
+        load_organization_domains()
+        if cache_key in _org_cache:
+            return _org_cache[cache_key]
         
         # Create new organization
         org_data = {
@@ -248,12 +481,11 @@ def get_or_create_organization(domain: str = None, name: str = None) -> Optional
             'status': 'active'
         }
         
-        response = supabase.table('organizations').insert(org_data).execute()
+        org_id = repo.insert_organization(org_data)
         
-        if response.data:
-            org_id = response.data[0]['id']
-            _org_cache[cache_key] = org_id
-            print(f"   📁 Created organization: {org_data['name']}")
+        if org_id:
+            remember_id('organization', cache_key, org_id)
+            row_log(f"   📁 Created organization: {org_data['name']}")
             return org_id
     except Exception as e:
         print(f"   ⚠️  Error with organization '{domain}': {str(e)}")
@@ -273,16 +505,16 @@ def get_or_create_contact(name: str, email: str, organization_id: str) -> Tuple[
     email_lower = email.lower().strip()
     
     # Check cache first
-    if email_lower in _contact_cache:
-        return _contact_cache[email_lower], False  # Already existed
+    cached = cached_id('contact', email_lower)
+    if cached:
+        return cached, False  # Already existed
     
     try:
         # Check if contact exists
-        response = supabase.table('contacts').select('id').eq('email', email_lower).execute()
+        contact_id = repo.find_contact_id(email_lower)
         
-        if response.data and len(response.data) > 0:
-            contact_id = response.data[0]['id']
-            _contact_cache[email_lower] = contact_id
+        if contact_id:
+            remember_id('contact', email_lower, contact_id)
             return contact_id, False  # Already existed
         
         # Parse name
@@ -299,58 +531,105 @@ def get_or_create_contact(name: str, email: str, organization_id: str) -> Tuple[
             'status': 'active'
         }
         
-        response = supabase.table('contacts').insert(contact_data).execute()
+        contact_id = repo.insert_contact(contact_data)
         
-        if response.data:
-            contact_id = response.data[0]['id']
-            _contact_cache[email_lower] = contact_id
-            print(f"   👤 Created contact: {email}")
+        if contact_id:
+            remember_id('contact', email_lower, contact_id)
+            row_log(f"   👤 Created contact: {email}")
             return contact_id, True  # Newly created
     except Exception as e:
         print(f"   ⚠️  Error creating contact '{email}': {str(e)}")
     
     return None, False
 
-def merge_product_and_sales_data(products, sales_data):
-    """Merge product data with sales priorities"""
-    print("🔄 Merging product and sales data...")
+def sales_matcher(sales_data):
+    """Build match(product_name) -> (sales row or None, tier) over the sales rows
     
-    sales_lookup = {s['product_name'].lower().strip(): s for s in sales_data if s['product_name']}
+    Tiers: exact (lower/strip name), normalised (punctuation, spacing and plurals
+    folded), token_set (bounded fuzzy match within shared-token blocks).
+    """
+    named_sales = [s for s in sales_data if s['product_name']]
+    exact_lookup = {s['product_name'].lower().strip(): s for s in named_sales}
+    normalised_lookup = {normalise_name_key(s['product_name']): s for s in named_sales}
+    normalised_lookup.pop('', None)
+    token_index = None
     
-    merged_products = []
-    matched_count = 0
+    def match(product_name):
+        nonlocal token_index
+        if not product_name:
+            return None, 'unmatched'
+        
+        sales_info = exact_lookup.get(product_name.lower().strip())
+        if sales_info is not None:
+            return sales_info, 'exact'
+        
+        sales_info = normalised_lookup.get(normalise_name_key(product_name))
+        if sales_info is not None:
+            return sales_info, 'normalised'
+        
+        # Build the fuzzy index only if some product actually needs it
+        if token_index is None:
+            token_index = TokenSetIndex(s['product_name'] for s in named_sales)
+        best = token_index.best_match(product_name)
+        if best is not None:
+            return named_sales[best[0]], 'token_set'
+        return None, 'unmatched'
     
-    for product in products:
-        product_name = product['product_name']
-        product_key = product_name.lower().strip() if product_name else None
+    return match
+
+def apply_sales_info(product, sales_info):
+    """Copy priority, instructions and status from a sales row onto a product"""
+    if sales_info is not None:
+        priority_num, status = parse_priority_label(sales_info['priority_label'])
         
-        if product_key and product_key in sales_lookup:
-            sales_info = sales_lookup[product_key]
-            matched_count += 1
-            
-            priority_num, status = parse_priority_label(sales_info['priority_label'])
-            
-            product['sales_priority'] = priority_num
-            product['sales_priority_label'] = sales_info['priority_label']
-            product['sales_instructions'] = sales_info['instructions']
-            product['sales_timing_notes'] = sales_info['timing_notes']
-            product['sales_status'] = status
-            
-            if sales_info['additional_notes']:
-                if product['sales_instructions']:
-                    product['sales_instructions'] += f"\n\n{sales_info['additional_notes']}"
-                else:
-                    product['sales_instructions'] = sales_info['additional_notes']
-        else:
-            product['sales_priority'] = None
-            product['sales_priority_label'] = None
-            product['sales_instructions'] = None
-            product['sales_timing_notes'] = None
-            product['sales_status'] = 'active'
+        product['sales_priority'] = priority_num
+        product['sales_priority_label'] = sales_info['priority_label']
+        product['sales_instructions'] = sales_info['instructions']
+        product['sales_timing_notes'] = sales_info['timing_notes']
+        product['sales_status'] = status
         
-        merged_products.append(product)
+        if sales_info['additional_notes']:
+            if product['sales_instructions']:
+                product['sales_instructions'] += f"\n\n{sales_info['additional_notes']}"
+            else:
+                product['sales_instructions'] = sales_info['additional_notes']
+    else:
+        product['sales_priority'] = None
+        product['sales_priority_label'] = None
+        product['sales_instructions'] = None
+        product['sales_timing_notes'] = None
+        product['sales_status'] = 'active'
+    return product
+
+def print_merge_summary(merged_count: int, tier_counts: Dict[str, int]):
+    matched_count = merged_count - tier_counts['unmatched']
+    print(f"✅ Merged {merged_count} products with sales data ({matched_count} matches)")
+    print("   " + ", ".join(f"{tier}: {count}" for tier, count in tier_counts.items()))
+
+def sales_merger(sales_data):
+    """Build merge(product) -> product with its sales row applied
+    
+    Returns (merge, match counts by tier); the counts grow as merge is called.
+    run_pipeline's merge stage and merge_product_and_sales_data both use it.
+    """
+    match = sales_matcher(sales_data)
+    tier_counts = {tier: 0 for tier in MATCH_TIERS}
+    
+    def merge(product):
+        sales_info, tier = match(product['product_name'])
+        tier_counts[tier] += 1
+        return apply_sales_info(product, sales_info)
+    
+    return merge, tier_counts
+
+def merge_product_and_sales_data(products, sales_data):
+    """Merge a whole list of products with sales priorities (no pipeline)"""
+    print("🔄 Merging product and sales data...")
+    
+    merge, tier_counts = sales_merger(sales_data)
+    merged_products = [merge(product) for product in products]
     
-    print(f"✅ Merged {len(merged_products)} products with sales data ({matched_count} matches)")
+    print_merge_summary(len(merged_products), tier_counts)
     return merged_products
 
 def get_or_create_category(category_name):
@@ -358,95 +637,198 @@ def get_or_create_category(category_name):
     if not category_name:
         return None
     
+    cached = cached_id('category', category_name)
+    if cached:
+        return cached
+    
     try:
-        response = supabase.table('product_categories').select('id').eq('category_name', category_name).execute()
+        category_id = repo.find_category_id(category_name)
         
-        if response.data and len(response.data) > 0:
-            return response.data[0]['id']
+        if category_id:
+            remember_id('category', category_name, category_id)
+            return category_id
         
-        response = supabase.table('product_categories').insert({
+        category_id = repo.insert_category({
             'category_name': category_name,
             'description': f'{category_name} products',
             'is_active': True
-        }).execute()
+        })
         
-        if response.data:
-            print(f"   📁 Created category: {category_name}")
-            return response.data[0]['id']
+        if category_id:
+            remember_id('category', category_name, category_id)
+            row_log(f"   📁 Created category: {category_name}")
+            return category_id
     except Exception as e:
         print(f"   ⚠️  Error with category '{category_name}': {str(e)}")
     
     return None
 
-def import_products_to_supabase(products):
-    """Import products into Supabase and create related records"""
+def link_contacts_to_product(product_id: str, contact_orgs: Dict[str, str]) -> int:
+    """Create the missing contact_product_interests links for one product
+    
+    contact_orgs maps contact_id -> organization_id. Existing links are fetched
+    in one query and the missing ones are inserted in one bulk request, so the
+    cost per product is two requests however many key contacts it has.
+    Returns the number of links created.
+    """
+    contact_ids = list(contact_orgs)
+    linked = repo.linked_contact_ids(product_id, contact_ids)
+    
+    missing = [
+        {
+            'contact_id': contact_id,
+            'organization_id': contact_orgs[contact_id],
+            'product_id': product_id,
+            'interest_level': 'high',  # Default high if mentioned in key contacts
+            'status': 'prospecting',
+            'source': 'excel_import',
+            'lead_score_contribution': 10,  # Give points for key contact interest
+        }
+        for contact_id in contact_ids
+        if contact_id not in linked
+    ]
+    if not missing:
+        return 0
+    
+    # A link created concurrently since the select is skipped, not an error
+    return repo.insert_interests(missing)
+
+def product_row(product: Dict, category_id: Optional[str] = None, keep_empty: bool = False) -> Dict:
+    """Column values for a products insert (None/'' left to the table defaults)
+    
+    keep_empty=True sends blank values as NULL instead, so an update clears
+    fields that were emptied in the workbook.
+    """
+    product_data = {
+        'product_code': product['product_code'],
+        'product_name': product['product_name'],
+        'category_id': category_id,
+        'category_name': product['category_name'],
+        'market_potential': product['market_potential'],
+        'background_history': product['background_history'],
+        'key_contacts_reference': product['key_contacts_reference'],
+        'forecast_notes': product['forecast_notes'],
+        'sales_priority': product['sales_priority'],
+        'sales_priority_label': product['sales_priority_label'],
+        'sales_instructions': product['sales_instructions'],
+        'sales_timing_notes': product['sales_timing_notes'],
+        'sales_status': product['sales_status'],
+        'is_active': True if product['sales_status'] != 'removed' else False,
+    }
+    
+    if keep_empty:
+        return {k: (None if v == '' else v) for k, v in product_data.items()}
+    return {k: v for k, v in product_data.items() if v is not None and v != ''}
+
+def product_hash(product: Dict) -> str:
+    """Hash of everything the import writes for a product (ids excluded)"""
+    return record_hash(product_row(product))
+
+def import_products_to_supabase(products, journal: Optional[ImportJournal] = None, total: Optional[int] = None,
+                                hashes: Optional[RowHashStore] = None):
+    """Import products into Supabase and create related records
+    
+    products may be a list or any iterable (the pipeline passes a queue
+    drain); total is only used for progress output. Products carrying
+    'parsed_contacts' (see run_pipeline) are not parsed again.
+    
+    With a journal, finished products, contacts and interest links are
+    recorded as they complete and anything already in the journal is skipped
+    without a network call (see --resume).
+    
+    With hashes (--sync), products whose record hash matches the last sync are
+    skipped without a request, and existing products are updated from the
+    workbook instead of skipped.
+    """
     print("\n🚀 Starting import to Supabase...")
     
+    if total is None and hasattr(products, '__len__'):
+        total = len(products)
+    total_label = total if total is not None else '?'
+    progress = ProgressLine(total) if _quiet else None
+    
     success_count = 0
     error_count = 0
     skipped_count = 0
+    resumed_count = 0
+    updated_count = 0
+    unchanged_count = 0
     contacts_created = 0
     interests_created = 0
     errors = []
     
+    i = 0
     for i, product in enumerate(products, 1):
+        if progress:
+            progress.update(i - 1, imported=success_count, skipped=skipped_count + resumed_count, errors=error_count)
         try:
-            # Check if product already exists
-            existing = supabase.table('products').select('id, product_code').eq('product_code', product['product_code']).execute()
+            # Finished in an earlier (interrupted) run
+            if journal and journal.completed_product(product['product_code']):
+                resumed_count += 1
+                continue
             
-            product_id = None
-            if existing.data and len(existing.data) > 0:
-                product_id = existing.data[0]['id']
-                skipped_count += 1
-                print(f"⏭️  [{i}/{len(products)}] Skipped (exists): {product['product_code']}")
+            if hashes is not None:
+                row_hash = product_hash(product)
+                if hashes.get(product['product_code']) == row_hash:
+                    unchanged_count += 1
+                    continue
+                
+                # New or edited since the last sync: update in place if it exists
+                category_id = get_or_create_category(product['category_name'])
+                product_id = repo.update_product(product['product_code'], product_row(product, category_id, keep_empty=True))
+                if product_id:
+                    updated_count += 1
+                    row_log(f"🔁 [{i}/{total_label}] Updated: {product['product_code']} - {product['product_name']}")
             else:
+                # Check if product already exists
+                product_id = repo.find_product_id(product['product_code'])
+                
+                if product_id:
+                    skipped_count += 1
+                    row_log(f"⏭️  [{i}/{total_label}] Skipped (exists): {product['product_code']}")
+            
+            if not product_id:
                 # Get category ID
                 category_id = get_or_create_category(product['category_name'])
                 
                 # Prepare product data
-                product_data = {
-                    'product_code': product['product_code'],
-                    'product_name': product['product_name'],
-                    'category_id': category_id,
-                    'category_name': product['category_name'],
-                    'market_potential': product['market_potential'],
-                    'background_history': product['background_history'],
-                    'key_contacts_reference': product['key_contacts_reference'],
-                    'forecast_notes': product['forecast_notes'],
-                    'sales_priority': product['sales_priority'],
-                    'sales_priority_label': product['sales_priority_label'],
-                    'sales_instructions': product['sales_instructions'],
-                    'sales_timing_notes': product['sales_timing_notes'],
-                    'sales_status': product['sales_status'],
-                    'is_active': True if product['sales_status'] != 'removed' else False,
-                }
-                
-                product_data = {k: v for k, v in product_data.items() if v is not None and v != ''}
+                product_data = product_row(product, category_id)
                 
                 # Insert product
-                response = supabase.table('products').insert(product_data).execute()
+                product_id = repo.insert_product(product_data)
                 
-                if response.data:
-                    product_id = response.data[0]['id']
+                if product_id:
                     success_count += 1
-                    print(f"✅ [{i}/{len(products)}] Imported: {product['product_code']} - {product['product_name']}")
+                    row_log(f"✅ [{i}/{total_label}] Imported: {product['product_code']} - {product['product_name']}")
                 else:
                     error_count += 1
                     error_msg = f"Failed to import {product['product_code']}: No data returned"
                     errors.append(error_msg)
-                    print(f"❌ [{i}/{len(products)}] {error_msg}")
+                    print(f"❌ [{i}/{total_label}] {error_msg}")
                     continue
             
             # Cache product_id for contact_product_interests
             if product_id:
                 _product_cache[product['product_code']] = product_id
+                product_complete = True
                 
                 # Parse and create contacts from key_contacts_reference
                 if product['key_contacts_reference']:
-                    parsed_contacts = parse_contacts_from_text(product['key_contacts_reference'])
+                    parsed_contacts = product.get('parsed_contacts')
+                    if parsed_contacts is None:
+                        parsed_contacts = parse_contacts_from_text(product['key_contacts_reference'])
                     
+                    # Resolve every key contact first, then reconcile the product's links as a set
+                    contact_orgs = {}
                     for contact_info in parsed_contacts:
                         try:
+                            journaled = journal.contact(contact_info['email']) if journal else None
+                            if journal:
+                                repo.metrics.cache_lookup('journal_contact', journaled is not None)
+                            if journaled:
+                                contact_orgs.setdefault(*journaled)
+                                continue
+                            
                             # Get or create organization
                             domain = extract_domain_from_email(contact_info['email'])
                             org_id = get_or_create_organization(domain, contact_info.get('name'))
@@ -461,49 +843,64 @@ def import_products_to_supabase(products):
                                 org_id
                             )
                             
-                            if contact_id and product_id:
+                            if contact_id:
                                 # Only count newly created contacts
                                 if was_created:
                                     contacts_created += 1
-                                
-                                # Create contact_product_interests link
-                                try:
-                                    # Check if interest already exists
-                                    existing_interest = supabase.table('contact_product_interests').select('id').eq('contact_id', contact_id).eq('product_id', product_id).execute()
-                                    
-                                    if not existing_interest.data or len(existing_interest.data) == 0:
-                                        interest_data = {
-                                            'contact_id': contact_id,
-                                            'organization_id': org_id,
-                                            'product_id': product_id,
-                                            'interest_level': 'high',  # Default high if mentioned in key contacts
-                                            'status': 'prospecting',
-                                            'source': 'excel_import',
-                                            'lead_score_contribution': 10,  # Give points for key contact interest
-                                        }
-                                        
-                                        response = supabase.table('contact_product_interests').insert(interest_data).execute()
-                                        
-                                        if response.data:
-                                            interests_created += 1
-                                except Exception as e:
-                                    # Ignore duplicate key errors
-                                    if 'duplicate' not in str(e).lower():
-                                        print(f"      ⚠️  Could not create interest link: {str(e)}")
+                                contact_orgs.setdefault(contact_id, org_id)
+                                if journal:
+                                    journal.record_contact(contact_info['email'], contact_id, org_id)
+                            else:
+                                product_complete = False
                         except Exception as e:
+                            product_complete = False
                             print(f"      ⚠️  Error processing contact {contact_info.get('email')}: {str(e)}")
+                    
+                    if journal:
+                        for contact_id in journal.linked_contacts(product_id):
+                            contact_orgs.pop(contact_id, None)
+                    
+                    if contact_orgs:
+                        try:
+                            interests_created += link_contacts_to_product(product_id, contact_orgs)
+                            if journal:
+                                journal.record_interests(product_id, contact_orgs)
+                        except Exception as e:
+                            product_complete = False
+                            print(f"      ⚠️  Could not create interest links: {str(e)}")
+                
+                # Only fully linked products are skipped on resume / next sync
+                if journal and product_complete:
+                    journal.complete_product(product['product_code'], product_id)
+                if hashes is not None and product_complete:
+                    hashes.record(product['product_code'], row_hash)
                             
         except Exception as e:
             error_count += 1
             error_msg = f"Error importing {product.get('product_code', 'UNKNOWN')}: {str(e)}"
             errors.append(error_msg)
-            print(f"❌ [{i}/{len(products)}] {error_msg}")
+            print(f"❌ [{i}/{total_label}] {error_msg}")
+    
+    if progress:
+        progress.finish(i, imported=success_count, skipped=skipped_count + resumed_count, errors=error_count)
     
+    if hashes is not None:
+        repo.metrics.results.update(updated=updated_count, unchanged=unchanged_count)
+        print(f"\n🔁 Sync: {updated_count} updated, {unchanged_count} unchanged since the last sync")
+    print_import_summary(success_count, skipped_count, resumed_count if journal else None,
+                         contacts_created, interests_created, error_count, errors)
+    return success_count, error_count, skipped_count, contacts_created, interests_created
+
+def print_import_summary(success_count, skipped_count, resumed_count, contacts_created,
+                         interests_created, error_count, errors):
+    """Final import report (resumed_count None when running without a journal)"""
     print(f"\n{'='*80}")
     print(f"📊 IMPORT SUMMARY")
     print(f"{'='*80}")
     print(f"✅ Successfully imported: {success_count} products")
     print(f"⏭️  Skipped (already exists): {skipped_count} products")
+    if resumed_count is not None:
+        print(f"📒 Skipped (completed in journal): {resumed_count} products")
     print(f"👤 Contacts created: {contacts_created}")
     print(f"🔗 Contact-Product interests created: {interests_created}")
     print(f"❌ Failed: {error_count} products")
@@ -515,58 +912,207 @@ def import_products_to_supabase(products):
             print(f"   - {error}")
         if len(errors) > 10:
             print(f"   ... and {len(errors) - 10} more errors")
-    
-    return success_count, error_count, skipped_count, contacts_created, interests_created
 
-def verify_import():
-    """Verify the imported data"""
-    print("\n🔍 Verifying import...")
+def bulk_import_products(products, journal: Optional[ImportJournal] = None, total: Optional[int] = None,
+                         batch_size: int = BULK_BATCH_SIZE):
+    """Import products with the import_products_bulk RPC, batch_size products per call
     
-    try:
-        # Count total products
-        response = supabase.table('products').select('id', count='exact').execute()
-        total_count = response.count if hasattr(response, 'count') else len(response.data) if response.data else 0
+    Each call resolves categories, organizations, contacts, products and
+    interest links server-side in one transaction, so a failed batch leaves
+    nothing behind and is reported as batch_size failed products. Returns the
+    same counts as import_products_to_supabase.
+    """
+    print(f"\n🚀 Starting bulk import to Supabase ({batch_size} products per call)...")
+    
+    if total is None and hasattr(products, '__len__'):
+        total = len(products)
+    progress = ProgressLine(total) if _quiet else None
+    counts = {key: 0 for key in ('products_created', 'products_skipped', 'contacts_created', 'interests_created')}
+    resumed_count = 0
+    error_count = 0
+    errors = []
+    done = 0
+    
+    def send(batch):
+        nonlocal error_count, done
+        try:
+            result = repo.import_products_bulk([payload for _, payload in batch])
+            for key in counts:
+                counts[key] += result.get(key, 0)
+            if journal:
+                for product, payload in batch:
+                    product_id = result['product_ids'].get(product['product_code'])
+                    if product_id:
+                        journal.complete_product(product['product_code'], product_id)
+            row_log(f"✅ [{done + len(batch)}/{total if total is not None else '?'}] "
+                    f"Batch of {len(batch)}: {result.get('products_created', 0)} created, "
+                    f"{result.get('products_skipped', 0)} skipped")
+        except Exception as e:
+            error_count += len(batch)
+            error_msg = (f"Batch {batch[0][0]['product_code']}..{batch[-1][0]['product_code']} "
+                         f"failed: {str(e)}")
+            errors.append(error_msg)
+            print(f"❌ {error_msg}")
+        done += len(batch)
+        if progress:
+            progress.update(done + resumed_count, imported=counts['products_created'], errors=error_count)
+    
+    batch = []
+    for product in products:
+        # Finished in an earlier (interrupted) run
+        if journal and journal.completed_product(product['product_code']):
+            resumed_count += 1
+            continue
         
-        # Count contacts
-        response = supabase.table('contacts').select('id', count='exact').execute()
-        contact_count = response.count if hasattr(response, 'count') else len(response.data) if response.data else 0
+        parsed_contacts = product.get('parsed_contacts')
+        if parsed_contacts is None:
+            parsed_contacts = parse_contacts_from_text(product['key_contacts_reference'])
+        payload = product_row(product)
+        payload['contacts'] = [{'email': c['email'], 'name': c.get('name')} for c in parsed_contacts]
+        batch.append((product, payload))
         
-        # Count contact_product_interests
-        response = supabase.table('contact_product_interests').select('id', count='exact').execute()
-        interest_count = response.count if hasattr(response, 'count') else len(response.data) if response.data else 0
+        if len(batch) >= batch_size:
+            send(batch)
+            batch = []
+    if batch:
+        send(batch)
+    
+    if progress:
+        progress.finish(done + resumed_count, imported=counts['products_created'], errors=error_count)
+    
+    print_import_summary(counts['products_created'], counts['products_skipped'],
+                         resumed_count if journal else None, counts['contacts_created'],
+                         counts['interests_created'], error_count, errors)
+    return (counts['products_created'], error_count, counts['products_skipped'],
+            counts['contacts_created'], counts['interests_created'])
+
+def iter_product_chunks(df: pd.DataFrame, chunk_rows: int = PIPELINE_CHUNK_ROWS):
+    """Yield product dicts from the raw product sheet, chunk_rows sheet rows at a time"""
+    data = df.iloc[DATA_START_ROW:]
+    for start in range(0, len(data), chunk_rows):
+        yield from products_from_rows(data.iloc[start:start + chunk_rows])
+
+def attach_parsed_contacts(product: Dict) -> Dict:
+    """Parse key contacts ahead of the loader (see import_products_to_supabase)"""
+    text = product['key_contacts_reference']
+    product['parsed_contacts'] = parse_contacts_from_text(text) if text else []
+    return product
+
+def feed_queue(items, out_queue: queue.Queue, transform, failures: List[BaseException]):
+    """Pipeline stage: put transform(item) for every item, then the end marker"""
+    try:
+        for item in items:
+            out_queue.put(transform(item))
+    except BaseException as e:
+        # Re-raised by run_pipeline in the main thread
+        failures.append(e)
+    finally:
+        out_queue.put(_END_OF_STREAM)
+
+def drain_queue(in_queue: queue.Queue):
+    """Yield items from a stage's queue until its end marker"""
+    while True:
+        item = in_queue.get()
+        if item is _END_OF_STREAM:
+            return
+        yield item
+
+def run_pipeline(product_sheet: pd.DataFrame, sales_data, total: int,
+                 journal: Optional[ImportJournal] = None, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 loader=import_products_to_supabase):
+    """Extract -> merge -> parse contacts -> load, with the stages overlapped
+    
+    Extraction and merging run in one thread and contact parsing in another,
+    each handing products on through a bounded queue, while the loader
+    writes in the calling thread (loader: import_products_to_supabase or
+    bulk_import_products). The first insert starts once the first
+    chunk is merged, and no more than 2 * queue_size + PIPELINE_CHUNK_ROWS
+    product dicts exist at any time.
+    Returns (loader results, match counts by tier).
+    """
+    merge, tier_counts = sales_merger(sales_data)
+    
+    merged = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue(maxsize=queue_size)
+    failures: List[BaseException] = []
+    # Busy time per worker shows up in the metrics report under these stage names
+    stages = [
+        threading.Thread(target=feed_queue, name='merge', daemon=True,
+                         args=(iter_product_chunks(product_sheet), merged,
+                               repo.metrics.timed('pipeline.merge', merge), failures)),
+        threading.Thread(target=feed_queue, name='parse-contacts', daemon=True,
+                         args=(drain_queue(merged), parsed,
+                               repo.metrics.timed('pipeline.parse_contacts', attach_parsed_contacts), failures)),
+    ]
+    for stage in stages:
+        stage.start()
+    
+    results = loader(drain_queue(parsed), journal, total)
+    
+    # Every failure is recorded before its stage's end marker reaches the loader;
+    # an upstream stage may still be blocked on a full queue, so don't join then
+    if failures:
+        raise failures[0]
+    for stage in stages:
+        stage.join()
+    return results, tier_counts
+
+SUMMARY_TABLES = ('products', 'contacts', 'contact_product_interests', 'organizations')
+
+def summary_from_tables() -> Dict:
+    """Fallback for verify_import when get_product_import_summary is not deployed.
+    
+    The exact head counts and the two paged column reads are independent,
+    so they run concurrently.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    with ThreadPoolExecutor(max_workers=len(SUMMARY_TABLES) + 2) as pool:
+        counts = {table: pool.submit(repo.count_rows, table) for table in SUMMARY_TABLES}
+        category_values = pool.submit(repo.column_values, 'products', 'category_name')
+        priority_values = pool.submit(repo.column_values, 'products', 'sales_priority')
         
-        # Count organizations
-        response = supabase.table('organizations').select('id', count='exact').execute()
-        org_count = response.count if hasattr(response, 'count') else len(response.data) if response.data else 0
+        summary = {table: future.result() or 0 for table, future in counts.items()}
         
-        # Count by category
-        response = supabase.table('products').select('category_name').execute()
         categories = {}
-        if response.data:
-            for row in response.data:
-                cat = row.get('category_name') or 'Uncategorized'
-                categories[cat] = categories.get(cat, 0) + 1
+        for cat in category_values.result():
+            cat = cat or 'Uncategorized'
+            categories[cat] = categories.get(cat, 0) + 1
         
-        # Count by priority
-        response = supabase.table('products').select('sales_priority').execute()
         priorities = {}
-        if response.data:
-            for row in response.data:
-                priority = row.get('sales_priority')
-                priority_label = str(priority) if priority is not None else 'No Priority'
-                priorities[priority_label] = priorities.get(priority_label, 0) + 1
+        for priority in priority_values.result():
+            priority_label = str(priority) if priority is not None else 'No Priority'
+            priorities[priority_label] = priorities.get(priority_label, 0) + 1
+    
+    summary['categories'] = categories
+    summary['priorities'] = priorities
+    return summary
+
+def verify_import():
+    """Verify the imported data"""
+    print("\n🔍 Verifying import...")
+    
+    try:
+        # One round trip: exact counts and grouped breakdowns computed server-side
+        try:
+            summary = repo.import_summary()
+        except Exception as e:
+            print(f"⚠️  get_product_import_summary unavailable ({str(e)}); counting table by table")
+            summary = None
+        if not summary:
+            summary = summary_from_tables()
         
-        print(f"\n✅ Total products in database: {total_count}")
-        print(f"👤 Total contacts in database: {contact_count}")
-        print(f"🔗 Total contact-product interests: {interest_count}")
-        print(f"📁 Total organizations: {org_count}")
+        print(f"\n✅ Total products in database: {summary['products']}")
+        print(f"👤 Total contacts in database: {summary['contacts']}")
+        print(f"🔗 Total contact-product interests: {summary['contact_product_interests']}")
+        print(f"📁 Total organizations: {summary['organizations']}")
         
         print(f"\n📊 Products by Category:")
-        for cat, count in sorted(categories.items()):
+        for cat, count in sorted(summary['categories'].items()):
             print(f"   {cat}: {count}")
         
         print(f"\n🎯 Products by Sales Priority:")
-        for priority, count in sorted(priorities.items()):
+        for priority, count in sorted(summary['priorities'].items()):
             print(f"   Priority {priority}: {count}")
         
         return True
@@ -577,8 +1123,92 @@ def verify_import():
         traceback.print_exc()
         return False
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate PDMedical products from Excel to Supabase.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: skip products, contacts and links already in the journal.",
+    )
+    parser.add_argument(
+        "--journal",
+        default=str(DEFAULT_JOURNAL),
+        help=f"Checkpoint journal path (default: {DEFAULT_JOURNAL.name} next to this script).",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="Do not record progress (a later --resume starts from the beginning).",
+    )
+    parser.add_argument(
+        "--lookup-cache",
+        default=str(DEFAULT_LOOKUP_CACHE),
+        help=f"Persistent id lookup cache path (default: {DEFAULT_LOOKUP_CACHE.name} next to this script).",
+    )
+    parser.add_argument(
+        "--lookup-cache-ttl-days",
+        type=float,
+        default=7,
+        help="Evict cached ids not used for this many days (default: 7).",
+    )
+    parser.add_argument(
+        "--no-lookup-cache",
+        action="store_true",
+        help="Look every contact, organization and category up in Supabase.",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Replace per-product messages with a progress line updated every few seconds.",
+    )
+    parser.add_argument(
+        "--metrics-report",
+        default=str(DEFAULT_METRICS_REPORT),
+        help=f"Where to write the JSON run metrics (default: {DEFAULT_METRICS_REPORT.name} next to "
+             "this script; pass an empty string to skip).",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Import through the import_products_bulk RPC (a few calls instead of several per product).",
+    )
+    parser.add_argument(
+        "--bulk-batch-size",
+        type=int,
+        default=BULK_BATCH_SIZE,
+        help=f"Products per import_products_bulk call (default: {BULK_BATCH_SIZE}).",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Incremental re-sync: push only products whose record changed since the last --sync, as updates.",
+    )
+    parser.add_argument(
+        "--sync-state",
+        default=str(DEFAULT_SYNC_STATE),
+        help=f"Product hash store used by --sync (default: {DEFAULT_SYNC_STATE.name} next to this script).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=PIPELINE_QUEUE_SIZE,
+        help=f"Products buffered between pipeline stages (default: {PIPELINE_QUEUE_SIZE}).",
+    )
+    args = parser.parse_args(argv)
+    if args.sync and args.bulk:
+        # import_products_bulk skips existing products rather than updating them
+        parser.error("--sync cannot be combined with --bulk")
+    return args
+
+def main(argv=None):
     """Main migration function"""
+    global _lookup_cache, _quiet
+    args = parse_args(argv)
+    _quiet = args.quiet
+    metrics = connect().metrics
+    # Journal and lookup cache are keyed by project; injected repositories have none
+    project_url = SUPABASE_URL or 'offline'
+    
     print("="*80)
     print("🏥 PDMedical Products Migration (COMPLETE)")
     print("="*80)
@@ -586,24 +1216,70 @@ def main():
     print(f"📄 Excel file: {EXCEL_FILE}")
     print("="*80)
     
+    journal = None
+    hashes = None
     try:
-        # Step 1: Extract data from Excel
-        products = extract_products_from_excel()
+        if not args.no_journal:
+            journal = ImportJournal(args.journal)
+            journal.start(project_url, resume=args.resume)
+            if args.resume:
+                counts = journal.counts()
+                print(f"📒 Resuming from journal: {counts['products']} products, "
+                      f"{counts['contacts']} contacts, {counts['interests']} interest links done")
         
-        if not products:
+        if not args.no_lookup_cache:
+            _lookup_cache = LookupCache(
+                project_url,
+                args.lookup_cache,
+                ttl_seconds=args.lookup_cache_ttl_days * 24 * 3600,
+            )
+            with metrics.stage('sync_lookup_cache'):
+                sync_lookup_cache(_lookup_cache)
+            print(f"🗂️  Lookup cache: {len(_contact_cache)} contacts, {len(_org_cache)} organization domains, "
+                  f"{len(_category_cache)} categories")
+        
+        if args.sync:
+            hashes = RowHashStore(project_url, args.sync_state)
+            print(f"🔁 Incremental sync: {len(hashes)} product hashes from the last sync")
+        
+        # Step 1: Read the workbook
+        with metrics.stage('read_workbook'):
+            product_sheet = read_product_sheet()
+            total = count_products(product_sheet)
+        
+        if not total:
             print("❌ No products found in Excel file. Exiting.")
             sys.exit(1)
+        print(f"✅ Found {total} products in Excel")
         
-        sales_data = extract_sales_priorities()
+        with metrics.stage('read_workbook'):
+            sales_data = extract_sales_priorities()
         
-        # Step 2: Merge product and sales data
-        merged_products = merge_product_and_sales_data(products, sales_data)
-        
-        # Step 3: Import to Supabase (includes contacts and interests)
-        success_count, error_count, skipped_count, contacts_created, interests_created = import_products_to_supabase(merged_products)
+        # Steps 2-3: Extract, merge with sales data, parse contacts and import
+        # to Supabase (includes contacts and interests) as overlapping stages
+        print("🔄 Merging product and sales data while importing...")
+        with metrics.stage('pipeline'):
+            if args.bulk:
+                loader = partial(bulk_import_products, batch_size=args.bulk_batch_size)
+            else:
+                loader = partial(import_products_to_supabase, hashes=hashes)
+            results, tier_counts = run_pipeline(product_sheet, sales_data, total, journal,
+                                                args.queue_size, loader)
+        success_count, error_count, skipped_count, contacts_created, interests_created = results
+        metrics.results.update(
+            products=total,
+            imported=success_count,
+            skipped=skipped_count,
+            errors=error_count,
+            contacts_created=contacts_created,
+            interests_created=interests_created,
+            match_tiers=tier_counts,
+        )
+        print_merge_summary(total, tier_counts)
         
         # Step 4: Verify import
-        verify_import()
+        with metrics.stage('verify'):
+            verify_import()
         
         print("\n" + "="*80)
         if error_count == 0:
@@ -614,11 +1290,29 @@ def main():
         print(f"📅 Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("="*80)
         
+    except JournalMismatch as e:
+        print(f"\n❌ {str(e)}")
+        print("   Run without --resume to start a fresh journal for this project.")
+        sys.exit(1)
     except Exception as e:
         print(f"\n❌ MIGRATION FAILED: {str(e)}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if journal:
+            journal.close()
+        if hashes is not None:
+            hashes.close()
+        if _lookup_cache is not None:
+            _lookup_cache.close()
+            _lookup_cache = None
+        if args.metrics_report:
+            try:
+                path = metrics.write_report(args.metrics_report)
+                print(f"📈 {repo.request_count} requests; metrics report written to {path}")
+            except OSError as e:
+                print(f"⚠️  Could not write metrics report: {str(e)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+"""
+Name normalisation and bounded fuzzy lookup for the product migration.
+
+Used by migrate_products_from_excel.py to join Product Info rows to Sales
+rows when the names differ only by punctuation, spacing, case or plurals,
+and to match organization names locally instead of running wildcard scans
+against the organizations table.
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Filler words that carry no identity in product names
+STOP_TOKENS = frozenset(["a", "an", "and", "for", "of", "the", "with", "incl"])
+
+
+def singularise(token: str) -> str:
+    """Cheap plural folding: trays -> tray, batteries -> battery, glass stays glass."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def name_tokens(name: str | None) -> tuple[str, ...]:
+    """Lower-cased, punctuation-free, singularised tokens (stop words dropped)."""
+    if not name:
+        return ()
+    words = _NON_ALNUM.sub(" ", name.lower()).split()
+    return tuple(singularise(w) for w in words if w not in STOP_TOKENS)
+
+
+def normalise_name_key(name: str | None) -> str:
+    """Join key that ignores case, punctuation, repeated spaces and plurals."""
+    return " ".join(name_tokens(name))
+
+
+def token_set_score(a: frozenset[str], b: frozenset[str]) -> float:
+    """Jaccard similarity of two token sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TokenSetIndex:
+    """Inverted token index for bounded token-set matching.
+
+    Candidates for a query are the entries that share at least one token with
+    it (the query's block). Tokens whose posting list exceeds max_block_size
+    are treated as too common to block on, so a lookup touches at most
+    len(tokens) * max_block_size postings and scores only the top_k entries
+    with the most shared tokens, however large the index grows.
+    """
+
+    def __init__(
+        self,
+        names: Iterable[str | None],
+        max_block_size: int = 64,
+        top_k: int = 8,
+    ) -> None:
+        self.max_block_size = max_block_size
+        self.top_k = top_k
+        self.token_sets: list[frozenset[str]] = []
+        self.postings: dict[str, list[int]] = defaultdict(list)
+        for entry_id, name in enumerate(names):
+            tokens = frozenset(name_tokens(name))
+            self.token_sets.append(tokens)
+            for token in tokens:
+                self.postings[token].append(entry_id)
+
+    def candidates(self, tokens: frozenset[str]) -> list[int]:
+        """Entry ids in the query's blocks, most shared tokens first."""
+        hits: Counter[int] = Counter()
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting and len(posting) <= self.max_block_size:
+                hits.update(posting)
+        return [entry_id for entry_id, _ in hits.most_common(self.top_k)]
+
+    def best_match(self, name: str | None, threshold: float = 0.75) -> tuple[int, float] | None:
+        """Return (entry_id, score) of the best entry scoring >= threshold."""
+        tokens = frozenset(name_tokens(name))
+        best: tuple[int, float] | None = None
+        for entry_id in self.candidates(tokens):
+            score = token_set_score(tokens, self.token_sets[entry_id])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (entry_id, score)
+        return best
+
+
+def trigrams(name: str | None) -> frozenset[str]:
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams: set[str] = set()
+    for word in _NON_ALNUM.sub(" ", (name or "").lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class TrigramIndex:
+    """Incremental trigram index returning ranked similar names.
+
+    Scoring mirrors pg_trgm similarity (shared / union trigrams). Trigrams
+    shared by more than max_block_size entries are skipped when gathering
+    candidates (unless the query has nothing rarer), and only the top_k
+    entries by shared-trigram count are scored, which keeps lookups well
+    under a millisecond for tens of thousands of names.
+    """
+
+    def __init__(self, max_block_size: int = 256, top_k: int = 16) -> None:
+        self.max_block_size = max_block_size
+        self.top_k = top_k
+        self.gram_sets: list[frozenset[str]] = []
+        self.postings: dict[str, list[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.gram_sets)
+
+    def add(self, name: str | None) -> int:
+        """Index a name and return its entry id."""
+        entry_id = len(self.gram_sets)
+        grams = trigrams(name)
+        self.gram_sets.append(grams)
+        for gram in grams:
+            self.postings[gram].append(entry_id)
+        return entry_id
+
+    def search(
+        self,
+        name: str | None,
+        limit: int = 5,
+        threshold: float = 0.3,
+    ) -> list[tuple[int, float]]:
+        """Return up to limit (entry_id, similarity) pairs, best first."""
+        grams = trigrams(name)
+        postings = sorted(
+            (self.postings[g] for g in grams if g in self.postings), key=len
+        )
+        selective = [p for p in postings if len(p) <= self.max_block_size] or postings[:3]
+
+        hits: Counter[int] = Counter()
+        for posting in selective:
+            hits.update(posting)
+
+        ranked = []
+        for entry_id, _ in hits.most_common(self.top_k):
+            score = token_set_score(grams, self.gram_sets[entry_id])
+            if score >= threshold:
+                ranked.append((entry_id, score))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
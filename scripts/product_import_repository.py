@@ -0,0 +1,493 @@
+"""
+Table operations used by migrate_products_from_excel.py.
+
+The migration talks to storage only through a ProductImportRepository:
+
+    SupabaseRepository  - the live project via the supabase client
+    InMemoryRepository  - an in-process store enforcing the same unique keys
+                          (products.product_code, contacts.email,
+                          product_categories.category_name,
+                          contact_product_interests(contact_id, product_id)),
+                          for profiling and regression tests without a project
+
+Every repository counts and times its requests per (table, operation) in
+a RunMetrics (see run_metrics.py), so runs can be compared by round trips
+and latency as well as wall time.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, Optional
+
+from run_metrics import RunMetrics
+
+
+class DuplicateKeyError(Exception):
+    """Insert violated a unique key (mirrors the Postgres error text)."""
+
+
+class ProductImportRepository(ABC):
+    """Storage operations needed by the product migration.
+
+    Every storage operation is abstract, so a backend missing one fails when
+    it is constructed rather than partway through an import.
+    """
+
+    def __init__(self, metrics: Optional[RunMetrics] = None) -> None:
+        self.metrics = metrics or RunMetrics()
+
+    @contextmanager
+    def _request(self, table: str, operation: str):
+        """Wrap one round trip: counted and timed, failed if it raises."""
+        with self.metrics.request(table, operation):
+            yield
+
+    @property
+    def requests(self) -> Counter[tuple[str, str]]:
+        return Counter(self.metrics.requests)
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.metrics.requests.values())
+
+    # products
+    @abstractmethod
+    def find_product_id(self, product_code: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def insert_product(self, data: dict) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def update_product(self, product_code: str, data: dict) -> Optional[str]:
+        """Update a product in place; its id, or None if no product has the code."""
+
+    # categories
+    @abstractmethod
+    def find_category_id(self, category_name: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def insert_category(self, data: dict) -> Optional[str]:
+        ...
+
+    # organizations
+    @abstractmethod
+    def iter_organizations(self, page_size: int) -> Iterator[dict]:
+        """Yield id and domain of every organization, page by page."""
+
+    @abstractmethod
+    def insert_organization(self, data: dict) -> Optional[str]:
+        ...
+
+    # contacts
+    @abstractmethod
+    def find_contact_id(self, email: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def insert_contact(self, data: dict) -> Optional[str]:
+        ...
+
+    # contact_product_interests
+    @abstractmethod
+    def linked_contact_ids(self, product_id: str, contact_ids: list[str]) -> set[str]:
+        """Which of contact_ids already have an interest link to product_id."""
+
+    @abstractmethod
+    def insert_interests(self, rows: list[dict]) -> int:
+        """Bulk insert links, skipping (contact_id, product_id) duplicates; returns rows created."""
+
+    # generic reads (lookup-cache validation, verification)
+    @abstractmethod
+    def count_rows(self, table: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def latest_updated_at(self, table: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def rows_updated_since(self, table: str, columns: str, watermark: str, limit: int) -> list[dict]:
+        """Rows with updated_at >= watermark, oldest first, at most limit."""
+
+    @abstractmethod
+    def existing_ids(self, table: str, ids: Iterable[str]) -> set[str]:
+        """Which of ids still exist in table."""
+
+    @abstractmethod
+    def column_values(self, table: str, column: str) -> list[Any]:
+        """Every row's value of column (paged, so never truncated by max-rows)."""
+
+    @abstractmethod
+    def import_products_bulk(self, products: list[dict]) -> dict:
+        """Resolve/create categories, organizations, contacts, products and links in one call.
+
+        products are product rows (as inserted by the per-row import) plus
+        'contacts': [{'email', 'name'}]. Returns import_products_bulk()'s
+        counts: products_created, products_skipped, categories_created,
+        organizations_created, contacts_created, interests_created, and
+        product_ids (product_code -> id).
+        """
+
+    @abstractmethod
+    def import_summary(self) -> Optional[dict]:
+        """Exact table counts plus category/priority breakdowns in one call.
+
+        Shape of get_product_import_summary(): products, contacts,
+        contact_product_interests, organizations (ints) and categories,
+        priorities ({label: count}).
+        """
+
+
+def _email_domain(email: Optional[str]) -> str:
+    """Domain the import files a contact's organization under (as in the SQL function)."""
+    domain = (email or '').lower().strip().partition('@')[2]
+    return domain or 'pdmedical.com.au'
+
+
+def _first_id(response) -> Optional[str]:
+    return response.data[0]['id'] if response.data else None
+
+
+class SupabaseRepository(ProductImportRepository):
+    def __init__(self, client, metrics: Optional[RunMetrics] = None) -> None:
+        super().__init__(metrics)
+        self.client = client
+
+    def find_product_id(self, product_code):
+        with self._request('products', 'select'):
+            return _first_id(self.client.table('products').select('id, product_code').eq('product_code', product_code).execute())
+
+    def insert_product(self, data):
+        with self._request('products', 'insert'):
+            return _first_id(self.client.table('products').insert(data).execute())
+
+    def update_product(self, product_code, data):
+        with self._request('products', 'update'):
+            return _first_id(self.client.table('products').update(data).eq('product_code', product_code).execute())
+
+    def find_category_id(self, category_name):
+        with self._request('product_categories', 'select'):
+            return _first_id(self.client.table('product_categories').select('id').eq('category_name', category_name).execute())
+
+    def insert_category(self, data):
+        with self._request('product_categories', 'insert'):
+            return _first_id(self.client.table('product_categories').insert(data).execute())
+
+    def iter_organizations(self, page_size):
+        start = 0
+        while True:
+            with self._request('organizations', 'select'):
+                response = self.client.table('organizations').select('id, domain').order('id').range(start, start + page_size - 1).execute()
+            rows = response.data or []
+            if not rows:
+                return
+            yield from rows
+            start += len(rows)
+
+    def insert_organization(self, data):
+        with self._request('organizations', 'insert'):
+            return _first_id(self.client.table('organizations').insert(data).execute())
+
+    def find_contact_id(self, email):
+        with self._request('contacts', 'select'):
+            return _first_id(self.client.table('contacts').select('id').eq('email', email).execute())
+
+    def insert_contact(self, data):
+        with self._request('contacts', 'insert'):
+            return _first_id(self.client.table('contacts').insert(data).execute())
+
+    def linked_contact_ids(self, product_id, contact_ids):
+        with self._request('contact_product_interests', 'select'):
+            response = self.client.table('contact_product_interests').select('contact_id').eq('product_id', product_id).in_('contact_id', contact_ids).execute()
+        return {row['contact_id'] for row in response.data or []}
+
+    def insert_interests(self, rows):
+        with self._request('contact_product_interests', 'upsert'):
+            response = self.client.table('contact_product_interests').upsert(
+                rows, on_conflict='contact_id,product_id', ignore_duplicates=True
+            ).execute()
+        return len(response.data or [])
+
+    def count_rows(self, table):
+        with self._request(table, 'count'):
+            return self.client.table(table).select('id', count='exact', head=True).execute().count
+
+    def latest_updated_at(self, table):
+        with self._request(table, 'select'):
+            response = self.client.table(table).select('updated_at').order('updated_at', desc=True).limit(1).execute()
+        return response.data[0]['updated_at'] if response.data else None
+
+    def rows_updated_since(self, table, columns, watermark, limit):
+        with self._request(table, 'select'):
+            response = self.client.table(table).select(columns).gte('updated_at', watermark).order('updated_at').limit(limit).execute()
+        return response.data or []
+
+    def existing_ids(self, table, ids, chunk_size=150):
+        ids = sorted(ids)
+        found = set()
+        for start in range(0, len(ids), chunk_size):
+            with self._request(table, 'select'):
+                response = self.client.table(table).select('id').in_('id', ids[start:start + chunk_size]).execute()
+            found.update(row['id'] for row in response.data or [])
+        return found
+
+    def column_values(self, table, column, page_size=1000):
+        values = []
+        while True:
+            with self._request(table, 'select'):
+                response = self.client.table(table).select(f'id, {column}').order('id').range(len(values), len(values) + page_size - 1).execute()
+            rows = response.data or []
+            # A short page only means the server capped it (max-rows); stop on an empty one
+            if not rows:
+                return values
+            values.extend(row.get(column) for row in rows)
+
+    def import_products_bulk(self, products):
+        with self._request('import_products_bulk', 'rpc'):
+            return self.client.rpc('import_products_bulk', {'p_products': products}).execute().data
+
+    def import_summary(self):
+        with self._request('get_product_import_summary', 'rpc'):
+            return self.client.rpc('get_product_import_summary').execute().data
+
+
+class InMemoryRepository(ProductImportRepository):
+    """In-process tables with the migration's unique keys and optional per-request latency."""
+
+    UNIQUE_KEYS = {
+        'products': ('product_code',),
+        'product_categories': ('category_name',),
+        'contacts': ('email',),
+        'contact_product_interests': ('contact_id', 'product_id'),
+    }
+
+    def __init__(self, latency: float = 0.0, metrics: Optional[RunMetrics] = None) -> None:
+        super().__init__(metrics)
+        self.latency = latency
+        self.tables: dict[str, dict[str, dict]] = {
+            table: {} for table in ('products', 'product_categories', 'organizations',
+                                    'contacts', 'contact_product_interests')
+        }
+        self.indexes: dict[str, dict[tuple, str]] = {table: {} for table in self.UNIQUE_KEYS}
+
+    @contextmanager
+    def _request(self, table, operation):
+        with super()._request(table, operation):
+            if self.latency:
+                time.sleep(self.latency)
+            yield
+
+    def _key(self, table: str, row: dict) -> Optional[tuple]:
+        columns = self.UNIQUE_KEYS.get(table)
+        key = tuple(row.get(c) for c in columns) if columns else None
+        # Like a Postgres unique constraint, NULLs never collide
+        return None if key is None or None in key else key
+
+    def _insert(self, table: str, data: dict) -> str:
+        key = self._key(table, data)
+        if key is not None and key in self.indexes[table]:
+            raise DuplicateKeyError(
+                f'duplicate key value violates unique constraint on {table} {key}'
+            )
+        row = dict(data)
+        row.setdefault('id', str(uuid.uuid4()))
+        now = datetime.now(timezone.utc).isoformat()
+        row.setdefault('created_at', now)
+        row['updated_at'] = now
+        self.tables[table][row['id']] = row
+        if key is not None:
+            self.indexes[table][key] = row['id']
+        return row['id']
+
+    def _lookup(self, table: str, *key) -> Optional[str]:
+        return self.indexes[table].get(tuple(key))
+
+    def find_product_id(self, product_code):
+        with self._request('products', 'select'):
+            return self._lookup('products', product_code)
+
+    def insert_product(self, data):
+        with self._request('products', 'insert'):
+            return self._insert('products', data)
+
+    def update_product(self, product_code, data):
+        with self._request('products', 'update'):
+            product_id = self._lookup('products', product_code)
+            if product_id is not None:
+                row = self.tables['products'][product_id]
+                row.update(data)
+                row['updated_at'] = datetime.now(timezone.utc).isoformat()
+            return product_id
+
+    def find_category_id(self, category_name):
+        with self._request('product_categories', 'select'):
+            return self._lookup('product_categories', category_name)
+
+    def insert_category(self, data):
+        with self._request('product_categories', 'insert'):
+            return self._insert('product_categories', data)
+
+    def iter_organizations(self, page_size):
+        rows = sorted(self.tables['organizations'].values(), key=lambda r: r['id'])
+        for start in range(0, len(rows) + 1, page_size):
+            with self._request('organizations', 'select'):
+                page = rows[start:start + page_size]
+            if not page:
+                return
+            for row in page:
+                yield {'id': row['id'], 'domain': row.get('domain')}
+
+    def insert_organization(self, data):
+        with self._request('organizations', 'insert'):
+            return self._insert('organizations', data)
+
+    def find_contact_id(self, email):
+        with self._request('contacts', 'select'):
+            return self._lookup('contacts', email)
+
+    def insert_contact(self, data):
+        with self._request('contacts', 'insert'):
+            return self._insert('contacts', data)
+
+    def linked_contact_ids(self, product_id, contact_ids):
+        with self._request('contact_product_interests', 'select'):
+            return {c for c in contact_ids if self._lookup('contact_product_interests', c, product_id)}
+
+    def insert_interests(self, rows):
+        with self._request('contact_product_interests', 'upsert'):
+            created = 0
+            for row in rows:
+                if self._key('contact_product_interests', row) not in self.indexes['contact_product_interests']:
+                    self._insert('contact_product_interests', row)
+                    created += 1
+            return created
+
+    def count_rows(self, table):
+        with self._request(table, 'count'):
+            return len(self.tables[table])
+
+    def latest_updated_at(self, table):
+        with self._request(table, 'select'):
+            return max((r['updated_at'] for r in self.tables[table].values()), default=None)
+
+    def rows_updated_since(self, table, columns, watermark, limit):
+        with self._request(table, 'select'):
+            wanted = [c.strip() for c in columns.split(',')]
+            rows = sorted(
+                (r for r in self.tables[table].values() if r['updated_at'] >= watermark),
+                key=lambda r: r['updated_at'],
+            )
+            return [{c: r.get(c) for c in wanted} for r in rows[:limit]]
+
+    def existing_ids(self, table, ids):
+        with self._request(table, 'select'):
+            return set(ids) & self.tables[table].keys()
+
+    def column_values(self, table, column):
+        with self._request(table, 'select'):
+            return [r.get(column) for r in self.tables[table].values()]
+
+    def import_summary(self):
+        with self._request('get_product_import_summary', 'rpc'):
+            summary = {table: len(self.tables[table]) for table in
+                       ('products', 'contacts', 'contact_product_interests', 'organizations')}
+            products = self.tables['products'].values()
+            summary['categories'] = dict(Counter(r.get('category_name') or 'Uncategorized' for r in products))
+            summary['priorities'] = dict(Counter(
+                str(r['sales_priority']) if r.get('sales_priority') is not None else 'No Priority'
+                for r in products
+            ))
+            return summary
+
+    def import_products_bulk(self, products):
+        """Same resolution order and counts as the import_products_bulk() SQL function."""
+        with self._request('import_products_bulk', 'rpc'):
+            counts = Counter()
+            products = [p for p in products if p.get('product_code')]
+
+            categories = {}
+            for product in products:
+                name = product.get('category_name') or None
+                if name and name not in categories:
+                    categories[name] = self._lookup('product_categories', name)
+                    if categories[name] is None:
+                        categories[name] = self._insert('product_categories', {
+                            'category_name': name, 'description': f'{name} products', 'is_active': True,
+                        })
+                        counts['categories_created'] += 1
+
+            product_ids = {}
+            for product in products:
+                code = product['product_code']
+                if code in product_ids:
+                    continue
+                product_ids[code] = self._lookup('products', code)
+                if product_ids[code] is None:
+                    row = {k: v for k, v in product.items() if k != 'contacts' and v is not None and v != ''}
+                    row['category_id'] = categories.get(product.get('category_name') or None)
+                    row.setdefault('sales_status', 'active')
+                    row['is_active'] = row['sales_status'] != 'removed'
+                    product_ids[code] = self._insert('products', row)
+                    counts['products_created'] += 1
+            counts['products_skipped'] = len(product_ids) - counts['products_created']
+
+            contacts = [(product['product_code'], contact)
+                        for product in products for contact in product.get('contacts') or []]
+            org_ids = {}
+            for _, contact in contacts:
+                domain = _email_domain(contact.get('email'))
+                if domain not in org_ids:
+                    org_ids[domain] = self._organization_by_domain(domain)
+                    if org_ids[domain] is None:
+                        name = (contact.get('name') or '').strip() or domain.split('.')[0].title() + ' Organization'
+                        org_ids[domain] = self._insert('organizations', {
+                            'name': name, 'domain': domain, 'status': 'active',
+                        })
+                        counts['organizations_created'] += 1
+
+            for code, contact in contacts:
+                email = (contact.get('email') or '').lower().strip()
+                if not email:
+                    continue
+                org_id = org_ids[_email_domain(email)]
+                contact_id = self._lookup('contacts', email)
+                if contact_id is None:
+                    parts = (contact.get('name') or '').split()
+                    contact_id = self._insert('contacts', {
+                        'email': email,
+                        'first_name': parts[0] if parts else None,
+                        'last_name': parts[-1] if len(parts) > 1 else None,
+                        'organization_id': org_id,
+                        'status': 'active',
+                    })
+                    counts['contacts_created'] += 1
+                if not self._lookup('contact_product_interests', contact_id, product_ids[code]):
+                    self._insert('contact_product_interests', {
+                        'contact_id': contact_id, 'organization_id': org_id, 'product_id': product_ids[code],
+                        'interest_level': 'high', 'status': 'prospecting', 'source': 'excel_import',
+                        'lead_score_contribution': 10,
+                    })
+                    counts['interests_created'] += 1
+
+            summary = {key: counts[key] for key in (
+                'products_created', 'products_skipped', 'categories_created',
+                'organizations_created', 'contacts_created', 'interests_created')}
+            summary['product_ids'] = product_ids
+            return summary
+
+    def _organization_by_domain(self, domain: str) -> Optional[str]:
+        rows = [r for r in self.tables['organizations'].values() if (r.get('domain') or '').lower() == domain]
+        return min(rows, key=lambda r: r['created_at'])['id'] if rows else None
+
+    def seed(self, table: str, rows: Iterable[dict]) -> None:
+        """Load existing rows without counting requests."""
+        for row in rows:
+            self._insert(table, row)
@@ -0,0 +1,72 @@
+"""
+Row-hash store for incremental re-syncs of the product workbook.
+
+migrate_products_from_excel.py --sync hashes every merged product record
+and stores the hash here once the product (and its contact links) has been
+written. On the next --sync, products whose hash is unchanged are skipped
+without a request; new or edited ones are pushed as inserts or updates.
+
+Unlike the lookup cache, nothing here expires: a missing hash only means
+the product is treated as changed and written again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Mapping
+
+DEFAULT_SYNC_STATE = Path(__file__).resolve().parent / ".sync_state.sqlite"
+
+# Bump when the record layout or its mapping to columns changes, so the next
+# --sync rewrites every product once
+HASH_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_hashes (
+    project_url  TEXT NOT NULL,
+    product_code TEXT NOT NULL,
+    row_hash     TEXT NOT NULL,
+    synced_at    TEXT NOT NULL,
+    PRIMARY KEY (project_url, product_code)
+);
+"""
+
+
+def record_hash(record: Mapping[str, Any]) -> str:
+    """Stable sha256 of a record (key order and None vs '' do not matter)."""
+    canonical = {key: value for key, value in record.items() if value is not None and value != ''}
+    payload = json.dumps([HASH_VERSION, canonical], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RowHashStore:
+    def __init__(self, project_url: str, path: str | Path = DEFAULT_SYNC_STATE) -> None:
+        self.project_url = project_url
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+        self._hashes = dict(self.conn.execute(
+            "SELECT product_code, row_hash FROM product_hashes WHERE project_url = ?",
+            (project_url,),
+        ).fetchall())
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def get(self, product_code: str) -> str | None:
+        return self._hashes.get(product_code)
+
+    def record(self, product_code: str, row_hash: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO product_hashes (project_url, product_code, row_hash, synced_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.project_url, product_code, row_hash, datetime.now(timezone.utc).isoformat()),
+            )
+        self._hashes[product_code] = row_hash
@@ -0,0 +1,208 @@
+"""
+Run metrics for migrate_products_from_excel.py.
+
+RunMetrics collects, for one migration run:
+    * every storage request by (table, operation): count, failures and a
+      latency histogram (plus exact percentiles from the raw samples)
+    * hit/miss counters for the in-process lookup caches and the journal
+    * wall time per stage (reading the workbook, pipeline, verification...)
+      and busy time per pipeline worker
+    * the import results
+
+report() returns all of it as a JSON-serialisable dict; write_report()
+saves it to disk. ProgressLine is the throttled single-line progress
+display used by --quiet.
+"""
+from __future__ import annotations
+
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, TextIO
+
+DEFAULT_METRICS_REPORT = Path(__file__).resolve().parent / ".migration_metrics.json"
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def percentile(sorted_samples: list[float], fraction: float) -> float | None:
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_samples)) - 1, 0)
+    return sorted_samples[rank]
+
+
+class RunMetrics:
+    def __init__(self) -> None:
+        self.started_at = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+        self.requests: Counter[tuple[str, str]] = Counter()
+        self.request_failures: Counter[tuple[str, str]] = Counter()
+        self.latencies: dict[tuple[str, str], list[float]] = defaultdict(list)
+        self.cache_hits: Counter[str] = Counter()
+        self.cache_misses: Counter[str] = Counter()
+        self.stage_seconds: dict[str, float] = defaultdict(float)
+        self.results: dict[str, Any] = {}
+
+    # -- requests -----------------------------------------------------------
+
+    def record_request(self, table: str, operation: str, seconds: float, ok: bool = True) -> None:
+        key = (table, operation)
+        with self._lock:
+            self.requests[key] += 1
+            self.latencies[key].append(seconds)
+            if not ok:
+                self.request_failures[key] += 1
+
+    @contextmanager
+    def request(self, table: str, operation: str):
+        """Count and time one request; an exception marks it failed."""
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record_request(table, operation, time.perf_counter() - start, ok)
+
+    # -- caches -------------------------------------------------------------
+
+    def cache_lookup(self, cache: str, hit: bool) -> None:
+        with self._lock:
+            (self.cache_hits if hit else self.cache_misses)[cache] += 1
+
+    # -- stages -------------------------------------------------------------
+
+    def add_stage_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - start)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Wrap func so the time spent inside it accumulates under stage name."""
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    # -- report -------------------------------------------------------------
+
+    def request_summary(self) -> list[dict]:
+        summary = []
+        with self._lock:
+            items = [(key, count, sorted(self.latencies[key])) for key, count in self.requests.items()]
+            failures = Counter(self.request_failures)
+        for (table, operation), count, samples in sorted(items):
+            histogram = Counter()
+            for seconds in samples:
+                ms = seconds * 1000
+                bound = next((b for b in LATENCY_BUCKETS_MS if ms <= b), None)
+                histogram[f"le_{bound}ms" if bound is not None else "gt_5000ms"] += 1
+            to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+            summary.append({
+                "table": table,
+                "operation": operation,
+                "count": count,
+                "failures": failures[(table, operation)],
+                "total_ms": to_ms(sum(samples)),
+                "mean_ms": to_ms(sum(samples) / len(samples)) if samples else None,
+                "p50_ms": to_ms(percentile(samples, 0.50)),
+                "p95_ms": to_ms(percentile(samples, 0.95)),
+                "p99_ms": to_ms(percentile(samples, 0.99)),
+                "max_ms": to_ms(samples[-1] if samples else None),
+                "histogram": {
+                    bucket: histogram[bucket]
+                    for bucket in [f"le_{b}ms" for b in LATENCY_BUCKETS_MS] + ["gt_5000ms"]
+                    if histogram[bucket]
+                },
+            })
+        return summary
+
+    def cache_summary(self) -> dict[str, dict]:
+        with self._lock:
+            names = sorted(set(self.cache_hits) | set(self.cache_misses))
+            summary = {}
+            for name in names:
+                hits, misses = self.cache_hits[name], self.cache_misses[name]
+                summary[name] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+                }
+            return summary
+
+    def report(self) -> dict:
+        finished_at = datetime.now(timezone.utc)
+        requests = self.request_summary()
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": finished_at.isoformat(),
+            "duration_seconds": round((finished_at - self.started_at).total_seconds(), 3),
+            "results": dict(self.results),
+            "stages_seconds": {name: round(seconds, 3) for name, seconds in sorted(self.stage_seconds.items())},
+            "request_count": sum(r["count"] for r in requests),
+            "requests": requests,
+            "caches": self.cache_summary(),
+        }
+
+    def write_report(self, path: str | Path) -> Path:
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.report(), indent=2))
+        tmp.replace(path)
+        return path
+
+
+class ProgressLine:
+    """Progress display redrawn at most every interval seconds.
+
+    On a terminal the line is rewritten in place; otherwise (logs, pipes)
+    each update is a separate line.
+    """
+
+    def __init__(self, total: int | None, interval: float = 2.0, stream: TextIO | None = None) -> None:
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.start = time.perf_counter()
+        self._last = float("-inf")
+        self._width = 0
+        self._in_place = getattr(self.stream, "isatty", lambda: False)()
+
+    def update(self, done: int, force: bool = False, **counts: int) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        of_total = f"/{self.total}" if self.total is not None else ""
+        details = "".join(f", {name.replace('_', ' ')}: {value}" for name, value in counts.items())
+        line = f"⏳ {done}{of_total} products ({rate:,.0f}/s{details})"
+        if self._in_place:
+            self.stream.write("\r" + line.ljust(self._width))
+            self._width = len(line)
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def finish(self, done: int, **counts: int) -> None:
+        self.update(done, force=True, **counts)
+        if self._in_place:
+            self.stream.write("\n")
+            self.stream.flush()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""Tests for host_org_one_time_setup.py against a fake PostgREST client."""
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from host_org_one_time_setup import (
+    ESTIMATED_UPDATE_RATE,
+    AsyncSupabaseRest,
+    RebuildCursor,
+    SupabaseRest,
+    TraceExporter,
+    find_organization_ids,
+    load_active_mailbox_domains,
+    main,
+    mark_host,
+    format_duration,
+    normalize_domain,
+    plan_setup,
+    print_plan,
+    rebuild_scope,
+    setup_host_organizations,
+)
+from local_postgrest import LocalPostgrest, email_domains, make_fixture, supabase_env
+
+
+class FakeRebuildClient:
+    """Emulates rpc/rebuild_email_scopes_for_domains_batch over an in-memory emails list."""
+
+    def __init__(self, emails, host_domains, fail_on_call=None):
+        self.emails = sorted(emails, key=lambda e: e["id"])
+        self.host_domains = set(host_domains)
+        self.fail_on_call = fail_on_call
+        self.calls = []
+
+    def request(self, method, path, params=None, body=None, prefer=None):
+        self.calls.append((method, path, body))
+        if len(self.calls) == self.fail_on_call:
+            raise RuntimeError(f"{method} {path} failed: 504 timeout")
+        assert path == "rpc/rebuild_email_scopes_for_domains_batch"
+        after, limit = body["p_after"], body["p_limit"]
+        batch = [e for e in self.emails if after is None or e["id"] > after][:limit]
+        updated = 0
+        for email in batch:
+            domains = [normalize_domain(a) for a in email["addresses"] if a]
+            if not set(body["p_domains"]) & set(domains):
+                continue
+            internal = bool(domains) and set(domains) <= self.host_domains
+            if email["is_internal"] != internal:
+                email["is_internal"] = internal
+                updated += 1
+        return {
+            "last_id": batch[-1]["id"] if batch else None,
+            "scanned": len(batch),
+            "updated": updated,
+        }
+
+
+def make_emails(n):
+    emails = []
+    for i in range(n):
+        other = "pdmedical.com.au" if i % 3 else "health.nsw.gov.au"
+        emails.append({
+            "id": f"{i:08d}-0000-0000-0000-000000000000",
+            "addresses": ["amy@pdmedical.com.au", f"x{i}@{other}"],
+            "is_internal": False,
+        })
+    return emails
+
+
+class TestChunkedRebuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cursor_path = Path(self.tmp.name) / "cursor.json"
+
+    def rebuild(self, client, domains=("pdmedical.com.au",), **kwargs):
+        cursor = RebuildCursor(self.cursor_path, "https://example.supabase.co")
+        with contextlib.redirect_stdout(io.StringIO()):
+            return rebuild_scope(client, domains, cursor=cursor, **kwargs)
+
+    def test_batches_cover_every_email_once(self):
+        client = FakeRebuildClient(make_emails(25), ["pdmedical.com.au"])
+        totals = self.rebuild(client, batch_size=10)
+        self.assertEqual(totals, {"batches": 3, "scanned": 25, "updated": 16})
+        self.assertEqual([c[2]["p_after"] is None for c in client.calls], [True, False, False])
+        self.assertEqual(sum(e["is_internal"] for e in client.emails), 16)
+        saved = RebuildCursor(self.cursor_path, "https://example.supabase.co")
+        self.assertIsNone(saved.get(["pdmedical.com.au"]))
+        self.assertGreater(saved.rebuild_rate(), 0)
+
+    def test_exact_multiple_ends_with_empty_batch(self):
+        client = FakeRebuildClient(make_emails(20), ["pdmedical.com.au"])
+        totals = self.rebuild(client, batch_size=10)
+        self.assertEqual((totals["batches"], totals["scanned"]), (3, 20))
+
+    def test_resume_continues_after_last_finished_batch(self):
+        emails = make_emails(25)
+        client = FakeRebuildClient(emails, ["pdmedical.com.au"], fail_on_call=2)
+        with self.assertRaises(RuntimeError):
+            self.rebuild(client, batch_size=10)
+        saved = RebuildCursor(self.cursor_path, "https://example.supabase.co").get(["pdmedical.com.au"])
+        self.assertEqual(saved, emails[9]["id"])
+
+        resumed = FakeRebuildClient(client.emails, ["pdmedical.com.au"])
+        totals = self.rebuild(resumed, batch_size=10, resume=True)
+        self.assertEqual(resumed.calls[0][2]["p_after"], emails[9]["id"])
+        self.assertEqual(totals["scanned"], 15)
+        self.assertEqual(sum(e["is_internal"] for e in resumed.emails), 16)
+
+    def test_cursor_is_ignored_without_resume(self):
+        RebuildCursor(self.cursor_path, "https://example.supabase.co").save(["pdmedical.com.au"], "zzz")
+        client = FakeRebuildClient(make_emails(5), ["pdmedical.com.au"])
+        self.rebuild(client, batch_size=10)
+        self.assertIsNone(client.calls[0][2]["p_after"])
+
+    def test_multiple_domains_share_one_scan(self):
+        emails = make_emails(25)
+        emails[0]["addresses"] = ["amy@pdmedical.com.au", "sam@pdm.co.nz"]
+        emails.append({"id": "99999999-0000", "addresses": ["sam@pdm.co.nz"], "is_internal": False})
+        client = FakeRebuildClient(emails, ["pdmedical.com.au", "pdm.co.nz"])
+        totals = self.rebuild(client, domains=["pdmedical.com.au", "pdm.co.nz"], batch_size=10)
+        self.assertEqual((totals["batches"], totals["scanned"]), (3, 26))
+        self.assertEqual(totals["updated"], 18)
+        self.assertEqual({tuple(c[2]["p_domains"]) for c in client.calls}, {("pdm.co.nz", "pdmedical.com.au")})
+
+        again = self.rebuild(client, domains=["pdm.co.nz", "pdmedical.com.au"], batch_size=10)
+        self.assertEqual(again["updated"], 0)
+
+
+
+class FakeOrganizationsClient:
+    """Answers organizations / organization_domains GETs and PATCHes."""
+
+    def __init__(self, organizations, aliases, latency=0.0):
+        self.organizations = organizations
+        self.aliases = aliases
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+
+    def request(self, method, path, params=None, body=None, prefer=None):
+        with self.lock:
+            self.calls.append((method, path, params))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return self._answer(method, path, params, body)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def iter_rows(self, path, params=None, page_size=1000):
+        return iter(self.request("GET", path, params))
+
+    def _answer(self, method, path, params, body):
+        if method == "PATCH":
+            ids = set(params["id"][len("in.("):-1].split(","))
+            for org in self.organizations:
+                if org["id"] in ids:
+                    org.update(body)
+            return None
+        wanted = set(re.findall(r'domain\.ilike\."([^"]*)"', params["or"]))
+        rows = self.organizations if path == "organizations" else self.aliases
+        return [dict(row) for row in rows if row["domain"].lower() in wanted]
+
+
+class TestOrganizationLookup(unittest.TestCase):
+    def setUp(self):
+        self.organizations = [
+            {"id": f"org-{i:03d}", "domain": f"Host{i}.com.au", "is_host": False}
+            for i in range(40)
+        ]
+        self.aliases = [
+            {"organization_id": "org-001", "domain": "host1.co.nz"},
+            {"organization_id": "org-002", "domain": "host1.co.nz"},
+        ]
+        self.client = FakeOrganizationsClient(self.organizations, self.aliases)
+
+    def test_all_domains_resolved_in_one_request_per_table(self):
+        domains = [f"host{i}.com.au" for i in range(30)] + ["HOST1.co.nz", "unknown.org"]
+        found = find_organization_ids(self.client, domains)
+        self.assertEqual([c[1] for c in self.client.calls], ["organizations", "organization_domains"])
+        self.assertEqual(found["host5.com.au"], ["org-005"])
+        self.assertEqual(found["host1.co.nz"], ["org-001", "org-002"])
+        self.assertEqual(found["unknown.org"], [])
+        self.assertEqual(len(found), 32)
+
+    def test_mark_host_patches_in_chunks(self):
+        ids = [org["id"] for org in self.organizations] * 2
+        with mock.patch("host_org_one_time_setup.MARK_HOST_CHUNK_SIZE", 15):
+            mark_host(self.client, ids)
+        self.assertEqual(len(self.client.calls), 3)
+        self.assertTrue(all(org["is_host"] for org in self.organizations))
+
+    def test_async_lookup_and_mark_run_concurrently_within_limit(self):
+        domains = sorted([f"host{i}.com.au" for i in range(40)] + ["host1.co.nz"])
+        expected = find_organization_ids(self.client, domains)
+        self.client.calls.clear()
+        self.client.latency = 0.02
+
+        async_client = AsyncSupabaseRest(self.client, concurrency=3)
+        with mock.patch("host_org_one_time_setup.LOOKUP_CHUNK_SIZE", 5), \
+                mock.patch("host_org_one_time_setup.MARK_HOST_CHUNK_SIZE", 10), \
+                contextlib.redirect_stdout(io.StringIO()) as out:
+            marked = asyncio.run(setup_host_organizations(async_client, domains, dry_run=False))
+
+        self.assertEqual(self.client.max_in_flight, 3)
+        self.assertEqual([c[0] for c in self.client.calls].count("GET"), 18)
+        self.assertEqual([c[0] for c in self.client.calls].count("PATCH"), 4)
+        self.assertTrue(all(org["is_host"] for org in self.organizations))
+        self.assertEqual(list(marked), domains)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            lines[:-1],
+            [f"{d}: matching organizations: {', '.join(expected[d])}" for d in domains],
+        )
+
+
+
+class FakePlanClient(FakeOrganizationsClient):
+    """Adds id-filtered organization reads and the batched estimate RPC."""
+
+    def __init__(self, organizations, estimate_batches):
+        super().__init__(organizations, [])
+        self.estimate_batches = estimate_batches
+        self.estimate_bodies = []
+
+    def _answer(self, method, path, params, body):
+        if path == "rpc/estimate_email_scope_rebuild":
+            self.estimate_bodies.append(body)
+            return self.estimate_batches[len(self.estimate_bodies) - 1]
+        if method == "GET" and "id" in params:
+            ids = set(params["id"][len("in.("):-1].split(","))
+            return [{"id": o["id"]} for o in self.organizations if o["id"] in ids and not o["is_host"]]
+        return super()._answer(method, path, params, body)
+
+
+class TestDryRunPlan(unittest.TestCase):
+    def setUp(self):
+        self.organizations = [
+            {"id": f"org-{i:03d}", "domain": f"host{i % 2}.com.au", "is_host": i % 5 == 0}
+            for i in range(20)
+        ]
+        # 120000 emails in three keyset batches of 50000
+        self.estimate_batches = [
+            {"last_id": "e-1", "scanned": 50000, "emails_in_scope": 20000, "would_change": 6000,
+             "domains": {"host0.com.au": {"emails": 17000, "would_change": 5500},
+                         "host1.com.au": {"emails": 4000, "would_change": 500}}},
+            {"last_id": "e-2", "scanned": 50000, "emails_in_scope": 10000, "would_change": 3000,
+             "domains": {"host0.com.au": {"emails": 8000, "would_change": 2500},
+                         "host1.com.au": {"emails": 2000, "would_change": 500}}},
+            {"last_id": "e-3", "scanned": 20000, "emails_in_scope": 0, "would_change": 0,
+             "domains": {"host0.com.au": {"emails": 0, "would_change": 0},
+                         "host1.com.au": {"emails": 0, "would_change": 0}}},
+        ]
+        self.client = FakePlanClient(self.organizations, self.estimate_batches)
+        self.org_ids = {
+            "host0.com.au": [o["id"] for o in self.organizations[0::2]],
+            "host1.com.au": [o["id"] for o in self.organizations[1::2]],
+        }
+
+    def test_counts_and_duration_from_observed_rate(self):
+        with mock.patch("host_org_one_time_setup.MARK_HOST_CHUNK_SIZE", 4):
+            plan = plan_setup(self.client, self.org_ids, batch_size=50000, observed_rate=4000.0)
+        self.assertEqual(plan["domains"]["host0.com.au"]["would_mark_host"], 8)
+        self.assertEqual(plan["domains"]["host1.com.au"]["would_mark_host"], 8)
+        # 20 ids in one grouped read of 4 per request, not one per domain per chunk
+        self.assertEqual([c[0] for c in self.client.calls].count("GET"), 5)
+        self.assertEqual(plan["domains"]["host0.com.au"]["would_change"], 8000)
+        self.assertEqual((plan["total_emails"], plan["emails_in_scope"]), (120000, 30000))
+        self.assertEqual((plan["batches"], plan["estimated_seconds"]), (3, 30.0))
+        self.assertEqual(plan["estimate_basis"], "observed rebuild rate")
+        self.assertNotIn("PATCH", [c[0] for c in self.client.calls])
+
+    def test_estimate_pages_with_last_id(self):
+        plan_setup(self.client, self.org_ids, batch_size=50000)
+        self.assertEqual([b["p_after"] for b in self.client.estimate_bodies], [None, "e-1", "e-2"])
+        self.assertEqual({b["p_limit"] for b in self.client.estimate_bodies}, {50000})
+
+    def test_domain_durations_are_weighted_by_scope(self):
+        plan = plan_setup(self.client, self.org_ids, batch_size=50000, observed_rate=4000.0)
+        self.assertEqual(plan["domains"]["host0.com.au"]["estimated_seconds"], 25.0)
+        self.assertEqual(plan["domains"]["host1.com.au"]["estimated_seconds"], 6.0)
+
+    def test_duration_without_observed_rate_grows_with_writes(self):
+        plan = plan_setup(self.client, self.org_ids, batch_size=50000)
+        heavy = plan["domains"]["host0.com.au"]["estimated_seconds"]
+        light = plan["domains"]["host1.com.au"]["estimated_seconds"]
+        self.assertGreater(heavy, light)
+        self.assertGreaterEqual(plan["estimated_seconds"], 9000 / ESTIMATED_UPDATE_RATE)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            print_plan(plan)
+        self.assertIn("host0.com.au: would mark 8 of 10 organizations as host; 25000 emails in scope", out.getvalue())
+        self.assertIn("of the rebuild", out.getvalue())
+        self.assertIn("rebuild: 120000 emails scanned in 3 batches", out.getvalue())
+
+    def test_skip_rebuild_only_counts_organizations(self):
+        plan = plan_setup(self.client, self.org_ids, estimate_rebuild=False)
+        self.assertNotIn("total_emails", plan)
+        self.assertNotIn("POST", [c[0] for c in self.client.calls])
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(4.26), "4.3s")
+        self.assertEqual(format_duration(754), "12m34s")
+        self.assertEqual(format_duration(7500), "2h05m")
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        server.requests.append((self.command, self.path, dict(self.headers)))
+        if self.path.startswith("/rest/v1/missing"):
+            self.reply(404, b'{"message":"relation does not exist"}')
+            return
+        if self.path.startswith("/rest/v1/mailboxes"):
+            self.reply_range([{"email": f"user{i}@host{i % 7}.com.au"} for i in range(2500)])
+            return
+        payload = json.dumps([{"domain": f"host{i}.com.au"} for i in range(200)]).encode()
+        if "drop" in self.path:
+            # Close after replying without announcing it, like an idle timeout
+            self.close_connection = True
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            self.reply(200, gzip.compress(payload), {"Content-Encoding": "gzip"})
+        else:
+            self.reply(200, payload)
+
+    def do_PATCH(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.bodies.append(json.loads(self.rfile.read(length)))
+        self.server.connections.add(self.client_address)
+        self.reply(204, b"")
+
+    def reply_range(self, rows, max_rows=700):
+        """Serve rows by Range header, capped at max_rows like PostgREST's db-max-rows."""
+        first, last = (int(n) for n in self.headers["Range"].split("-"))
+        if first >= len(rows):
+            self.reply(416, b'{"message":"Requested range not satisfiable"}')
+            return
+        page = rows[first:min(last + 1, first + max_rows)]
+        self.reply(206, json.dumps(page).encode(),
+                   {"Content-Range": f"{first}-{first + len(page) - 1}/*"})
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestSupabaseRestConnections(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler)
+        self.server.connections, self.server.requests, self.server.bodies = set(), [], []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = SupabaseRest(f"http://127.0.0.1:{self.server.server_port}", "key")
+        self.addCleanup(self.client.close)
+
+    def test_connection_is_reused_and_gzip_decoded(self):
+        for _ in range(5):
+            rows = self.client.request("GET", "organizations", {"select": "domain"})
+            self.assertEqual(len(rows), 200)
+        self.client.request("PATCH", "organizations", {"id": "in.(a)"}, {"is_host": True})
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.server.bodies, [{"is_host": True}])
+        self.assertEqual(self.server.requests[0][2]["Accept-Encoding"], "gzip")
+
+    def test_error_status_raises_runtime_error_with_body(self):
+        with self.assertRaisesRegex(RuntimeError, r"GET missing failed: 404 .*relation does not exist"):
+            self.client.request("GET", "missing")
+        self.assertEqual(len(self.client.request("GET", "organizations")), 200)
+
+    def test_iter_rows_pages_past_the_server_row_cap(self):
+        rows = list(self.client.iter_rows("mailboxes", {"select": "email", "order": "id"}, page_size=1000))
+        self.assertEqual(len(rows), 2500)
+        self.assertEqual(len({r["email"] for r in rows}), 2500)
+        ranges = [r[2]["Range"] for r in self.server.requests]
+        self.assertEqual(ranges, ["0-999", "700-1699", "1400-2399", "2100-3099", "2500-3499"])
+        self.assertEqual(len(load_active_mailbox_domains(self.client)), 7)
+
+    def test_trace_hooks_and_exporter(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        trace_path = Path(tmp.name) / "trace.jsonl"
+        tracer = TraceExporter(trace_path)
+        started = []
+        self.client.add_hooks(before=lambda event: started.append(dict(event)), after=tracer)
+
+        self.client.request("GET", "organizations", {"select": "domain"})
+        self.client.request("PATCH", "organizations", {"id": "in.(a)"}, {"is_host": True})
+        with self.assertRaises(RuntimeError):
+            self.client.request("GET", "missing")
+        tracer.close()
+
+        self.assertEqual([e["path"] for e in started], ["organizations", "organizations", "missing"])
+        self.assertNotIn("status", started[0])
+        events = [json.loads(line) for line in trace_path.read_text().splitlines()]
+        self.assertEqual([(e["method"], e["status"]) for e in events],
+                         [("GET", 200), ("PATCH", 204), ("GET", 404)])
+        get = events[0]
+        self.assertEqual(get["bytes_out"], 0)
+        self.assertLess(get["bytes_in"], len(json.dumps([{"domain": f"host{i}.com.au"} for i in range(200)])))
+        self.assertEqual(events[1]["bytes_out"], len(b'{"is_host": true}'))
+        self.assertGreaterEqual(get["latency_ms"], 0)
+
+        summary = {row["endpoint"]: row for row in tracer.summary()}
+        self.assertEqual(set(summary), {"GET organizations", "PATCH organizations", "GET missing"})
+        self.assertEqual(summary["GET missing"]["errors"], 1)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            tracer.print_summary()
+        self.assertIn("GET organizations", out.getvalue())
+
+    def test_dropped_idle_connection_is_retried(self):
+        self.client.request("GET", "organizations", {"select": "drop"})
+        time.sleep(0.05)
+        self.assertEqual(len(self.client.request("GET", "organizations")), 200)
+        self.assertEqual(len(self.server.connections), 2)
+
+
+
+class TestAgainstLocalPostgrest(unittest.TestCase):
+    def run_setup(self, tables, *extra, **stand_in):
+        with LocalPostgrest(tables, **stand_in) as api, tempfile.TemporaryDirectory() as tmp, \
+                supabase_env(api.url), contextlib.redirect_stdout(io.StringIO()):
+            main(["--from-active-mailboxes", "--cursor-file", str(Path(tmp) / "c.json"), *extra])
+        return api
+
+    def test_end_to_end_marks_hosts_and_rebuilds_scope(self):
+        tables = make_fixture(5)
+        api = self.run_setup(tables, "--batch-size", "30")
+        hosts = {o["domain"].lower() for o in tables["organizations"] if o["is_host"]}
+        self.assertEqual(hosts, {f"host{d}.com.au" for d in range(5)})
+        host_domains = hosts | {f"host{d}.co.nz" for d in range(5)}
+        for email in tables["emails"]:
+            self.assertEqual(email["is_internal"], set(email_domains(email)) <= host_domains)
+        self.assertEqual(api.requests[("POST", "rpc/rebuild_email_scopes_for_domains_batch")], 4)
+
+    def test_batched_estimate_matches_the_rebuild(self):
+        tables = make_fixture(5)
+        with LocalPostgrest(tables) as api:
+            client = SupabaseRest(api.url, "local")
+            org_ids = find_organization_ids(client, [f"host{d}.com.au" for d in range(5)])
+            plan = plan_setup(client, org_ids, batch_size=30)
+        self.assertEqual(plan["total_emails"], len(tables["emails"]))
+        self.assertEqual(plan["batches"], len(tables["emails"]) // 30 + 1)
+        before = [e["is_internal"] for e in tables["emails"]]
+        self.run_setup(tables, "--batch-size", "30")
+        changed = sum(a != e["is_internal"] for a, e in zip(before, tables["emails"]))
+        self.assertEqual(plan["would_change"], changed)
+
+    def test_request_count_does_not_grow_with_domains(self):
+        few = self.run_setup(make_fixture(3)).request_count
+        many = self.run_setup(make_fixture(60)).request_count
+        self.assertEqual(few, many)
+
+    def test_injected_errors_surface_as_runtime_error(self):
+        with self.assertRaisesRegex(RuntimeError, "503"):
+            self.run_setup(make_fixture(2), error_rate=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
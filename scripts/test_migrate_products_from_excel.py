@@ -0,0 +1,878 @@
+#!/usr/bin/env python3
+"""Tests for migrate_products_from_excel.py extraction and parsing helpers."""
+import contextlib
+import io
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import migrate_products_from_excel as migration
+from migrate_products_from_excel import (
+    clean_text,
+    clean_text_column,
+    parse_contacts_from_text,
+    products_from_frame,
+    sales_from_frame,
+    scan_contacts,
+)
+from name_matching import TokenSetIndex, TrigramIndex, normalise_name_key
+import excel_cache
+from import_journal import ImportJournal, JournalMismatch
+from lookup_cache import LookupCache
+from product_import_repository import (
+    DuplicateKeyError,
+    InMemoryRepository,
+    ProductImportRepository,
+    SupabaseRepository,
+)
+from row_hashes import RowHashStore, record_hash
+from run_metrics import ProgressLine, RunMetrics, percentile
+
+WORKBOOK = Path(__file__).resolve().parent / 'AI- PDMedical_Products-29 10 25 (1).xlsx'
+
+
+def legacy_products(df):
+    """Row-by-row product extraction as originally written (reference output)."""
+    products = []
+    for idx in range(4, len(df)):
+        row = df.iloc[idx]
+        product_code_raw = row[13] if len(row) > 13 else None
+        if pd.notna(product_code_raw) and str(product_code_raw).strip():
+            product_code = str(product_code_raw).strip()
+            if product_code.lower() in ['product code', 'code', 'forecast', 'total qty']:
+                continue
+            product = {
+                'product_code': product_code,
+                'product_name': clean_text(row[2]) if len(row) > 2 else None,
+                'category_name': clean_text(row[3]) if len(row) > 3 else None,
+                'market_potential': clean_text(row[4]) if len(row) > 4 else None,
+                'background_history': clean_text(row[5]) if len(row) > 5 else None,
+                'key_contacts_reference': clean_text(row[6]) if len(row) > 6 else None,
+                'forecast_notes': clean_text(row[10]) if len(row) > 10 else None,
+            }
+            if product['product_code'] and product['product_code'].lower() not in ['nan', 'none', '']:
+                products.append(product)
+    return products
+
+
+def legacy_sales(df):
+    """Row-by-row sales extraction as originally written (reference output)."""
+    sales_data = []
+    for idx in range(4, len(df)):
+        row = df.iloc[idx]
+        product_name_raw = row[2] if len(row) > 2 else None
+        if pd.notna(product_name_raw) and clean_text(product_name_raw):
+            product_name = clean_text(product_name_raw)
+            if product_name.lower() in ['product name', 'product', 'name']:
+                continue
+            sales_data.append({
+                'product_name': product_name,
+                'priority_label': clean_text(row[1]) if len(row) > 1 else None,
+                'category_name': clean_text(row[3]) if len(row) > 3 else None,
+                'instructions': clean_text(row[4]) if len(row) > 4 else None,
+                'timing_notes': clean_text(row[5]) if len(row) > 5 else None,
+                'additional_notes': clean_text(row[6]) if len(row) > 6 else None,
+            })
+    return sales_data
+
+
+def messy_frame(rows, width=14, seed=7):
+    """Random sheet mixing blanks, nan/none/null text, numbers and header labels."""
+    rng = np.random.default_rng(seed)
+    pool = [
+        None, np.nan, '', '   ', 'nan', 'None', 'NULL', 'null', 42, 3.5,
+        'Product Code', 'Total Qty', 'Product Name', 'name',
+        '  Widget  ', 'TC47PP-S', '# 1', 'remove', 'Jen Fredman <jen@x.com>',
+    ]
+    cells = [[pool[rng.integers(len(pool))] for _ in range(width)] for _ in range(rows)]
+    return pd.DataFrame(cells, dtype=object)
+
+
+class TestCleanTextColumn(unittest.TestCase):
+    def test_matches_clean_text(self):
+        values = [None, np.nan, ' x ', 'NaN', ' null ', 'None', '', 7, 1.5, 'keep me']
+        self.assertEqual(clean_text_column(pd.Series(values, dtype=object)).tolist(),
+                         [clean_text(v) for v in values])
+
+    def test_all_missing_float_column(self):
+        self.assertEqual(clean_text_column(pd.Series([np.nan, np.nan])).tolist(),
+                         [None, None])
+
+
+class TestProductsFromFrame(unittest.TestCase):
+    def test_matches_row_loop(self):
+        df = messy_frame(400)
+        self.assertEqual(products_from_frame(df), legacy_products(df))
+
+    def test_null_code_kept_like_row_loop(self):
+        # 'null' is only blank for text fields, not for product codes
+        df = pd.DataFrame([[None] * 13 + ['null']] * 5, dtype=object)
+        self.assertEqual(products_from_frame(df), legacy_products(df))
+        self.assertEqual(len(products_from_frame(df)), 1)
+
+    def test_narrow_sheet(self):
+        df = pd.DataFrame([['a', 'b', 'c']] * 6, dtype=object)
+        self.assertEqual(products_from_frame(df), [])
+
+    @unittest.skipUnless(WORKBOOK.exists(), "workbook not present")
+    def test_workbook_matches_row_loop(self):
+        df = pd.read_excel(WORKBOOK, sheet_name='PDM -Product Info', header=None)
+        self.assertEqual(products_from_frame(df), legacy_products(df))
+
+
+class TestSalesFromFrame(unittest.TestCase):
+    def test_matches_row_loop(self):
+        df = messy_frame(400, width=7, seed=11)
+        self.assertEqual(sales_from_frame(df), legacy_sales(df))
+
+    def test_narrow_sheet(self):
+        df = pd.DataFrame([['a', '# 1']] * 6, dtype=object)
+        self.assertEqual(sales_from_frame(df), [])
+
+    @unittest.skipUnless(WORKBOOK.exists(), "workbook not present")
+    def test_workbook_matches_row_loop(self):
+        df = pd.read_excel(WORKBOOK, sheet_name='Sales ', header=None)
+        self.assertEqual(sales_from_frame(df), legacy_sales(df))
+
+
+def sale(name, label='# 1'):
+    return {'product_name': name, 'priority_label': label, 'category_name': None,
+            'instructions': None, 'timing_notes': None, 'additional_notes': None}
+
+
+class TestNormaliseNameKey(unittest.TestCase):
+    def test_punctuation_spacing_plurals(self):
+        self.assertEqual(normalise_name_key("Tube Connectors, Adaptors  and Spigots"),
+                         normalise_name_key("tube connector adaptor & spigot"))
+
+    def test_keeps_ss_endings(self):
+        self.assertEqual(normalise_name_key("Glass Trays"), "glass tray")
+
+    def test_empty(self):
+        self.assertEqual(normalise_name_key(None), "")
+        self.assertEqual(normalise_name_key(" - "), "")
+
+
+class TestMatchSalesRows(unittest.TestCase):
+    def test_tiers(self):
+        sales = [sale('Sharps Container 1.4L (Yellow)'), sale('Midogas Mobile Stand with Basket'),
+                 sale('Breathing Circuit with Scavenge Tube and Mouthpiece')]
+        sales[1]['priority_label'], sales[2]['priority_label'] = '# 2', '# 3'
+        products = [
+            {'product_name': 'sharps container 1.4l (yellow) '},
+            {'product_name': 'Midogas Mobile Stands, with Basket'},
+            {'product_name': 'Breathing Circuit Scavenge Tube Mouthpiece Adult'},
+            {'product_name': 'Breathing Circuit - Entonox'},
+            {'product_name': None},
+        ]
+        merge, tiers = migration.sales_merger(sales)
+        labels = [merge(product)['sales_priority_label'] for product in products]
+        self.assertEqual(labels, ['# 1', '# 2', '# 3', None, None])
+        self.assertEqual(tiers, {'exact': 1, 'normalised': 1, 'token_set': 1, 'unmatched': 2})
+
+    def test_exact_match_wins_over_normalised(self):
+        sales = [sale('PPE Caddy', '# 2'), sale('PPE caddies', '# 3')]
+        merge, tiers = migration.sales_merger(sales)
+        self.assertEqual(merge({'product_name': 'PPE Caddies'})['sales_priority'], 3)
+        self.assertEqual(tiers['exact'], 1)
+
+    def test_common_tokens_do_not_block(self):
+        index = TokenSetIndex([f"Midogas Part {i}" for i in range(500)], max_block_size=64)
+        self.assertEqual(index.candidates(frozenset(["midoga", "part"])), [])
+        self.assertEqual(index.best_match("Midogas Part 42"), (42, 1.0))
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.names = ["St Vincent's Hospital Sydney", "St Vincents Private Hospital",
+                      "Ramsay Health Care", "Royal Melbourne Hospital"]
+        self.index = TrigramIndex()
+        for name in self.names:
+            self.index.add(name)
+
+    def test_ranked_candidates(self):
+        ranked = self.index.search("st vincents hospital sydney", limit=2)
+        self.assertEqual([entry_id for entry_id, _ in ranked], [0, 1])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+
+    def test_threshold(self):
+        self.assertEqual(self.index.search("Jennifer Fredman", threshold=0.3), [])
+
+    def test_incremental_add(self):
+        entry_id = self.index.add("Midogas Pty Ltd")
+        self.assertEqual(self.index.search("Midogas")[0][0], entry_id)
+        self.assertEqual(len(self.index), 5)
+
+
+class TestParseContactsFromText(unittest.TestCase):
+    def pairs(self, text):
+        return [(c['name'], c['email']) for c in parse_contacts_from_text(text)]
+
+    def test_name_and_email(self):
+        self.assertEqual(
+            self.pairs('Jennifer Fredman <Fredman.Jenn@gmail.com>\nJen now works at Medical Device…..'),
+            [('Jennifer Fredman', 'fredman.jenn@gmail.com')])
+
+    def test_emails_paired_in_order(self):
+        self.assertEqual(
+            self.pairs('Jennifer Fredman (jennifer@hospital.com.au), Dr. Smith (smith@clinic.com).'),
+            [('Jennifer Fredman', 'jennifer@hospital.com.au'), (None, 'smith@clinic.com')])
+
+    def test_placeholder_emails_for_names_only(self):
+        self.assertEqual(
+            self.pairs('Ask Mary J. Smith or Bob Jones'),
+            [('Mary J. Smith', 'mary.smith@pdmedical.com.au'),
+             ('Bob Jones', 'bob.jones@pdmedical.com.au')])
+
+    def test_inner_capital_names(self):
+        self.assertEqual(self.pairs('Karen McDonald karen@x.com'), [('Karen McDonald', 'karen@x.com')])
+        self.assertEqual(self.pairs('Anne DeVries anne@x.com'), [('Anne DeVries', 'anne@x.com')])
+
+    def test_hyphenated_and_apostrophe_names(self):
+        self.assertEqual(self.pairs('Mary-Jane Smith mj@x.com'), [('Mary-Jane Smith', 'mj@x.com')])
+        self.assertEqual(self.pairs("Sean O'Brien sean@x.com"), [("Sean O'Brien", 'sean@x.com')])
+
+    def test_bare_name_cell_creates_placeholder(self):
+        self.assertEqual(
+            self.pairs('Karen McDonald'),
+            [('Karen McDonald', 'karen.mcdonald@pdmedical.com.au')])
+
+    def test_titles_and_acronyms_are_not_names(self):
+        self.assertEqual(scan_contacts('Mr Bob Jones, NSW Health'), ((), ('Bob Jones',)))
+        self.assertEqual(scan_contacts('Bob Jones Dr. Tim Smith'), ((), ('Bob Jones', 'Tim Smith')))
+
+    def test_long_runs_split_into_names(self):
+        self.assertEqual(
+            scan_contacts('Aa Bb C. Dd Ee Ff Gg\tHh.'),
+            ((), ('Bb C. Dd', 'Ee Ff', 'Gg Hh')))
+
+    def test_names_do_not_span_lines_or_punctuation(self):
+        self.assertEqual(scan_contacts('Anne\nBrown, Carl - Dunn'), ((), ()))
+
+    def test_placeholders_capped(self):
+        text = ', '.join(f'Name{chr(97 + i)} Last' for i in range(8))
+        self.assertEqual(len(parse_contacts_from_text(text)), 5)
+
+    def test_no_contacts(self):
+        self.assertEqual(parse_contacts_from_text('www.hospequip.com.au'), [])
+        self.assertEqual(parse_contacts_from_text(None), [])
+
+    def test_adversarial_runs(self):
+        self.assertEqual(scan_contacts('a.b-c_d%e+f' * 5000), ((), ()))
+        self.assertEqual(scan_contacts('x@' + 'a.' * 5000 + '-'), ((), ()))
+
+    def test_memoised_results_not_shared(self):
+        text = 'Jen Fredman <jen@x.com>'
+        first = parse_contacts_from_text(text)
+        first[0]['name'] = 'changed'
+        self.assertEqual(parse_contacts_from_text(text)[0]['name'], 'Jen Fredman')
+
+
+class TestExcelCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.cache_dir = self.dir / "cache"
+        self.workbook = self.dir / "products.xlsx"
+        self.write_workbook("TC47PP-S")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_workbook(self, code):
+        frame = pd.DataFrame([[1, 'Widget', 2.5, code], [None, 7, 'x', None]])
+        with pd.ExcelWriter(self.workbook) as writer:
+            frame.to_excel(writer, sheet_name='Sales ', header=False, index=False)
+            frame.to_excel(writer, sheet_name='Sales', header=False, index=False)
+
+    def read(self, sheet):
+        return excel_cache.read_sheet(self.workbook, sheet, cache_dir=self.cache_dir)
+
+    def test_cached_read_matches_workbook(self):
+        first = self.read('Sales ')
+        second = self.read('Sales ')
+        self.assertEqual(len(list(self.cache_dir.glob("*.pkl"))), 1)
+        pd.testing.assert_frame_equal(second, first)
+        fresh = pd.read_excel(self.workbook, sheet_name='Sales ', header=None)
+        pd.testing.assert_frame_equal(second, fresh)
+        # Mixed object columns keep their original cell values, not str() of them
+        self.assertEqual(second.iloc[1, 1], 7)
+        self.assertEqual(second.iloc[0, 1], 'Widget')
+
+    def test_sheet_names_do_not_collide(self):
+        self.read('Sales ')
+        self.read('Sales')
+        self.assertEqual(len(list(self.cache_dir.glob("*.pkl"))), 2)
+        self.assertEqual(excel_cache.sheet_names(self.workbook, cache_dir=self.cache_dir),
+                         ['Sales ', 'Sales'])
+
+    def test_changed_workbook_invalidates(self):
+        self.assertEqual(self.read('Sales ').iloc[0, 3], 'TC47PP-S')
+        self.write_workbook('TC48PP-S')
+        self.assertEqual(self.read('Sales ').iloc[0, 3], 'TC48PP-S')
+        self.assertEqual(len(list(self.cache_dir.glob("*.pkl"))), 1)
+
+
+class TestImportJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "journal.sqlite"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, resume, url="https://a.supabase.co"):
+        journal = ImportJournal(self.path)
+        journal.start(url, resume=resume)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_resume_replays_progress(self):
+        journal = self.open(resume=False)
+        journal.record_contact("Jen@X.com ", "c1", "o1")
+        journal.record_interests("p1", ["c1", "c2"])
+        journal.complete_product("TC47", "p1")
+        journal.close()
+
+        resumed = self.open(resume=True)
+        self.assertEqual(resumed.completed_product("TC47"), "p1")
+        self.assertIsNone(resumed.completed_product("TC48"))
+        self.assertEqual(resumed.contact("jen@x.com"), ("c1", "o1"))
+        self.assertEqual(resumed.linked_contacts("p1"), {"c1", "c2"})
+        self.assertEqual(resumed.counts(), {"products": 1, "contacts": 1, "interests": 2})
+
+    def test_fresh_run_clears_journal(self):
+        journal = self.open(resume=False)
+        journal.complete_product("TC47", "p1")
+        journal.close()
+        self.assertIsNone(self.open(resume=False).completed_product("TC47"))
+
+    def test_resume_against_other_project_refused(self):
+        self.open(resume=False).close()
+        with self.assertRaises(JournalMismatch):
+            self.open(resume=True, url="https://b.supabase.co")
+
+
+class TestLookupCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "lookup.sqlite"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, url="https://a.supabase.co", **kwargs):
+        return LookupCache(url, self.path, **kwargs)
+
+    def test_persists_per_project(self):
+        cache = self.open()
+        cache.put("contact", "jen@x.com", "c1")
+        cache.set_watermark("contact", "2026-06-01T00:00:00+00:00")
+        cache.close()
+
+        cache = self.open()
+        self.assertEqual(cache.load("contact"), {"jen@x.com": "c1"})
+        self.assertEqual(cache.watermark("contact"), "2026-06-01T00:00:00+00:00")
+        cache.close()
+        other = self.open(url="https://b.supabase.co")
+        self.assertEqual(other.load("contact"), {})
+        self.assertIsNone(other.watermark("contact"))
+        other.close()
+
+    def test_ttl_eviction(self):
+        cache = self.open()
+        cache.put("category", "General", "k1")
+        cache.close()
+        cache = self.open(ttl_seconds=-1)
+        self.assertEqual(cache.load("category"), {})
+        cache.close()
+
+    def test_size_bound_keeps_recently_used(self):
+        cache = self.open(max_entries=2)
+        for i in range(4):
+            cache.put("organization", f"d{i}.com", f"o{i}")
+        cache.get("organization", "d0.com")
+        cache.close()
+        cache = self.open(max_entries=2)
+        self.assertEqual(set(cache.load("organization")), {"d0.com", "d3.com"})
+        cache.close()
+
+    def test_invalidate_values_and_clear(self):
+        cache = self.open()
+        cache.put("organization", "a.com", "o1")
+        cache.put("organization", "b.com", "o1")
+        cache.put("organization", "c.com", "o2")
+        cache.invalidate_values("organization", ["o1"])
+        self.assertEqual(cache.load("organization"), {"c.com": "o2"})
+        cache.set_watermark("organization", "t")
+        cache.clear("organization")
+        self.assertEqual(cache.load("organization"), {})
+        self.assertIsNone(cache.watermark("organization"))
+        cache.close()
+
+    def sync(self, repo, cache):
+        migration.use_repository(repo)
+        self.addCleanup(migration.use_repository, None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            migration.sync_lookup_cache(cache)
+
+    def test_sync_drops_deleted_ids_when_row_count_is_unchanged(self):
+        repo = InMemoryRepository()
+        repo.seed('contacts', [{'id': 'c1', 'email': 'jen@x.com'}, {'id': 'c2', 'email': 'amy@x.com'}])
+        cache = self.open()
+        cache.put("contact", "jen@x.com", "c1")
+        cache.put("contact", "amy@x.com", "c2")
+        cache.set_watermark("contact", repo.latest_updated_at('contacts'))
+
+        # One row deleted and another inserted between runs: the count stays at 2
+        del repo.tables['contacts']['c1']
+        del repo.indexes['contacts'][('jen@x.com',)]
+        repo.seed('contacts', [{'id': 'c3', 'email': 'sam@x.com'}])
+        self.sync(repo, cache)
+        self.assertEqual(cache.load("contact"), {"amy@x.com": "c2", "sam@x.com": "c3"})
+        self.assertNotIn("jen@x.com", migration._contact_cache)
+        cache.close()
+
+    def test_sync_includes_rows_at_the_watermark(self):
+        repo = InMemoryRepository()
+        repo.seed('contacts', [{'id': 'c1', 'email': 'jen@x.com'}, {'id': 'c2', 'email': 'amy@x.com'}])
+        for row in repo.tables['contacts'].values():
+            row['updated_at'] = '2026-06-01T00:00:00+00:00'
+        cache = self.open()
+        cache.put("contact", "jen@x.com", "c1")
+        cache.set_watermark("contact", '2026-06-01T00:00:00+00:00')
+        self.sync(repo, cache)
+        self.assertEqual(cache.load("contact"), {"jen@x.com": "c1", "amy@x.com": "c2"})
+        cache.close()
+
+    def test_only_real_domain_matches_are_persisted(self):
+        repo = InMemoryRepository()
+        repo.seed('organizations', [{'id': 'o1', 'name': 'Royal Prince Alfred Hospital',
+                                     'domain': 'rpa.health.nsw.gov.au'}])
+        migration.use_repository(repo)
+        self.addCleanup(migration.use_repository, None)
+        cache = self.open()
+        with mock.patch.object(migration, '_lookup_cache', cache), contextlib.redirect_stdout(io.StringIO()):
+            existing = migration.get_or_create_organization('RPA.health.nsw.gov.au', 'Sam Smith')
+            created = migration.get_or_create_organization('new.example.com', 'Sam Smith')
+        self.assertEqual(existing, 'o1')
+        self.assertEqual(cache.load("organization"), {
+            'rpa.health.nsw.gov.au': 'o1', 'new.example.com': created,
+        })
+        cache.close()
+
+
+class CappedClient:
+    """supabase-py table().select().order().range().execute() over rows, max_rows per response."""
+
+    def __init__(self, rows, max_rows):
+        self.rows = rows
+        self.max_rows = max_rows
+        self.ranges = []
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.ranges.append((start, end))
+        return self
+
+    def execute(self):
+        start, end = self.ranges[-1]
+        return SimpleNamespace(data=self.rows[start:min(end + 1, start + self.max_rows)])
+
+
+class TestSupabaseRepositoryPaging(unittest.TestCase):
+    def test_column_values_not_truncated_by_server_cap(self):
+        rows = [{'id': f'p{i:04d}', 'category_name': f'cat{i % 3}'} for i in range(2500)]
+        client = CappedClient(rows, max_rows=700)
+        values = SupabaseRepository(client).column_values('products', 'category_name', page_size=1000)
+        self.assertEqual(values, [row['category_name'] for row in rows])
+        self.assertEqual(client.ranges[:2], [(0, 999), (700, 1699)])
+
+
+class TestImportWithInMemoryRepository(unittest.TestCase):
+    PRODUCTS = [
+        {'product_code': 'PD001', 'product_name': 'Scavenge Tube', 'category_name': 'Midogas',
+         'key_contacts_reference': 'Jen Fredman <jen@health.nsw.gov.au>, amy@health.nsw.gov.au'},
+        {'product_code': 'PD002', 'product_name': 'Sharps Caddy', 'category_name': 'Sharps',
+         'key_contacts_reference': 'jen@health.nsw.gov.au'},
+        {'product_code': 'PD003', 'product_name': 'Spigot', 'category_name': 'Midogas'},
+    ]
+
+    def setUp(self):
+        self.repo = InMemoryRepository()
+        migration.use_repository(self.repo)
+        self.addCleanup(migration.use_repository, None)
+
+    def run_import(self, journal=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            products = [
+                {'market_potential': None, 'background_history': None,
+                 'key_contacts_reference': None, 'forecast_notes': None, **p}
+                for p in self.PRODUCTS
+            ]
+            merged = migration.merge_product_and_sales_data(products, [])
+            return migration.import_products_to_supabase(merged, journal)
+
+    def test_import_creates_rows_once(self):
+        imported, errors, skipped, contacts, links = self.run_import()
+        self.assertEqual((imported, errors, skipped, contacts, links), (3, 0, 0, 2, 3))
+        self.assertEqual(len(self.repo.tables['organizations']), 1)
+        self.assertEqual(len(self.repo.tables['product_categories']), 2)
+
+        migration.use_repository(self.repo)
+        before = self.repo.request_count
+        imported, errors, skipped, contacts, links = self.run_import()
+        self.assertEqual((imported, errors, skipped, contacts, links), (0, 0, 3, 0, 0))
+        self.assertEqual(len(self.repo.tables['contact_product_interests']), 3)
+        self.assertGreater(self.repo.request_count, before)
+
+    def test_resumed_run_makes_no_requests(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = ImportJournal(Path(tmp) / "journal.sqlite")
+            journal.start("memory://", resume=False)
+            self.run_import(journal)
+            before = self.repo.request_count
+            journal.start("memory://", resume=True)
+            self.assertEqual(self.run_import(journal)[:3], (0, 0, 0))
+            self.assertEqual(self.repo.request_count, before)
+            journal.close()
+
+    def test_links_reconciled_with_one_select_and_one_insert(self):
+        self.repo.seed('contact_product_interests', [{'contact_id': 'c1', 'product_id': 'p1'}])
+        before = self.repo.requests
+        created = migration.link_contacts_to_product('p1', {'c1': 'o1', 'c2': 'o1', 'c3': 'o2'})
+        self.assertEqual(created, 2)
+        self.assertEqual(self.repo.requests - before, {
+            ('contact_product_interests', 'select'): 1,
+            ('contact_product_interests', 'upsert'): 1,
+        })
+        links = {(r['contact_id'], r['organization_id']) for r in self.repo.tables['contact_product_interests'].values()
+                 if r['contact_id'] != 'c1'}
+        self.assertEqual(links, {('c2', 'o1'), ('c3', 'o2')})
+
+        before = self.repo.requests
+        self.assertEqual(migration.link_contacts_to_product('p1', {'c1': 'o1', 'c3': 'o2'}), 0)
+        self.assertEqual(self.repo.requests - before, {('contact_product_interests', 'select'): 1})
+
+    def test_duplicate_contacts_in_one_cell_link_once(self):
+        self.PRODUCTS = [{'product_code': 'PD001', 'product_name': 'Scavenge Tube', 'category_name': 'Midogas',
+                          'key_contacts_reference': 'Jen Fredman <jen@health.nsw.gov.au>, JEN@health.nsw.gov.au,'
+                                                    ' amy@health.nsw.gov.au, jen@health.nsw.gov.au'}]
+        imported, errors, skipped, contacts, links = self.run_import()
+        self.assertEqual((imported, errors, contacts, links), (1, 0, 2, 2))
+        self.assertEqual(self.repo.requests[('contact_product_interests', 'select')], 1)
+        self.assertEqual(self.repo.requests[('contact_product_interests', 'upsert')], 1)
+
+    def test_person_names_do_not_merge_domains(self):
+        self.PRODUCTS = [
+            {'product_code': f'PD10{i}', 'product_name': 'Spigot', 'category_name': 'Midogas',
+             'key_contacts_reference': f'Jen Fredman <jen@hospital{i}.com.au>'}
+            for i in range(3)
+        ]
+        self.run_import()
+        domains = sorted(r['domain'] for r in self.repo.tables['organizations'].values())
+        self.assertEqual(domains, ['hospital0.com.au', 'hospital1.com.au', 'hospital2.com.au'])
+
+    def test_organizations_matched_on_domain_only(self):
+        self.repo.seed('organizations', [{'id': 'o1', 'name': 'Royal Prince Alfred Hospital',
+                                          'domain': 'rpa.health.nsw.gov.au'}])
+        with contextlib.redirect_stdout(io.StringIO()):
+            matched = migration.get_or_create_organization('rpa.health.nsw.gov.au')
+            created = migration.get_or_create_organization('other.example.com', 'Royal Prince Alfred Hospital')
+        self.assertEqual(matched, 'o1')
+        self.assertNotEqual(created, 'o1')
+        self.assertEqual(self.repo.tables['organizations'][created]['name'], 'Royal Prince Alfred Hospital')
+        self.assertEqual(self.repo.requests[('organizations', 'select')], 1)
+
+    def test_unique_keys_enforced(self):
+        self.repo.insert_product({'product_code': 'PD001'})
+        with self.assertRaises(DuplicateKeyError):
+            self.repo.insert_product({'product_code': 'PD001'})
+        self.repo.seed('contact_product_interests', [{'contact_id': 'c', 'product_id': 'p'}])
+        self.assertEqual(self.repo.insert_interests([{'contact_id': 'c', 'product_id': 'p'}]), 0)
+        # organizations.domain is not unique (20260502120000 dropped the
+        # constraint): facilities share their parent's domain
+        self.repo.insert_organization({'name': 'NSW Health', 'domain': 'health.nsw.gov.au'})
+        self.repo.insert_organization({'name': 'Sydney LHD', 'domain': 'health.nsw.gov.au'})
+
+    def test_bulk_counts_distinct_codes_and_matches_domains_ignoring_case(self):
+        self.repo.seed('products', [{'product_code': 'PD2'}])
+        self.repo.seed('organizations', [{'id': 'o1', 'name': 'Jen Fredman', 'domain': 'Hospital0.com.au'}])
+        result = self.repo.import_products_bulk([
+            {'product_code': 'PD1', 'contacts': [{'email': 'jen@hospital0.com.au', 'name': 'Jen Fredman'},
+                                                 {'email': 'jen@hospital1.com.au', 'name': 'Jen Fredman'}]},
+            {'product_code': 'PD1', 'contacts': []},
+            {'product_code': 'PD2', 'contacts': []},
+        ])
+        self.assertEqual((result['products_created'], result['products_skipped']), (1, 1))
+        self.assertEqual(result['organizations_created'], 1)
+        orgs = {r['domain']: r['id'] for r in self.repo.tables['organizations'].values()}
+        self.assertEqual(sorted(orgs), ['Hospital0.com.au', 'hospital1.com.au'])
+        contact_orgs = {r['email']: r['organization_id'] for r in self.repo.tables['contacts'].values()}
+        self.assertEqual(contact_orgs['jen@hospital0.com.au'], 'o1')
+        self.assertEqual(contact_orgs['jen@hospital1.com.au'], orgs['hospital1.com.au'])
+
+    def test_incomplete_backend_fails_at_construction(self):
+        class Partial(ProductImportRepository):
+            def find_product_id(self, product_code):
+                return None
+
+        with self.assertRaisesRegex(TypeError, 'abstract'):
+            Partial()
+
+    def test_summary_matches_table_fallback(self):
+        self.run_import()
+        summary = self.repo.import_summary()
+        self.assertEqual(summary['products'], 3)
+        self.assertEqual(summary['categories'], {'Midogas': 2, 'Sharps': 1})
+        self.assertEqual(summary['priorities'], {'No Priority': 3})
+        self.assertEqual(migration.summary_from_tables(), summary)
+
+        before = self.repo.request_count
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(migration.verify_import())
+        self.assertEqual(self.repo.request_count - before, 1)
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        rows = [[None] * 14 for _ in range(4)]
+        for i in range(30):
+            row = [None] * 14
+            row[2] = f"Scavenge Tube {i}"
+            row[3] = "Midogas" if i % 2 else "Sharps"
+            row[6] = f"Jen Fredman <jen{i % 4}@health.nsw.gov.au>" if i % 3 else None
+            row[13] = f"PD{i:03d}" if i != 7 else "Product Code"
+            rows.append(row)
+        self.sheet = pd.DataFrame(rows, dtype=object)
+        self.sales = [{'product_name': 'Scavenge Tubes 1', 'priority_label': '# 1', 'category_name': None,
+                       'instructions': None, 'timing_notes': None, 'additional_notes': None}]
+        self.addCleanup(migration.use_repository, None)
+
+    def import_sequential(self):
+        repo = InMemoryRepository()
+        migration.use_repository(repo)
+        with contextlib.redirect_stdout(io.StringIO()):
+            merged = migration.merge_product_and_sales_data(products_from_frame(self.sheet), self.sales)
+            return migration.import_products_to_supabase(merged), repo
+
+    def test_chunks_match_whole_frame(self):
+        chunked = list(migration.iter_product_chunks(self.sheet, chunk_rows=4))
+        self.assertEqual(chunked, products_from_frame(self.sheet))
+        self.assertEqual(migration.count_products(self.sheet), 29)
+
+    def test_pipeline_matches_sequential_import(self):
+        expected, expected_repo = self.import_sequential()
+        repo = InMemoryRepository()
+        migration.use_repository(repo)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, tiers = migration.run_pipeline(self.sheet, self.sales, 29, queue_size=2)
+        self.assertEqual(results, expected)
+        self.assertEqual(tiers['normalised'], 1)
+        self.assertEqual(repo.requests, expected_repo.requests)
+        priorities = {r['product_code']: r.get('sales_priority') for r in repo.tables['products'].values()}
+        self.assertEqual(priorities['PD001'], 1)
+
+    def test_bulk_loader_matches_per_row_import(self):
+        expected, expected_repo = self.import_sequential()
+        repo = InMemoryRepository()
+        migration.use_repository(repo)
+        bulk = lambda products, journal, total: migration.bulk_import_products(products, journal, total, batch_size=8)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, _ = migration.run_pipeline(self.sheet, self.sales, 29, loader=bulk)
+        self.assertEqual(results, expected)
+        self.assertEqual(repo.requests[('import_products_bulk', 'rpc')], 4)
+        self.assertEqual(repo.request_count, 4)
+        for table in ('products', 'organizations', 'contacts', 'contact_product_interests'):
+            self.assertEqual(len(repo.tables[table]), len(expected_repo.tables[table]), table)
+
+    def test_bulk_batches_are_journaled_and_failures_counted(self):
+        repo = InMemoryRepository()
+        migration.use_repository(repo)
+        products = lambda: migration.merge_product_and_sales_data(products_from_frame(self.sheet), [])
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            journal = ImportJournal(Path(tmp) / "journal.sqlite")
+            journal.start("memory://", resume=False)
+            calls = []
+            real = repo.import_products_bulk
+
+            def flaky(rows):
+                calls.append(len(rows))
+                if len(calls) == 2:
+                    raise RuntimeError("statement timeout")
+                return real(rows)
+
+            with mock.patch.object(repo, 'import_products_bulk', flaky):
+                created, errors, skipped, _, _ = migration.bulk_import_products(products(), journal, batch_size=10)
+            self.assertEqual((created, errors, skipped), (19, 10, 0))
+            self.assertEqual(journal.counts()['products'], 19)
+
+            journal.start("memory://", resume=True)
+            created, errors, skipped, _, _ = migration.bulk_import_products(products(), journal, batch_size=10)
+            self.assertEqual((created, errors, skipped), (10, 0, 0))
+            journal.close()
+
+    def test_stage_failure_is_raised(self):
+        migration.use_repository(InMemoryRepository())
+        parse = migration.attach_parsed_contacts
+
+        def fail_mid_stream(product):
+            if product['product_code'] == 'PD010':
+                raise ValueError("unparseable contacts")
+            return parse(product)
+
+        with mock.patch.object(migration, 'attach_parsed_contacts', fail_mid_stream), \
+                contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(ValueError, "unparseable"):
+                migration.run_pipeline(self.sheet, [], 29, queue_size=1)
+
+
+class TestIncrementalSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.repo = InMemoryRepository()
+        migration.use_repository(self.repo)
+        self.addCleanup(migration.use_repository, None)
+        self.products = [
+            {'product_code': f'PD{i:03d}', 'product_name': f'Tube {i}', 'category_name': 'Midogas',
+             'market_potential': 'Large', 'background_history': None, 'forecast_notes': None,
+             'key_contacts_reference': f'jen{i % 3}@health.nsw.gov.au'}
+            for i in range(20)
+        ]
+
+    def sync(self, products):
+        hashes = RowHashStore("memory://", Path(self.tmp.name) / "sync.sqlite")
+        before = self.repo.request_count
+        with contextlib.redirect_stdout(io.StringIO()):
+            merged = migration.merge_product_and_sales_data([dict(p) for p in products], [])
+            migration.import_products_to_supabase(merged, hashes=hashes)
+        hashes.close()
+        return self.repo.request_count - before, dict(self.repo.metrics.results)
+
+    def test_record_hash_ignores_key_order_and_blanks(self):
+        self.assertEqual(record_hash({'a': 1, 'b': None}), record_hash({'b': '', 'a': 1}))
+        self.assertNotEqual(record_hash({'a': 1}), record_hash({'a': 2}))
+
+    def test_only_changed_products_are_pushed(self):
+        _, results = self.sync(self.products)
+        self.assertEqual(len(self.repo.tables['products']), 20)
+        self.assertEqual(len(self.repo.tables['contact_product_interests']), 20)
+
+        requests, results = self.sync(self.products)
+        self.assertEqual(requests, 0)
+        self.assertEqual(results['unchanged'], 20)
+
+        edited = [dict(p) for p in self.products]
+        edited[4]['market_potential'] = None
+        edited[4]['key_contacts_reference'] = 'amy@health.nsw.gov.au'
+        requests, results = self.sync(edited)
+        self.assertEqual((results['updated'], results['unchanged']), (1, 19))
+        self.assertLessEqual(requests, 6)
+        row = next(r for r in self.repo.tables['products'].values() if r['product_code'] == 'PD004')
+        self.assertIsNone(row['market_potential'])
+        self.assertEqual(row['key_contacts_reference'], 'amy@health.nsw.gov.au')
+        self.assertEqual(len(self.repo.tables['contact_product_interests']), 21)
+
+    def test_existing_products_are_updated_on_first_sync(self):
+        self.repo.seed('products', [{'product_code': 'PD001', 'product_name': 'Old name'}])
+        self.sync(self.products[:2])
+        names = sorted(r['product_name'] for r in self.repo.tables['products'].values())
+        self.assertEqual(names, ['Tube 0', 'Tube 1'])
+
+
+class TestRunMetrics(unittest.TestCase):
+    def test_percentile(self):
+        samples = sorted(float(i) for i in range(1, 101))
+        self.assertEqual(percentile(samples, 0.5), 50.0)
+        self.assertEqual(percentile(samples, 0.95), 95.0)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_requests_timed_and_failures_counted(self):
+        metrics = RunMetrics()
+        metrics.record_request('contacts', 'select', 0.003)
+        metrics.record_request('contacts', 'select', 0.040)
+        with self.assertRaises(RuntimeError):
+            with metrics.request('contacts', 'insert'):
+                raise RuntimeError("boom")
+
+        by_op = {r['operation']: r for r in metrics.report()['requests']}
+        self.assertEqual(by_op['select']['count'], 2)
+        self.assertEqual(by_op['select']['histogram'], {'le_5ms': 1, 'le_50ms': 1})
+        self.assertEqual(by_op['select']['max_ms'], 40.0)
+        self.assertEqual(by_op['insert']['failures'], 1)
+
+    def test_repository_requests_and_cache_hits_reported(self):
+        repo = InMemoryRepository()
+        migration.use_repository(repo)
+        self.addCleanup(migration.use_repository, None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            migration.get_or_create_category('Sharps')
+            migration.get_or_create_category('Sharps')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = json.loads(repo.metrics.write_report(Path(tmp) / "metrics.json").read_text())
+        self.assertEqual(report['request_count'], 2)
+        self.assertEqual(report['caches']['category'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_progress_line_is_throttled(self):
+        stream = io.StringIO()
+        progress = ProgressLine(100, interval=60, stream=stream)
+        for done in range(50):
+            progress.update(done, errors=0)
+        progress.finish(100, errors=2)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("100/100 products", lines[-1])
+        self.assertIn("errors: 2", lines[-1])
+
+
+class TestImportTime(unittest.TestCase):
+    # Generous for slow CI machines; a cold import is normally well under 100ms
+    IMPORT_BUDGET_SECONDS = 0.5
+
+    def test_import_is_light_and_needs_no_credentials(self):
+        probe = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import migrate_products_from_excel as m\n"
+            "elapsed = time.perf_counter() - start\n"
+            "m.parse_priority_label('# 1'); m.parse_contacts_from_text('jen@health.nsw.gov.au')\n"
+            "heavy = [n for n in ('pandas', 'supabase', 'dotenv', 'openpyxl') if n in sys.modules]\n"
+            "import json; print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+        )
+        env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+        with tempfile.TemporaryDirectory() as tmp:
+            # No .env in the working directory
+            result = subprocess.run(
+                [sys.executable, "-c", probe], cwd=tmp, env={**env, "PYTHONPATH": str(SCRIPTS_DIR)},
+                capture_output=True, text=True, timeout=60,
+            )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        probed = json.loads(result.stdout)
+        self.assertEqual(probed['heavy'], [])
+        self.assertLess(probed['elapsed'], self.IMPORT_BUDGET_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
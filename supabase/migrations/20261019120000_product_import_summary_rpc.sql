@@ -0,0 +1,42 @@
+-- Summary used by scripts/migrate_products_from_excel.py verify_import().
+-- Returns exact row counts for the tables the product migration writes plus
+-- the per-category and per-priority product breakdowns in one round trip,
+-- so verification never downloads product rows (and is not subject to the
+-- PostgREST max-rows limit).
+--
+-- category_name is read through to_jsonb() because older product rows were
+-- created before the column existed in every environment.
+
+CREATE OR REPLACE FUNCTION public.get_product_import_summary()
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+  SELECT jsonb_build_object(
+    'products', (SELECT COUNT(*) FROM public.products),
+    'contacts', (SELECT COUNT(*) FROM public.contacts),
+    'contact_product_interests', (SELECT COUNT(*) FROM public.contact_product_interests),
+    'organizations', (SELECT COUNT(*) FROM public.organizations),
+    'categories', COALESCE((
+      SELECT jsonb_object_agg(category_key, category_count)
+      FROM (
+        SELECT COALESCE(NULLIF(to_jsonb(p)->>'category_name', ''), 'Uncategorized') AS category_key,
+               COUNT(*) AS category_count
+        FROM public.products p
+        GROUP BY 1
+      ) c
+    ), '{}'::jsonb),
+    'priorities', COALESCE((
+      SELECT jsonb_object_agg(priority_key, priority_count)
+      FROM (
+        SELECT COALESCE(p.sales_priority::text, 'No Priority') AS priority_key,
+               COUNT(*) AS priority_count
+        FROM public.products p
+        GROUP BY 1
+      ) s
+    ), '{}'::jsonb)
+  );
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_product_import_summary() TO authenticated, service_role;
@@ -0,0 +1,226 @@
+-- Bulk import RPC for scripts/migrate_products_from_excel.py --bulk.
+--
+-- p_products is a JSON array of merged products, each carrying its parsed key
+-- contacts:
+--   [{"product_code": "...", "product_name": "...", "category_name": "...",
+--     "market_potential": "...", ..., "sales_status": "active",
+--     "contacts": [{"email": "jen@health.nsw.gov.au", "name": "Jen Fredman"}]}]
+--
+-- Everything the per-row import does is resolved set-based in the caller's
+-- transaction: categories by name, organizations by email domain (compared
+-- case-insensitively; contact names are people, not organization names, and
+-- are never fuzzy-matched against organizations), contacts by
+-- email, products by product_code (existing products are skipped, not
+-- updated) and contact_product_interests by (contact_id, product_id).
+-- Returns created/skipped counts (per distinct product_code) plus
+-- product_code -> product id for the script's resume journal.
+--
+-- plpgsql (not sql) so the body is bound at call time: product_categories
+-- and products.category_id / category_name exist in the import target but
+-- not in every environment built from these migrations.
+
+CREATE OR REPLACE FUNCTION public.import_products_bulk(p_products jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY INVOKER
+AS $$
+DECLARE
+  v_org_ids jsonb;
+  v_domains text[];
+  v_domain_names jsonb;
+  v_product_ids jsonb;
+  v_payload_products integer;
+  v_categories_created integer := 0;
+  v_organizations_created integer := 0;
+  v_contacts_created integer := 0;
+  v_products_created integer := 0;
+  v_interests_created integer := 0;
+BEGIN
+  IF p_products IS NULL OR jsonb_typeof(p_products) <> 'array' THEN
+    RAISE EXCEPTION 'import_products_bulk expects a JSON array of products';
+  END IF;
+
+  SELECT count(DISTINCT p.doc->>'product_code') INTO v_payload_products
+  FROM jsonb_array_elements(p_products) AS p(doc)
+  WHERE NULLIF(p.doc->>'product_code', '') IS NOT NULL;
+
+  -- Categories
+  WITH wanted AS (
+    SELECT DISTINCT NULLIF(p.doc->>'category_name', '') AS category_name
+    FROM jsonb_array_elements(p_products) AS p(doc)
+  ),
+  inserted AS (
+    INSERT INTO public.product_categories (category_name, description, is_active)
+    SELECT w.category_name, w.category_name || ' products', TRUE
+    FROM wanted w
+    WHERE w.category_name IS NOT NULL
+      AND NOT EXISTS (
+        SELECT 1 FROM public.product_categories pc WHERE pc.category_name = w.category_name
+      )
+    RETURNING 1
+  )
+  SELECT count(*) INTO v_categories_created FROM inserted;
+
+  -- Products (first occurrence of a code wins; existing codes are skipped)
+  WITH rows AS (
+    SELECT DISTINCT ON (p.doc->>'product_code') p.doc
+    FROM jsonb_array_elements(p_products) WITH ORDINALITY AS p(doc, ord)
+    WHERE NULLIF(p.doc->>'product_code', '') IS NOT NULL
+    ORDER BY p.doc->>'product_code', p.ord
+  ),
+  inserted AS (
+    INSERT INTO public.products (
+      product_code, product_name, category_id, category_name,
+      market_potential, background_history, key_contacts_reference, forecast_notes,
+      sales_priority, sales_priority_label, sales_instructions, sales_timing_notes,
+      sales_status, is_active
+    )
+    SELECT
+      r.doc->>'product_code',
+      r.doc->>'product_name',
+      cat.id,
+      NULLIF(r.doc->>'category_name', ''),
+      NULLIF(r.doc->>'market_potential', ''),
+      NULLIF(r.doc->>'background_history', ''),
+      NULLIF(r.doc->>'key_contacts_reference', ''),
+      NULLIF(r.doc->>'forecast_notes', ''),
+      (r.doc->>'sales_priority')::integer,
+      NULLIF(r.doc->>'sales_priority_label', ''),
+      NULLIF(r.doc->>'sales_instructions', ''),
+      NULLIF(r.doc->>'sales_timing_notes', ''),
+      COALESCE(NULLIF(r.doc->>'sales_status', ''), 'active'),
+      COALESCE(r.doc->>'sales_status', '') <> 'removed'
+    FROM rows r
+    LEFT JOIN LATERAL (
+      SELECT pc.id
+      FROM public.product_categories pc
+      WHERE pc.category_name = NULLIF(r.doc->>'category_name', '')
+      LIMIT 1
+    ) cat ON TRUE
+    ON CONFLICT (product_code) DO NOTHING
+    RETURNING 1
+  )
+  SELECT count(*) INTO v_products_created FROM inserted;
+
+  SELECT COALESCE(jsonb_object_agg(pr.product_code, pr.id), '{}'::jsonb) INTO v_product_ids
+  FROM public.products pr
+  WHERE pr.product_code IN (
+    SELECT p.doc->>'product_code' FROM jsonb_array_elements(p_products) AS p(doc)
+  );
+
+  -- Organizations: one per email domain, named after the first contact seen.
+  -- Payload domains are lower-cased here; organizations.domain is not, so it
+  -- is compared as lower(o.domain), as _resolve_org_by_domain does for
+  -- organization_domains. organizations.domain has no unique constraint
+  -- (20260502120000), so, as in upsert_contact_with_org_v2, creation is
+  -- serialised on a transaction-scoped advisory lock per domain (taken in
+  -- sorted order) and the existence check runs after the locks are held.
+  WITH contact_rows AS (
+    SELECT
+      COALESCE(NULLIF(split_part(lower(trim(c.doc->>'email')), '@', 2), ''), 'pdmedical.com.au') AS domain,
+      NULLIF(trim(c.doc->>'name'), '') AS name,
+      p.ord,
+      c.ord AS contact_ord
+    FROM jsonb_array_elements(p_products) WITH ORDINALITY AS p(doc, ord)
+    CROSS JOIN LATERAL jsonb_array_elements(COALESCE(p.doc->'contacts', '[]'::jsonb)) WITH ORDINALITY AS c(doc, ord)
+  ),
+  domains AS (
+    SELECT DISTINCT ON (domain) domain, name
+    FROM contact_rows
+    ORDER BY domain, ord, contact_ord
+  )
+  SELECT
+    COALESCE(array_agg(d.domain ORDER BY d.domain), ARRAY[]::text[]),
+    COALESCE(jsonb_object_agg(d.domain, d.name), '{}'::jsonb)
+  INTO v_domains, v_domain_names
+  FROM domains d;
+
+  PERFORM pg_advisory_xact_lock(hashtextextended(d.domain, 0))
+  FROM unnest(v_domains) WITH ORDINALITY AS d(domain, ord)
+  ORDER BY d.ord;
+
+  WITH inserted AS (
+    INSERT INTO public.organizations (name, domain, status)
+    SELECT
+      COALESCE(v_domain_names->>d.domain, initcap(split_part(d.domain, '.', 1)) || ' Organization'),
+      d.domain,
+      'active'
+    FROM unnest(v_domains) AS d(domain)
+    WHERE NOT EXISTS (SELECT 1 FROM public.organizations o WHERE lower(o.domain) = d.domain)
+    RETURNING 1
+  )
+  SELECT count(*) INTO v_organizations_created FROM inserted;
+
+  -- Read the map back: covers existing, just-created and concurrently created domains
+  SELECT COALESCE(jsonb_object_agg(matched.domain, matched.id), '{}'::jsonb) INTO v_org_ids
+  FROM (
+    SELECT DISTINCT ON (lower(o.domain)) lower(o.domain) AS domain, o.id
+    FROM public.organizations o
+    WHERE lower(o.domain) = ANY(v_domains)
+    ORDER BY lower(o.domain), o.created_at
+  ) matched;
+
+  -- Contacts (existing emails are kept as they are)
+  WITH contact_rows AS (
+    SELECT DISTINCT ON (lower(trim(c.doc->>'email')))
+      lower(trim(c.doc->>'email')) AS email,
+      regexp_split_to_array(NULLIF(trim(c.doc->>'name'), ''), '\s+') AS name_parts,
+      COALESCE(NULLIF(split_part(lower(trim(c.doc->>'email')), '@', 2), ''), 'pdmedical.com.au') AS domain
+    FROM jsonb_array_elements(p_products) WITH ORDINALITY AS p(doc, ord)
+    CROSS JOIN LATERAL jsonb_array_elements(COALESCE(p.doc->'contacts', '[]'::jsonb)) WITH ORDINALITY AS c(doc, ord)
+    WHERE NULLIF(trim(c.doc->>'email'), '') IS NOT NULL
+    ORDER BY lower(trim(c.doc->>'email')), p.ord, c.ord
+  ),
+  inserted AS (
+    INSERT INTO public.contacts (email, first_name, last_name, organization_id, status)
+    SELECT
+      cr.email,
+      cr.name_parts[1],
+      CASE WHEN array_length(cr.name_parts, 1) > 1 THEN cr.name_parts[array_length(cr.name_parts, 1)] END,
+      (v_org_ids->>cr.domain)::uuid,
+      'active'
+    FROM contact_rows cr
+    WHERE v_org_ids ? cr.domain
+      AND NOT EXISTS (SELECT 1 FROM public.contacts ct WHERE ct.email = cr.email)
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+  )
+  SELECT count(*) INTO v_contacts_created FROM inserted;
+
+  -- Interest links for every product in the payload (new or existing)
+  WITH links AS (
+    SELECT DISTINCT ON (ct.id, (v_product_ids->>(p.doc->>'product_code'))::uuid)
+      ct.id AS contact_id,
+      (v_org_ids->>COALESCE(NULLIF(split_part(lower(trim(c.doc->>'email')), '@', 2), ''), 'pdmedical.com.au'))::uuid AS organization_id,
+      (v_product_ids->>(p.doc->>'product_code'))::uuid AS product_id
+    FROM jsonb_array_elements(p_products) WITH ORDINALITY AS p(doc, ord)
+    CROSS JOIN LATERAL jsonb_array_elements(COALESCE(p.doc->'contacts', '[]'::jsonb)) WITH ORDINALITY AS c(doc, ord)
+    JOIN public.contacts ct ON ct.email = lower(trim(c.doc->>'email'))
+    WHERE v_product_ids ? (p.doc->>'product_code')
+    ORDER BY ct.id, (v_product_ids->>(p.doc->>'product_code'))::uuid, p.ord, c.ord
+  ),
+  inserted AS (
+    INSERT INTO public.contact_product_interests (
+      contact_id, organization_id, product_id, interest_level, status, source, lead_score_contribution
+    )
+    SELECT l.contact_id, l.organization_id, l.product_id, 'high', 'prospecting', 'excel_import', 10
+    FROM links l
+    WHERE l.organization_id IS NOT NULL
+    ON CONFLICT (contact_id, product_id) DO NOTHING
+    RETURNING 1
+  )
+  SELECT count(*) INTO v_interests_created FROM inserted;
+
+  RETURN jsonb_build_object(
+    'products_created', v_products_created,
+    'products_skipped', v_payload_products - v_products_created,
+    'categories_created', v_categories_created,
+    'organizations_created', v_organizations_created,
+    'contacts_created', v_contacts_created,
+    'interests_created', v_interests_created,
+    'product_ids', v_product_ids
+  );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.import_products_bulk(jsonb) TO service_role;
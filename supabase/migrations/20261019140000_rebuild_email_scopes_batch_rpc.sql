@@ -0,0 +1,83 @@
+-- Keyset-paginated variant of rebuild_email_scopes_for_domain, driven by
+-- scripts/host_org_one_time_setup.py.
+--
+-- Each call looks at the next p_limit emails by id after p_after and
+-- recomputes is_internal for those whose participants include p_domain or an
+-- alias domain of the same organization, so every transaction stays short and
+-- an interrupted rebuild can continue from the last id it returned.
+--
+-- Returns {"last_id": <uuid|null>, "scanned": <emails looked at>,
+--          "updated": <rows whose is_internal changed>}.
+-- The rebuild is finished when scanned < p_limit.
+--
+-- Host domains are read once per call instead of calling is_host_domain()
+-- per address; rows whose value is already correct are not rewritten.
+
+CREATE OR REPLACE FUNCTION public.rebuild_email_scopes_batch(
+  p_domain text,
+  p_after uuid DEFAULT NULL,
+  p_limit integer DEFAULT 5000
+)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+  WITH scope_domains AS (
+    SELECT COALESCE(array_agg(DISTINCT d.domain), ARRAY[]::text[]) AS domains
+    FROM (
+      SELECT lower(od.domain)::text AS domain
+      FROM public.organization_domains od
+      WHERE od.organization_id IN (
+        SELECT o.id
+        FROM public.organizations o
+        LEFT JOIN public.organization_domains od_match ON od_match.organization_id = o.id
+        WHERE lower(o.domain) = lower(p_domain)
+           OR lower(od_match.domain) = lower(p_domain)
+      )
+      UNION
+      SELECT lower(p_domain)::text
+    ) d
+  ),
+  host AS (
+    SELECT COALESCE(array_agg(h.domain), ARRAY[]::text[]) AS domains
+    FROM public.host_org_domains() h
+  ),
+  batch AS (
+    SELECT
+      e.id,
+      ARRAY(
+        SELECT lower(split_part(trim(both ' <>"' from addr), '@', 2))
+        FROM unnest(
+          ARRAY[e.from_email::text] || COALESCE(e.to_emails, ARRAY[]::text[])
+                                    || COALESCE(e.cc_emails, ARRAY[]::text[])
+                                    || COALESCE(e.bcc_emails, ARRAY[]::text[])
+        ) AS addr
+        WHERE addr IS NOT NULL AND addr <> ''
+      ) AS domains
+    FROM public.emails e
+    WHERE p_after IS NULL OR e.id > p_after
+    ORDER BY e.id
+    LIMIT p_limit
+  ),
+  recomputed AS (
+    SELECT
+      b.id,
+      (cardinality(b.domains) > 0 AND b.domains <@ host.domains) AS is_internal
+    FROM batch b, host, scope_domains s
+    WHERE b.domains && s.domains
+  ),
+  updated AS (
+    UPDATE public.emails e
+    SET is_internal = r.is_internal
+    FROM recomputed r
+    WHERE e.id = r.id
+      AND e.is_internal IS DISTINCT FROM r.is_internal
+    RETURNING 1
+  )
+  SELECT jsonb_build_object(
+    'last_id', (SELECT b.id FROM batch b ORDER BY b.id DESC LIMIT 1),
+    'scanned', (SELECT count(*) FROM batch),
+    'updated', (SELECT count(*) FROM updated)
+  );
+$$;
+
+GRANT EXECUTE ON FUNCTION public.rebuild_email_scopes_batch(text, uuid, integer) TO service_role;
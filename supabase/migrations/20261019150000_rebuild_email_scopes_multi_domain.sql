@@ -0,0 +1,89 @@
+-- Multi-domain email-scope rebuild for scripts/host_org_one_time_setup.py.
+--
+-- rebuild_email_scopes_for_domains_batch takes the whole set of host domains
+-- being set up and recomputes is_internal in a single keyset-paginated pass
+-- over public.emails: an email is considered when any participant is on one
+-- of p_domains or an alias domain of their organizations, and rewritten only
+-- when its is_internal value actually changes. Rebuilding N domains is one
+-- scan instead of N.
+--
+-- Same contract as rebuild_email_scopes_batch: returns
+-- {"last_id", "scanned", "updated"}; finished when scanned < p_limit.
+-- It replaces rebuild_email_scopes_batch (20261019140000), which has no
+-- callers left and is dropped.
+
+CREATE OR REPLACE FUNCTION public.rebuild_email_scopes_for_domains_batch(
+  p_domains text[],
+  p_after uuid DEFAULT NULL,
+  p_limit integer DEFAULT 5000
+)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+  WITH requested AS (
+    SELECT DISTINCT lower(d)::text AS domain
+    FROM unnest(p_domains) AS d
+    WHERE d IS NOT NULL AND d <> ''
+  ),
+  scope_domains AS (
+    SELECT COALESCE(array_agg(DISTINCT s.domain), ARRAY[]::text[]) AS domains
+    FROM (
+      SELECT lower(od.domain)::text AS domain
+      FROM public.organization_domains od
+      WHERE od.organization_id IN (
+        SELECT o.id
+        FROM public.organizations o
+        LEFT JOIN public.organization_domains od_match ON od_match.organization_id = o.id
+        WHERE lower(o.domain) IN (SELECT domain FROM requested)
+           OR lower(od_match.domain) IN (SELECT domain FROM requested)
+      )
+      UNION
+      SELECT domain FROM requested
+    ) s
+  ),
+  host AS (
+    SELECT COALESCE(array_agg(h.domain), ARRAY[]::text[]) AS domains
+    FROM public.host_org_domains() h
+  ),
+  batch AS (
+    SELECT
+      e.id,
+      ARRAY(
+        SELECT lower(split_part(trim(both ' <>"' from addr), '@', 2))
+        FROM unnest(
+          ARRAY[e.from_email::text] || COALESCE(e.to_emails, ARRAY[]::text[])
+                                    || COALESCE(e.cc_emails, ARRAY[]::text[])
+                                    || COALESCE(e.bcc_emails, ARRAY[]::text[])
+        ) AS addr
+        WHERE addr IS NOT NULL AND addr <> ''
+      ) AS domains
+    FROM public.emails e
+    WHERE p_after IS NULL OR e.id > p_after
+    ORDER BY e.id
+    LIMIT p_limit
+  ),
+  recomputed AS (
+    SELECT
+      b.id,
+      (cardinality(b.domains) > 0 AND b.domains <@ host.domains) AS is_internal
+    FROM batch b, host, scope_domains s
+    WHERE b.domains && s.domains
+  ),
+  updated AS (
+    UPDATE public.emails e
+    SET is_internal = r.is_internal
+    FROM recomputed r
+    WHERE e.id = r.id
+      AND e.is_internal IS DISTINCT FROM r.is_internal
+    RETURNING 1
+  )
+  SELECT jsonb_build_object(
+    'last_id', (SELECT b.id FROM batch b ORDER BY b.id DESC LIMIT 1),
+    'scanned', (SELECT count(*) FROM batch),
+    'updated', (SELECT count(*) FROM updated)
+  );
+$$;
+
+DROP FUNCTION IF EXISTS public.rebuild_email_scopes_batch(text, uuid, integer);
+
+GRANT EXECUTE ON FUNCTION public.rebuild_email_scopes_for_domains_batch(text[], uuid, integer) TO service_role;
@@ -0,0 +1,124 @@
+-- Read-only cost estimate for scripts/host_org_one_time_setup.py --dry-run.
+--
+-- For the host domains about to be set up, reports how many emails the
+-- multi-domain rebuild (rebuild_email_scopes_for_domains_batch) would look
+-- at and how many rows it would actually rewrite, assuming every
+-- organization matching p_domains is marked is_host first.
+--
+-- Keyset-paginated like the rebuild itself, so no single statement reads
+-- the whole table. Each call covers the next p_limit emails after p_after:
+--
+--   {"last_id": <id to pass as p_after>, "scanned": <emails read>,
+--    "emails_in_scope": <emails with a participant on a scope domain>,
+--    "would_change": <emails whose is_internal would flip>,
+--    "domains": {"pdmedical.com.au": {"emails": n, "would_change": m}, ...}}
+--
+-- Finished when scanned < p_limit; the caller sums the batches. Per-domain
+-- figures overlap when an email involves several of the domains. Nothing
+-- is written, so the batches' run time is a fair lower bound for the
+-- rebuild's scan.
+
+DROP FUNCTION IF EXISTS public.estimate_email_scope_rebuild(text[]);
+
+CREATE OR REPLACE FUNCTION public.estimate_email_scope_rebuild(
+  p_domains text[],
+  p_after uuid DEFAULT NULL,
+  p_limit integer DEFAULT 5000
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+  WITH requested AS (
+    SELECT DISTINCT lower(d)::text AS domain
+    FROM unnest(p_domains) AS d
+    WHERE d IS NOT NULL AND d <> ''
+  ),
+  matched_orgs AS (
+    SELECT r.domain AS requested, o.id, lower(o.domain)::text AS org_domain
+    FROM requested r
+    JOIN public.organizations o ON lower(o.domain) = r.domain
+    UNION
+    SELECT r.domain, o.id, lower(o.domain)::text
+    FROM requested r
+    JOIN public.organization_domains m ON lower(m.domain) = r.domain
+    JOIN public.organizations o ON o.id = m.organization_id
+  ),
+  scope AS (
+    SELECT mo.requested, lower(od.domain)::text AS domain
+    FROM matched_orgs mo
+    JOIN public.organization_domains od ON od.organization_id = mo.id
+    UNION
+    SELECT r.domain, r.domain FROM requested r
+  ),
+  scope_sets AS (
+    SELECT s.requested, array_agg(DISTINCT s.domain) AS domains
+    FROM scope s
+    GROUP BY s.requested
+  ),
+  all_scope AS (
+    SELECT COALESCE(array_agg(DISTINCT s.domain), ARRAY[]::text[]) AS domains FROM scope s
+  ),
+  planned_host AS (
+    SELECT COALESCE(array_agg(DISTINCT h.domain), ARRAY[]::text[]) AS domains
+    FROM (
+      SELECT domain FROM public.host_org_domains()
+      UNION SELECT domain FROM scope
+      UNION SELECT org_domain FROM matched_orgs WHERE org_domain IS NOT NULL AND org_domain <> ''
+    ) h
+  ),
+  batch AS (
+    SELECT
+      e.id,
+      e.is_internal,
+      ARRAY(
+        SELECT lower(split_part(trim(both ' <>"' from addr), '@', 2))
+        FROM unnest(
+          ARRAY[e.from_email::text] || COALESCE(e.to_emails, ARRAY[]::text[])
+                                    || COALESCE(e.cc_emails, ARRAY[]::text[])
+                                    || COALESCE(e.bcc_emails, ARRAY[]::text[])
+        ) AS addr
+        WHERE addr IS NOT NULL AND addr <> ''
+      ) AS domains
+    FROM public.emails e
+    WHERE p_after IS NULL OR e.id > p_after
+    ORDER BY e.id
+    LIMIT p_limit
+  ),
+  in_scope AS (
+    SELECT
+      b.domains,
+      b.is_internal IS DISTINCT FROM
+        (cardinality(b.domains) > 0 AND b.domains <@ ph.domains) AS changes
+    FROM batch b, planned_host ph, all_scope a
+    WHERE b.domains && a.domains
+  ),
+  per_domain AS (
+    SELECT
+      s.requested,
+      count(*) AS emails,
+      count(*) FILTER (WHERE i.changes) AS would_change
+    FROM scope_sets s
+    JOIN in_scope i ON i.domains && s.domains
+    GROUP BY s.requested
+  )
+  SELECT jsonb_build_object(
+    'last_id', (SELECT b.id FROM batch b ORDER BY b.id DESC LIMIT 1),
+    'scanned', (SELECT count(*) FROM batch),
+    'emails_in_scope', (SELECT count(*) FROM in_scope),
+    'would_change', (SELECT count(*) FROM in_scope WHERE changes),
+    'domains', COALESCE((
+      SELECT jsonb_object_agg(
+        r.domain,
+        jsonb_build_object(
+          'emails', COALESCE(pd.emails, 0),
+          'would_change', COALESCE(pd.would_change, 0)
+        )
+      )
+      FROM requested r
+      LEFT JOIN per_domain pd ON pd.requested = r.domain
+    ), '{}'::jsonb)
+  );
+$$;
+
+GRANT EXECUTE ON FUNCTION public.estimate_email_scope_rebuild(text[], uuid, integer) TO service_role;